@@ -0,0 +1,239 @@
+# Batch extraction: landmark datasets from recorded videos, one process per video at a time
+#
+# Usage:
+#   python batch_extract.py recordings/ --output datasets/                (every video in the directory)
+#   python batch_extract.py a.mp4 b.mp4 --output datasets/ --format npy   (memory-mappable .npy columns)
+#   python batch_extract.py recordings/ --output datasets/ --workers 8 --roi
+#
+# Each video becomes <output>/<name>.npz, or <output>/<name>/ with one .npy per column, named by its path
+# below the inputs' common directory with "__" for the separators, so a/clip.mp4 and
+# b/clip.mp4 become a__clip and b__clip. Columns, for F frames and up to H hands:
+#   landmarks   (F, H, 21, 3) float32  pixels, NaN where no hand or outside the frame
+#   hand_count  (F,)          uint8
+#   handedness  (F, H)        uint8    HAND_LEFT / HAND_RIGHT, NO_HAND where no hand
+#   scores      (F, H)        float32  detection confidence, NaN where no hand
+#   gesture     (F, H)        uint8    GESTURE_* the live client reports (GestureEngine), GESTURE_NONE where no hand
+#   fist        (F, H)        bool     gesture is GESTURE_FIST, the client's FLAG_FIST
+#   timestamp   (F,)          float64  seconds into the video
+# plus fps, width, height and source. Finished videos are skipped when run again.
+import argparse
+import multiprocessing
+import os
+import shutil
+import time
+
+import numpy as np
+
+from landmark_protocol import GESTURE_FIST, GESTURE_NONE, HAND_LANDMARK_COUNT
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+FORMAT_NPZ = "npz"
+FORMAT_NPY = "npy"
+# handedness of a hand slot without a hand
+NO_HAND = 255
+
+
+def output_paths(videos, output_dir, output_format):
+    """Dataset path of every video, named by its path below their common directory; ValueError on a clash."""
+    videos = [os.path.abspath(video) for video in videos]
+    if not videos:
+        return []
+    base = os.path.commonpath([os.path.dirname(video) for video in videos])
+    paths = []
+    for video in videos:
+        name = os.path.splitext(os.path.relpath(video, base))[0].replace(os.sep, "__")
+        paths.append(os.path.join(output_dir, name + (".npz" if output_format == FORMAT_NPZ else "")))
+
+    seen = {}
+    for video, path in zip(videos, paths):
+        if path in seen:
+            raise ValueError(f"{seen[path]} and {video} would both be written to {path}")
+        seen[path] = video
+    return paths
+
+
+def extract_video(task):
+    """Worker: run MediaPipe over one video and write its dataset. Errors are returned, not raised."""
+    video, output, output_format, options = task
+    start = time.perf_counter()
+    try:
+        frames = _extract(video, output, output_format, **options)
+    except Exception as e:
+        return {"video": video, "pid": os.getpid(), "error": f"{type(e).__name__}: {e}"}
+    return {"video": video, "pid": os.getpid(), "frames": frames, "seconds": time.perf_counter() - start}
+
+
+def _extract(video, output, output_format, max_hands=2, model_complexity=1, use_roi=False, flip=False):
+    # Imported here so the parent starts without a camera stack
+    import cv2
+    import mediapipe as mp
+
+    from frame_sources import open_source
+    from gestures import GestureEngine
+    from landmark_extraction import hand_info, results_array, to_pixels
+    from roi_tracking import RoiTracker
+
+    source = open_source(video, realtime=False)
+    # A fresh tracker per video, so tracking state does not carry over from the previous one
+    hands = mp.solutions.hands.Hands(max_num_hands=max_hands, model_complexity=model_complexity)
+    roi_tracker = None
+    if use_roi:
+        detector = mp.solutions.hands.Hands(static_image_mode=True, max_num_hands=max_hands,
+                                            model_complexity=model_complexity)
+        roi_tracker = RoiTracker(hands, detector)
+    # Gestures with the live client's thresholds and debouncing, so the dataset labels what it would send
+    gestures = GestureEngine()
+    columns = {name: [] for name in ("landmarks", "hand_count", "handedness", "scores", "gesture")}
+    try:
+        while True:
+            frame = source.read()
+            if frame is None:
+                break
+            if flip:
+                frame = cv2.flip(frame, 1)
+            if roi_tracker is not None:
+                results = roi_tracker.process(frame)
+            else:
+                results = hands.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+            # Fixed size rows, padded where fewer than max_hands hands were found
+            landmarks = np.full((max_hands, HAND_LANDMARK_COUNT, 3), np.nan, dtype=np.float32)
+            handedness = np.full(max_hands, NO_HAND, dtype=np.uint8)
+            scores = np.full(max_hands, np.nan, dtype=np.float32)
+            gesture = np.full(max_hands, GESTURE_NONE, dtype=np.uint8)
+            count = 0
+            if results.multi_hand_landmarks:
+                normalized = results_array(results)[:max_hands]
+                count = len(normalized)
+                landmarks[:count] = to_pixels(normalized, frame.shape)
+                hand_handedness, hand_scores = hand_info(results)
+                handedness[:count] = hand_handedness[:count]
+                scores[:count] = hand_scores[:count]
+            timestamp = (source.frames - 1) / source.fps
+            gestures.update(landmarks[:count], handedness[:count] if count else None, timestamp)
+            gesture[:count] = gestures.hand_gestures
+
+            columns["landmarks"].append(landmarks)
+            columns["hand_count"].append(count)
+            columns["handedness"].append(handedness)
+            columns["scores"].append(scores)
+            columns["gesture"].append(gesture)
+    finally:
+        source.close()
+        hands.close()
+        if roi_tracker is not None:
+            roi_tracker.detector.close()
+
+    frame_count = len(columns["hand_count"])
+    gesture = np.array(columns["gesture"], dtype=np.uint8).reshape(-1, max_hands)
+    dataset = {
+        "landmarks": np.array(columns["landmarks"], dtype=np.float32).reshape(-1, max_hands, HAND_LANDMARK_COUNT, 3),
+        "hand_count": np.array(columns["hand_count"], dtype=np.uint8),
+        "handedness": np.array(columns["handedness"], dtype=np.uint8).reshape(-1, max_hands),
+        "scores": np.array(columns["scores"], dtype=np.float32).reshape(-1, max_hands),
+        "gesture": gesture,
+        "fist": gesture == GESTURE_FIST,
+        "timestamp": np.arange(frame_count) / source.fps,
+        "fps": np.float64(source.fps),
+        "width": np.int32(source.width),
+        "height": np.int32(source.height),
+        "source": np.str_(os.path.abspath(video)),
+    }
+    _write(dataset, output, output_format)
+    return frame_count
+
+
+def _write(dataset, output, output_format):
+    """Write next to the target and rename when complete, so only finished videos count as done."""
+    if output_format == FORMAT_NPZ:
+        temporary_path = output + ".tmp.npz"
+        np.savez_compressed(temporary_path, **dataset)
+        os.replace(temporary_path, output)
+        return
+
+    temporary_path = output + ".tmp"
+    shutil.rmtree(temporary_path, ignore_errors=True)
+    os.makedirs(temporary_path)
+    for name, values in dataset.items():
+        np.save(os.path.join(temporary_path, name + ".npy"), values)
+    # A directory can only be renamed over an empty one
+    shutil.rmtree(output, ignore_errors=True)
+    os.replace(temporary_path, output)
+
+
+def find_videos(inputs):
+    """Video files from the arguments; a directory stands for the videos directly inside it."""
+    videos = []
+    for path in inputs:
+        if os.path.isdir(path):
+            videos.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                 if name.lower().endswith(VIDEO_EXTENSIONS)))
+        else:
+            videos.append(path)
+    return videos
+
+
+def run(videos, output_dir, output_format=FORMAT_NPZ, workers=None, overwrite=False, **options):
+    """Extract every video that has no dataset yet. Returns the per-video results."""
+    # The same file given twice is extracted once
+    videos = list(dict.fromkeys(os.path.abspath(video) for video in videos))
+    outputs = output_paths(videos, output_dir, output_format)
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = []
+    for video, output in zip(videos, outputs):
+        if os.path.exists(output) and not overwrite:
+            print(f"Skipping {video}: {output} exists")
+            continue
+        tasks.append((video, output, output_format, options))
+    if not tasks:
+        print("Nothing to do")
+        return []
+
+    workers = min(workers or max(1, os.cpu_count() // 2), len(tasks))
+    print(f"Extracting {len(tasks)} of {len(videos)} videos with {workers} worker(s)")
+    results = []
+    workers_seen = {}  # pid -> [videos, frames, seconds]
+    start = time.perf_counter()
+    # One video per task: videos differ in length, so workers take the next one when they are done
+    with multiprocessing.Pool(workers) as pool:
+        for result in pool.imap_unordered(extract_video, tasks):
+            results.append(result)
+            if "error" in result:
+                print(f"[{len(results)}/{len(tasks)}] {result['video']}: failed, {result['error']}")
+                continue
+            totals = workers_seen.setdefault(result["pid"], [0, 0, 0.0])
+            totals[0] += 1
+            totals[1] += result["frames"]
+            totals[2] += result["seconds"]
+            print(f"[{len(results)}/{len(tasks)}] {result['video']}: {result['frames']} frames in "
+                  f"{result['seconds']:.1f} s, {result['frames'] / result['seconds']:.1f} fps (worker {result['pid']})")
+
+    elapsed = time.perf_counter() - start
+    for pid, (video_count, frames, seconds) in sorted(workers_seen.items()):
+        print(f"Worker {pid}: {video_count} video(s), {frames} frames, {frames / seconds:.1f} fps")
+    frames = sum(result.get("frames", 0) for result in results)
+    failed = sum("error" in result for result in results)
+    print(f"Total: {frames} frames in {elapsed:.1f} s, {frames / elapsed:.1f} fps"
+          + (f", {failed} video(s) failed" if failed else ""))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract hand landmark datasets from recorded videos")
+    parser.add_argument("inputs", nargs="+", help="video files, or directories of videos")
+    parser.add_argument("--output", required=True, help="directory for the datasets")
+    parser.add_argument("--format", choices=(FORMAT_NPZ, FORMAT_NPY), default=FORMAT_NPZ,
+                        help="one compressed .npz per video, or a directory of memory-mappable .npy columns")
+    parser.add_argument("--workers", type=int, help="processes (default: half the CPUs, MediaPipe is threaded)")
+    parser.add_argument("--overwrite", action="store_true", help="extract videos that already have a dataset again")
+    parser.add_argument("--max-hands", type=int, default=2)
+    parser.add_argument("--model-complexity", type=int, choices=(0, 1), default=1)
+    parser.add_argument("--roi", action="store_true", help="track hands in a crop around the previous frame's")
+    parser.add_argument("--flip", action="store_true", help="mirror frames, like the live client does")
+    args = parser.parse_args()
+
+    try:
+        run(find_videos(args.inputs), args.output, args.format, args.workers, args.overwrite,
+            max_hands=args.max_hands, model_complexity=args.model_complexity, use_roi=args.roi, flip=args.flip)
+    except ValueError as e:
+        parser.error(str(e))
@@ -0,0 +1,113 @@
+# Benchmark: per-frame cost of turning MediaPipe results into a sent message, attribute walks vs one array
+#
+# Usage: python bench_extraction.py [--frames 5000] [--hands 2]
+import argparse
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from landmark_extraction import FIST_BASE_INDICES, detect_fists, results_array, to_pixels
+from landmark_protocol import FINGERTIP_INDICES, FIST_TOKEN, HAND_LANDMARK_COUNT, encode_frame, encode_text_hands
+
+FRAME_SHAPE = (720, 1280, 3)
+
+
+def _test_results(hand_count):
+    """Stand-in for MediaPipe's results: objects with .x/.y/.z per landmark, like the protobuf messages."""
+    rng = np.random.default_rng(0)
+    hands = []
+    for _ in range(hand_count):
+        points = rng.uniform(-0.05, 1.05, (HAND_LANDMARK_COUNT, 3))
+        hands.append(SimpleNamespace(landmark=[SimpleNamespace(x=x, y=y, z=z) for x, y, z in points.tolist()]))
+    return SimpleNamespace(multi_hand_landmarks=hands)
+
+
+# The client as it was: every step walks the landmark objects again
+
+def _legacy_format_coordinates(hand_landmarks, frame_shape):
+    finger_coords = []
+    for finger_id, landmark_id in enumerate(FINGERTIP_INDICES.tolist()):
+        landmark = hand_landmarks.landmark[landmark_id]
+        x = int(landmark.x * frame_shape[1])
+        y = int(landmark.y * frame_shape[0])
+        if 0 <= x < frame_shape[1] and 0 <= y < frame_shape[0]:
+            finger_coords.append(f"{finger_id},{x},{y}")
+    return ";".join(finger_coords) + "\n"
+
+
+def _legacy_is_fist(hand_landmarks):
+    for tip, base in zip(FINGERTIP_INDICES.tolist(), FIST_BASE_INDICES.tolist()):
+        if hand_landmarks.landmark[tip].z - hand_landmarks.landmark[base].z > -0.1:
+            return False
+    return True
+
+
+def _legacy_hand_array(hand_landmarks, frame_shape):
+    height, width = frame_shape[:2]
+    coords = np.array(
+        [(landmark.x, landmark.y, landmark.z) for landmark in hand_landmarks.landmark], dtype=np.float32
+    ) * (width, height, width)
+    outside = (coords[:, 0] < 0) | (coords[:, 0] >= width) | (coords[:, 1] < 0) | (coords[:, 1] >= height)
+    coords[outside] = np.nan
+    return coords
+
+
+def legacy_text(results):
+    message = ""
+    for hand_landmarks in results.multi_hand_landmarks:
+        fist = _legacy_is_fist(hand_landmarks)
+        coord_str = _legacy_format_coordinates(hand_landmarks, FRAME_SHAPE)  # Once to print ...
+        message += FIST_TOKEN if fist else _legacy_format_coordinates(hand_landmarks, FRAME_SHAPE)  # ... once to send
+    return message.encode('utf-8')
+
+
+def legacy_binary(results, sequence):
+    fists = [_legacy_is_fist(hand_landmarks) for hand_landmarks in results.multi_hand_landmarks]
+    landmarks = np.stack([_legacy_hand_array(hand_landmarks, FRAME_SHAPE) for hand_landmarks in results.multi_hand_landmarks])
+    return encode_frame(landmarks, sequence, 0.0, int(any(fists)))
+
+
+# The client now: one array per frame
+
+def array_text(results):
+    normalized = results_array(results)
+    landmarks = to_pixels(normalized, FRAME_SHAPE)
+    fists = detect_fists(normalized)
+    return encode_text_hands(landmarks, fists.tolist())
+
+
+def array_binary(results, sequence):
+    normalized = results_array(results)
+    landmarks = to_pixels(normalized, FRAME_SHAPE)
+    return encode_frame(landmarks, sequence, 0.0, int(detect_fists(normalized).any()))
+
+
+def bench(function, results, frame_count):
+    start = time.perf_counter()
+    for sequence in range(frame_count):
+        function(results, sequence)
+    return (time.perf_counter() - start) / frame_count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare landmark extraction and encoding per frame")
+    parser.add_argument("--frames", type=int, default=5000)
+    parser.add_argument("--hands", type=int, default=2)
+    args = parser.parse_args()
+
+    results = _test_results(args.hands)
+    # Same fingertips and fist flags either way
+    assert legacy_binary(results, 0) == array_binary(results, 0)
+    assert legacy_text(results) == array_text(results)
+
+    cases = (
+        ("text", lambda r, s: legacy_text(r), lambda r, s: array_text(r)),
+        ("binary", legacy_binary, array_binary),
+    )
+    print(f"{args.hands} hand(s), {args.frames} frames")
+    for name, before, after in cases:
+        before_time = bench(before, results, args.frames)
+        after_time = bench(after, results, args.frames)
+        print(f"{name:<7} before {before_time * 1e6:7.1f} us/frame, after {after_time * 1e6:7.1f} us/frame "
+              f"({before_time / after_time:.1f}x)")
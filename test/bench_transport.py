@@ -0,0 +1,135 @@
+# Benchmark: per-frame latency and CPU of the loopback socket vs the shared memory ring
+#
+# Usage: python bench_transport.py [--frames 3000] [--rate 240]
+import argparse
+import multiprocessing
+import socket
+import time
+
+import numpy as np
+
+from landmark_protocol import HAND_LANDMARK_COUNT, encode_frame
+from shm_transport import SharedFrameRing
+from stream_framing import FrameReader
+
+BENCH_PORT = 12341
+BENCH_RING_NAME = "freecad_hand_tracking_bench"
+
+
+def _test_landmarks():
+    return np.random.default_rng(0).uniform(0, 720, (2, HAND_LANDMARK_COUNT, 3)).astype(np.float32)
+
+
+def _paced(frame_count, rate):
+    """Yield frame numbers at the requested rate."""
+    interval = 1.0 / rate
+    next_time = time.monotonic()
+    for sequence in range(frame_count):
+        yield sequence
+        next_time += interval
+        delay = next_time - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def socket_writer(frame_count, rate, results):
+    landmarks = _test_landmarks()
+    sock = socket.create_connection(('localhost', BENCH_PORT))
+    cpu_start = time.process_time()
+    for sequence in _paced(frame_count, rate):
+        sock.sendall(encode_frame(landmarks, sequence, time.monotonic()))
+    results.put(time.process_time() - cpu_start)
+    sock.close()
+
+
+def shm_writer(frame_count, rate, ready, done, results):
+    landmarks = _test_landmarks()
+    ring = SharedFrameRing(name=BENCH_RING_NAME, create=True)
+    ready.set()
+    cpu_start = time.process_time()
+    for sequence in _paced(frame_count, rate):
+        ring.write(landmarks, sequence, time.monotonic())
+    results.put(time.process_time() - cpu_start)
+
+    # Keep the ring alive until the reader has detached
+    done.wait()
+    ring.close()
+
+
+def bench_socket(frame_count, rate):
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(('localhost', BENCH_PORT))
+    server.listen(1)
+
+    results = multiprocessing.Queue()
+    writer = multiprocessing.Process(target=socket_writer, args=(frame_count, rate, results))
+    writer.start()
+    client, _ = server.accept()
+
+    reader = FrameReader()
+    latencies = []
+    cpu_start = time.process_time()
+    while reader.recv_from(client):
+        for frame in reader.read_frames():
+            latencies.append(time.monotonic() - frame.timestamp)
+    reader_cpu = time.process_time() - cpu_start
+
+    writer_cpu = results.get()
+    writer.join()
+    client.close()
+    server.close()
+    return latencies, reader_cpu, writer_cpu
+
+
+def bench_shm(frame_count, rate, poll_interval):
+    ready = multiprocessing.Event()
+    done = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    writer = multiprocessing.Process(target=shm_writer, args=(frame_count, rate, ready, done, results))
+    writer.start()
+    ready.wait()
+
+    ring = SharedFrameRing(name=BENCH_RING_NAME)
+    latencies = []
+    cpu_start = time.process_time()
+    while True:
+        frame = ring.read_latest()
+        if frame is None:
+            if not writer.is_alive() or results.qsize():
+                break
+            time.sleep(poll_interval)
+            continue
+        latencies.append(time.monotonic() - frame.timestamp)
+        if frame.sequence == frame_count - 1:
+            break
+    reader_cpu = time.process_time() - cpu_start
+
+    del frame
+    ring.close()
+    writer_cpu = results.get()
+    done.set()
+    writer.join()
+    return latencies, reader_cpu, writer_cpu
+
+
+def report(name, frame_count, latencies, reader_cpu, writer_cpu):
+    latencies_ms = np.array(latencies) * 1000
+    print(f"{name:<8} {len(latencies):>7} "
+          f"{np.percentile(latencies_ms, 50):>9.3f} {np.percentile(latencies_ms, 99):>9.3f} "
+          f"{reader_cpu / max(len(latencies), 1) * 1e6:>15.1f} {writer_cpu / frame_count * 1e6:>15.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the socket and shared memory transports")
+    parser.add_argument("--frames", type=int, default=3000, help="frames to send per transport")
+    parser.add_argument("--rate", type=float, default=240.0, help="frames per second")
+    parser.add_argument("--poll-interval", type=float, default=0.0005,
+                        help="shared memory reader poll interval in seconds "
+                             "(FreeCAD polls on its update timer, every 1/60 s)")
+    args = parser.parse_args()
+
+    print(f"{args.frames} frames at {args.rate:.0f} fps")
+    print(f"{'':<8} {'frames':>7} {'p50 ms':>9} {'p99 ms':>9} {'reader us/frame':>15} {'writer us/frame':>15}")
+    report("socket", args.frames, *bench_socket(args.frames, args.rate))
+    report("shm", args.frames, *bench_shm(args.frames, args.rate, args.poll_interval))
@@ -0,0 +1,2 @@
+# FreeCAD modules whose names look like tests to pytest
+collect_ignore = ["setup_test.py", "test_commands.py"]
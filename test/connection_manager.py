@@ -0,0 +1,230 @@
+# Keeps the tracking client's link to FreeCAD up without ever blocking the capture loop
+import errno
+import select
+import socket
+import time
+
+from counters import Counters
+from frame_sender import LatestFrameSender
+from landmark_protocol import HEADER_SIZE, KIND_ACK, ProtocolError, decode_ack, decode_header, encode_heartbeat
+from latency import measure_clock_offset
+
+
+class ReconnectingConnection(Counters):
+    """Non-blocking link to the tracking server that reconnects with backoff and drops frames meanwhile."""
+
+    COUNTERS = ("connects", "dropped_frames", "dropped_messages", "heartbeats", "acks")
+
+    def __init__(self, address, transport="tcp", binary=True, udp_fallback_to_tcp=True, on_connect=None,
+                 on_ack=None, initial_backoff=0.1, max_backoff=5.0, heartbeat_interval=1.0):
+        self.address = address
+        self.transport = transport
+        # A refused UDP port only means "try TCP" while the server is up; once
+        # the connection is lost or TCP fails too, go back to the configured transport
+        self.preferred_transport = transport
+        self.binary = binary
+        self.udp_fallback_to_tcp = udp_fallback_to_tcp
+        self.on_connect = on_connect
+        self.on_ack = on_ack
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.heartbeat_interval = heartbeat_interval
+
+        self.sock = None
+        self.sender = None  # Only set while connected
+        self.connecting = False
+        self.backoff = initial_backoff
+        self.next_attempt = 0.0
+        self.last_send = 0.0
+        self.clock_offset = 0.0  # Added to our timestamps to put them in the server's clock
+        self.failed_attempts = 0  # Since the last successful connect
+        self.reset_counters()
+
+    @property
+    def connected(self):
+        return self.sender is not None
+
+    @property
+    def pending(self):
+        """True while the previous frame is still (partly) unsent."""
+        return self.sender is not None and self.sender.pending
+
+    @property
+    def keyframe_waiting(self):
+        """True while an unsent keyframe would be replaced by the next frame; see LatestFrameSender."""
+        return self.sender is not None and self.sender.keyframe_waiting
+
+    def poll(self, now=None):
+        """Advance connecting, detect a lost connection, flush the outbox and send a heartbeat if due."""
+        now = time.monotonic() if now is None else now
+        if self.sender is None:
+            if self.connecting:
+                self._finish_connect()
+            elif now >= self.next_attempt:
+                self._start_connect()
+            return
+
+        if self.transport == "tcp" and select.select([self.sock], [], [], 0)[0]:
+            # The server never sends anything unasked, so a readable socket means it went away
+            try:
+                if not self.sock.recv(4096):
+                    self._lost("server closed the connection")
+                    return
+            except BlockingIOError:
+                pass
+            except OSError as e:
+                self._lost(e)
+                return
+        elif self.transport == "udp" and not self._read_acks():
+            return
+
+        if self.sender.pending:
+            self._submit(None)
+        elif self.binary and now - self.last_send >= self.heartbeat_interval:
+            self.heartbeats += 1
+            self._submit(encode_heartbeat(now + self.clock_offset))
+
+    def send(self, payload, keyframe=False):
+        """Queue an encoded frame. Returns False if it was dropped because we are not connected."""
+        if self.sender is None:
+            self.dropped_frames += 1
+            return False
+        return self._submit(payload, keyframe=keyframe)
+
+    def send_message(self, message):
+        """Queue a message newer frames never supersede (gestures, status). False if not connected."""
+        if self.sender is None:
+            self.dropped_messages += 1
+            return False
+        return self._submit(message, reliable=True)
+
+    def _read_acks(self):
+        """Pass the keyframe acknowledgements waiting on the UDP socket on. Returns False if the link is gone."""
+        while True:
+            try:
+                data = self.sock.recv(4096)
+            except (BlockingIOError, InterruptedError):
+                return True
+            except ConnectionRefusedError:
+                self._lost("connection refused")
+                self._fall_back_to_tcp()
+                return False
+            except OSError as e:
+                self._lost(e)
+                return False
+            # Anything else is a late clock reply, which the handshake gave up on
+            try:
+                if len(data) < HEADER_SIZE or decode_header(data)[0] != KIND_ACK:
+                    continue
+                sequence, source_id = decode_ack(data)
+            except ProtocolError:
+                continue
+            self.acks += 1
+            if self.on_ack:
+                self.on_ack(sequence, source_id)
+
+    def _submit(self, payload, reliable=False, keyframe=False):
+        try:
+            if payload is None:
+                self.sender.flush()
+            elif reliable:
+                self.sender.submit_message(payload)
+                self.last_send = time.monotonic()
+            else:
+                self.sender.submit(payload, keyframe)
+                self.last_send = time.monotonic()
+            return True
+        except ConnectionRefusedError:
+            self._lost("connection refused")
+            self._fall_back_to_tcp()
+        except OSError as e:
+            self._lost(e)
+        if reliable:
+            self.dropped_messages += 1
+        elif payload is not None:
+            self.dropped_frames += 1
+        return False
+
+    def _start_connect(self):
+        sock_type = socket.SOCK_DGRAM if self.transport == "udp" else socket.SOCK_STREAM
+        self.sock = socket.socket(socket.AF_INET, sock_type)
+        self.sock.setblocking(False)
+        error = self.sock.connect_ex(self.address)
+        if error not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            self._failed(errno.errorcode.get(error, error))
+            return
+        self.connecting = True
+        self._finish_connect()
+
+    def _finish_connect(self):
+        if not select.select([], [self.sock], [], 0)[1]:
+            return  # Still connecting, check again on the next poll
+
+        self.connecting = False
+        error = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if error:
+            self._failed(errno.errorcode.get(error, error))
+            return
+
+        if self.binary:
+            try:
+                result = measure_clock_offset(self.sock)
+            except ConnectionRefusedError:
+                self._failed("connection refused")
+                self._fall_back_to_tcp()
+                return
+            except OSError as e:
+                self._failed(e)
+                return
+            self.clock_offset = result[0] if result else 0.0
+
+        self.sender = LatestFrameSender(self.sock, datagram=(self.transport == "udp"))
+        self.failed_attempts = 0
+        self.backoff = self.initial_backoff
+        self.last_send = time.monotonic()
+        self.connects += 1
+        print(f"Connected to server at {self.address} over {self.transport.upper()}"
+              + (f", clock offset {self.clock_offset * 1000:.3f} ms" if self.binary else ""))
+        if self.on_connect:
+            self.on_connect()
+
+    def _fall_back_to_tcp(self):
+        """The server refused our datagrams: try TCP right away."""
+        if self.transport == "udp" and self.udp_fallback_to_tcp:
+            print("Server refused UDP frames, trying TCP")
+            self.transport = "tcp"
+            self.next_attempt = 0.0
+
+    def _failed(self, reason):
+        """A connect attempt failed: close the socket and wait a little longer before the next one."""
+        self.failed_attempts += 1
+        self._close()
+        self.transport = self.preferred_transport
+        self.next_attempt = time.monotonic() + self.backoff
+        if self.failed_attempts == 1 or self.backoff >= self.max_backoff:
+            print(f"Server at {self.address} unavailable ({reason}), retrying in {self.backoff:.1f} s")
+        self.backoff = min(self.backoff * 2, self.max_backoff)
+
+    def _lost(self, reason):
+        print(f"Lost connection to server ({reason}), dropping frames until it is back")
+        self._close()
+        self.transport = self.preferred_transport
+        self.failed_attempts = 0
+        self.backoff = self.initial_backoff
+        self.next_attempt = time.monotonic()
+
+    def _close(self):
+        if self.sock is not None:
+            self.sock.close()
+        self.sock = None
+        self.sender = None
+        self.connecting = False
+
+    def close(self):
+        self._close()
+
+    def stats(self):
+        stats = super().stats()
+        if self.sender is not None:
+            stats.update(self.sender.stats())
+        return stats
@@ -0,0 +1,14 @@
+# Event counters shared by the transport, tracking and replay classes
+
+
+class Counters:
+    """Mixin for classes that count events; COUNTERS names the attributes stats() reports."""
+
+    COUNTERS = ()
+
+    def reset_counters(self):
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+
+    def stats(self):
+        return {name: getattr(self, name) for name in self.COUNTERS}
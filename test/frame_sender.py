@@ -0,0 +1,82 @@
+# Non-blocking sender used by the tracking client
+from collections import deque
+
+from counters import Counters
+
+
+class LatestFrameSender(Counters):
+    """Non-blocking sender that keeps only the newest unsent frame, plus messages that are never dropped."""
+
+    COUNTERS = ("frames_submitted", "frames_sent", "frames_superseded", "messages_sent", "bytes_sent")
+
+    def __init__(self, sock, datagram=False):
+        sock.setblocking(False)
+        self.sock = sock
+        self.datagram = datagram
+        self._outbox = None  # Newest frame, not started yet
+        self._messages = deque()  # Messages that are never superseded, sent before the outbox
+        self._in_flight = None  # memoryview of the frame or message currently being written
+        self._in_flight_is_frame = False
+        self._outbox_keyframe = False
+        self._in_flight_keyframe = False  # Only tracked for datagrams, the one case it can be replaced
+        self.reset_counters()
+
+    @property
+    def pending(self):
+        return self._in_flight is not None or self._outbox is not None or bool(self._messages)
+
+    @property
+    def keyframe_waiting(self):
+        """True while a keyframe is queued but not sent yet, so the next frame would replace it."""
+        return ((self._outbox is not None and self._outbox_keyframe)
+                or (self.datagram and self._in_flight is not None and self._in_flight_keyframe))
+
+    def submit(self, payload, keyframe=False):
+        """Queue payload as the newest frame and send whatever the socket accepts now."""
+        self.frames_submitted += 1
+        if self._outbox is not None:
+            self.frames_superseded += 1
+        if self.datagram and self._in_flight is not None and self._in_flight_is_frame:
+            # Datagrams are never partly sent, so a waiting one can be replaced too
+            self._in_flight = None
+            self.frames_superseded += 1
+
+        self._outbox = payload
+        self._outbox_keyframe = keyframe
+        return self.flush()
+
+    def submit_message(self, message):
+        """Queue a message that is sent in order and never superseded, then send what the socket accepts."""
+        self._messages.append(message)
+        return self.flush()
+
+    def flush(self):
+        """Write as much as possible without blocking. Returns True once nothing is pending."""
+        while True:
+            if self._in_flight is None:
+                if self._messages:
+                    self._in_flight = memoryview(self._messages.popleft())
+                    self._in_flight_is_frame = False
+                    self._in_flight_keyframe = False
+                elif self._outbox is not None:
+                    self._in_flight = memoryview(self._outbox)
+                    self._in_flight_is_frame = True
+                    self._in_flight_keyframe = self._outbox_keyframe
+                    self._outbox = None
+                else:
+                    return True
+
+            try:
+                sent = self.sock.send(self._in_flight)
+            except (BlockingIOError, InterruptedError):
+                return False
+
+            self.bytes_sent += sent
+            if self.datagram or sent == len(self._in_flight):
+                if self._in_flight_is_frame:
+                    self.frames_sent += 1
+                else:
+                    self.messages_sent += 1
+                self._in_flight = None
+            else:
+                self._in_flight = self._in_flight[sent:]
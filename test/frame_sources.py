@@ -0,0 +1,200 @@
+# Frame sources for the tracking clients: camera, video file, image directory or synthetic frames
+import os
+import time
+
+import cv2
+import numpy as np
+
+SOURCE_SYNTHETIC = "synthetic"
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+class Pacer:
+    """Releases frames at fps in real time, or as fast as they come when realtime is False."""
+
+    def __init__(self, fps, realtime=True):
+        self.interval = 1.0 / fps if fps and realtime else 0.0
+        self.next_time = None
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self.next_time is None or now - self.next_time > self.interval:
+            # First frame, or we fell behind: pace from here instead of rushing to catch up
+            self.next_time = now
+        elif self.next_time > now:
+            time.sleep(self.next_time - now)
+        self.next_time += self.interval
+
+
+class FrameSource:
+    """Base class: read() returns the next BGR frame, or None at the end of the source."""
+
+    name = "source"
+
+    def __init__(self):
+        self.width = 0
+        self.height = 0
+        self.fps = 0.0
+        self.frames = 0  # Read so far
+
+    def read(self):
+        frame = self._read()
+        if frame is not None:
+            self.frames += 1
+        return frame
+
+    def _read(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def describe(self):
+        return f"{self.name} {self.width}x{self.height} at {self.fps:.0f} fps"
+
+
+class CameraSource(FrameSource):
+    """A live camera with a one-frame driver buffer, so read() returns the newest frame."""
+
+    name = "camera"
+
+    def __init__(self, index=0, width=None, height=None, fps=None, buffer_size=1):
+        super().__init__()
+        self.capture = cv2.VideoCapture(index)
+        if not self.capture.isOpened():
+            raise IOError(f"cannot open camera {index}")
+        if buffer_size:
+            self.capture.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+        if width and height:
+            self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if fps:
+            self.capture.set(cv2.CAP_PROP_FPS, fps)
+        self.width = int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS)
+
+    def _read(self):
+        ret, frame = self.capture.read()
+        return frame if ret else None
+
+    def close(self):
+        self.capture.release()
+
+
+class VideoFileSource(FrameSource):
+    """A recorded video, played at its own frame rate or, with realtime=False, as fast as it decodes."""
+
+    name = "video"
+
+    def __init__(self, path, realtime=True, loop=False):
+        super().__init__()
+        self.path = path
+        self.loop = loop
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise IOError(f"cannot open video {path!r}")
+        self.width = int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 30.0
+        self.pacer = Pacer(self.fps, realtime)
+
+    def _read(self):
+        ret, frame = self.capture.read()
+        if not ret and self.loop and self.frames:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.capture.read()
+        if not ret:
+            return None
+        self.pacer.wait()
+        return frame
+
+    def close(self):
+        self.capture.release()
+
+
+class ImageDirectorySource(FrameSource):
+    """The images of a directory in name order, as a video at fps."""
+
+    name = "images"
+
+    def __init__(self, path, fps=30.0, realtime=True, loop=False):
+        super().__init__()
+        self.path = path
+        self.loop = loop
+        self.files = sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.lower().endswith(IMAGE_EXTENSIONS))
+        if not self.files:
+            raise IOError(f"no images in {path!r}")
+        first = cv2.imread(self.files[0])
+        if first is None:
+            raise IOError(f"cannot read {self.files[0]!r}")
+        self.height, self.width = first.shape[:2]
+        self.fps = fps
+        self.pacer = Pacer(fps, realtime)
+        self.position = 0
+
+    def _read(self):
+        if self.position >= len(self.files):
+            if not self.loop:
+                return None
+            self.position = 0
+        frame = cv2.imread(self.files[self.position])
+        self.position += 1
+        if frame is None:
+            raise IOError(f"cannot read {self.files[self.position - 1]!r}")
+        self.pacer.wait()
+        return frame
+
+    def describe(self):
+        return f"{super().describe()}, {len(self.files)} images"
+
+
+class SyntheticSource(FrameSource):
+    """Generated frames of a sprite circling over a noise background; pass a hand image to get detections."""
+
+    name = "synthetic"
+
+    def __init__(self, width=1280, height=720, fps=30.0, realtime=True, frame_count=None, sprite=None, seed=0):
+        super().__init__()
+        self.width, self.height, self.fps = width, height, fps
+        self.frame_count = frame_count
+        self.pacer = Pacer(fps, realtime)
+        self.background = np.random.default_rng(seed).integers(0, 64, (height, width, 3), dtype=np.uint8)
+        if sprite is None:
+            size = min(width, height) // 4
+            sprite = np.zeros((size, size, 3), dtype=np.uint8)
+            cv2.circle(sprite, (size // 2, size // 2), size // 2 - 1, (120, 160, 220), -1)
+        self.sprite = sprite
+        self.sprite_mask = sprite.any(axis=2)
+
+    def _read(self):
+        if self.frame_count is not None and self.frames >= self.frame_count:
+            return None
+        # One lap every four seconds of video time, whatever the pacing
+        angle = 2 * np.pi * self.frames / (4 * self.fps)
+        sprite_height, sprite_width = self.sprite.shape[:2]
+        x = int((self.width - sprite_width) * (0.5 + 0.4 * np.cos(angle)))
+        y = int((self.height - sprite_height) * (0.5 + 0.4 * np.sin(angle)))
+
+        frame = self.background.copy()
+        region = frame[y:y + sprite_height, x:x + sprite_width]
+        region[self.sprite_mask] = self.sprite[self.sprite_mask]
+        self.pacer.wait()
+        return frame
+
+
+def open_source(source, width=None, height=None, buffer_size=1, realtime=True, loop=False):
+    """Open a camera index, "synthetic[:WxH]", image directory or video file; realtime=False skips pacing."""
+    if isinstance(source, int) or str(source).isdigit():
+        return CameraSource(int(source), width, height, buffer_size=buffer_size)
+    if source == SOURCE_SYNTHETIC or source.startswith(SOURCE_SYNTHETIC + ":"):
+        _, _, size = source.partition(":")
+        if size:
+            width, height = (int(value) for value in size.lower().split("x"))
+        return SyntheticSource(width or 1280, height or 720, realtime=realtime)
+    if os.path.isdir(source):
+        return ImageDirectorySource(source, realtime=realtime, loop=loop)
+    return VideoFileSource(source, realtime=realtime, loop=loop)
@@ -0,0 +1,164 @@
+# Gesture recognition on the client: landmark arrays in, begin/update/end gesture events out
+import numpy as np
+
+from landmark_protocol import (
+    GESTURE_FIST, GESTURE_NONE, GESTURE_OPEN_PALM, GESTURE_PINCH, GESTURE_POINT, GESTURE_TWO_FINGER, PHASE_BEGIN,
+    PHASE_END, PHASE_UPDATE, GestureEvent
+)
+
+# MediaPipe landmark indices
+WRIST = 0
+THUMB_TIP = 4
+INDEX_MCP = 5
+INDEX_TIP = 8
+MIDDLE_MCP = 9
+PINKY_MCP = 17
+# Index, middle, ring and pinky: tip and PIP joint
+FINGER_TIPS = np.array([8, 12, 16, 20])
+FINGER_PIPS = np.array([6, 10, 14, 18])
+PALM_POINTS = np.array([WRIST, INDEX_MCP, MIDDLE_MCP, 13, PINKY_MCP])
+
+# Hysteresis thresholds, (switch on, switch off). Distances are in palm lengths
+# (wrist to middle finger MCP), so they do not depend on how far the hand is from the camera.
+# A finger is extended when its tip is further from the wrist than its PIP joint by this ratio
+FINGER_EXTENDED = (1.25, 1.05)
+# Thumb tip to pinky MCP
+THUMB_EXTENDED = (0.9, 0.7)
+# Thumb tip to index tip
+PINCH = (0.25, 0.4)
+
+
+def hand_features(landmarks):
+    """(finger_extension, thumb_spread, pinch_distance) of (hands, 21, 2+) landmarks, in palm lengths."""
+    xy = landmarks[:, :, :2]
+    wrist = xy[:, WRIST]
+    palm = np.linalg.norm(xy[:, MIDDLE_MCP] - wrist, axis=-1)
+    palm[palm == 0] = np.nan
+
+    tip_reach = np.linalg.norm(xy[:, FINGER_TIPS] - wrist[:, np.newaxis], axis=-1)
+    pip_reach = np.linalg.norm(xy[:, FINGER_PIPS] - wrist[:, np.newaxis], axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        finger_extension = tip_reach / pip_reach
+    thumb_spread = np.linalg.norm(xy[:, THUMB_TIP] - xy[:, PINKY_MCP], axis=-1) / palm
+    pinch_distance = np.linalg.norm(xy[:, THUMB_TIP] - xy[:, INDEX_TIP], axis=-1) / palm
+    return finger_extension, thumb_spread, pinch_distance
+
+
+def _trigger(state, value, thresholds, above=True):
+    """Schmitt trigger: switch on past the first threshold, off only past the second. NaN keeps the state."""
+    on, off = thresholds
+    if above:
+        return np.where(state, ~(value < off), value > on)
+    return np.where(state, ~(value > off), value < on)
+
+
+class HandGestureState:
+    """Hysteresis state of one tracked hand."""
+
+    def __init__(self):
+        self.extended = np.zeros(4, dtype=bool)
+        self.thumb_extended = False
+        self.pinching = False
+        self.gesture = GESTURE_NONE  # Reported gesture
+        self.candidate = GESTURE_NONE  # Classified gesture waiting to be confirmed
+        self.candidate_frames = 0
+
+
+class GestureEngine:
+    """Classifies every hand per frame and reports gesture begin/update/end events, with hysteresis."""
+
+    def __init__(self, min_frames=2):
+        self.min_frames = min_frames
+        self.hands = {}  # hand key -> HandGestureState
+        self.hand_gestures = []  # Reported gesture per hand of the last frame, in frame order
+        self.events = 0  # Reported so far
+
+    def update(self, landmarks, handedness=None, timestamp=0.0):
+        """Classify a (hands, 21, dims) pixel array. Returns the list of GestureEvents for this frame."""
+        if handedness is not None and len(set(handedness.tolist())) == len(handedness):
+            keys = handedness.tolist()
+        else:
+            keys = list(range(len(landmarks)))
+
+        events = []
+        self.hand_gestures = []
+        if len(landmarks):
+            finger_extension, thumb_spread, pinch_distance = hand_features(landmarks)
+            for index, key in enumerate(keys):
+                state = self.hands.get(key)
+                if state is None:
+                    state = self.hands[key] = HandGestureState()
+                state.extended = _trigger(state.extended, finger_extension[index], FINGER_EXTENDED)
+                state.thumb_extended = bool(_trigger(state.thumb_extended, thumb_spread[index], THUMB_EXTENDED))
+                state.pinching = bool(_trigger(state.pinching, pinch_distance[index], PINCH, above=False))
+
+                # A hand partly outside the frame shows no gesture rather than a guessed one
+                hidden = np.isnan(finger_extension[index]).any() or np.isnan(pinch_distance[index])
+                gesture = GESTURE_NONE if hidden else self._classify(state)
+                anchor = self._anchor(landmarks[index], state)
+                events.extend(self._advance(state, key, gesture, anchor, pinch_distance[index], timestamp))
+                self.hand_gestures.append(state.gesture)
+
+        # Hands that left the view end their gesture
+        for key in [key for key in self.hands if key not in keys]:
+            state = self.hands.pop(key)
+            if state.gesture != GESTURE_NONE:
+                events.append(GestureEvent(state.gesture, PHASE_END, key, timestamp=timestamp))
+
+        self.events += len(events)
+        return events
+
+    def reset(self):
+        """Forget every hand, e.g. after a reconnect. Returns END events for the active gestures."""
+        events = [GestureEvent(state.gesture, PHASE_END, key)
+                  for key, state in self.hands.items() if state.gesture != GESTURE_NONE]
+        self.hands = {}
+        self.hand_gestures = []
+        return events
+
+    @staticmethod
+    def _classify(state):
+        index, middle, ring, pinky = state.extended.tolist()
+        if not (index or middle or ring or pinky):
+            return GESTURE_FIST
+        if state.pinching:
+            return GESTURE_PINCH
+        if index and not (middle or ring or pinky):
+            return GESTURE_POINT
+        if index and middle and not (ring or pinky):
+            return GESTURE_TWO_FINGER
+        if index and middle and ring and pinky and state.thumb_extended:
+            return GESTURE_OPEN_PALM
+        return GESTURE_NONE
+
+    @staticmethod
+    def _anchor(hand, state):
+        if state.pinching:
+            point = (hand[THUMB_TIP, :2] + hand[INDEX_TIP, :2]) / 2
+        elif state.extended[0]:
+            point = hand[INDEX_TIP, :2]
+        else:
+            point = np.nanmean(hand[PALM_POINTS, :2], axis=0)
+        return point
+
+    def _advance(self, state, key, gesture, anchor, pinch_distance, timestamp):
+        """Debounce the classification and produce this hand's events."""
+        if gesture == state.candidate:
+            state.candidate_frames += 1
+        else:
+            state.candidate, state.candidate_frames = gesture, 1
+
+        events = []
+        if state.candidate != state.gesture and state.candidate_frames >= self.min_frames:
+            if state.gesture != GESTURE_NONE:
+                events.append(GestureEvent(state.gesture, PHASE_END, key, timestamp=timestamp))
+            state.gesture = state.candidate
+            phase = PHASE_BEGIN
+        else:
+            phase = PHASE_UPDATE
+
+        if state.gesture != GESTURE_NONE:
+            value = float(pinch_distance) if state.gesture == GESTURE_PINCH else 0.0
+            x, y = anchor.tolist()
+            events.append(GestureEvent(state.gesture, phase, key, x, y, value, timestamp))
+        return events
@@ -282,5 +282,6 @@ Examples:
     def closeEvent(self, event):
         """Handle application closing."""
         self.command_window.close()
+        self.server_connect.stop()
         super().closeEvent(event)
 
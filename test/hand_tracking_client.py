@@ -1,134 +1,420 @@
-import socket
+import time
 import cv2
 import mediapipe as mp
+import numpy as np
+
+from connection_manager import ReconnectingConnection
+from frame_sources import open_source
+from gestures import GestureEngine
+from inference_governor import InferenceGovernor
+from landmark_extraction import hand_info, results_array, to_pixels
+from landmark_filter import HandFilters
+from landmark_protocol import (
+    FLAG_FIST, GESTURE_FIST, HAND_LANDMARK_COUNT, KIND_FRAME, STAGE_CAPTURE, STAGE_INFERENCE, STAGE_SEND,
+    DeltaEncoder, encode_gestures, encode_status, encode_text_hands
+)
+from latency import LatencyRecorder
+from motion_gate import MotionGate
+from pipeline import LatestSlot, PipelineStage, StopPipeline, format_stats
+from roi_tracking import RoiTracker
+from shm_transport import SharedFrameRing
+
+# Wire format: "binary" (landmark frames) or "text" for servers that only understand "id,x,y;"
+PROTOCOL = "binary"
+
+# Binary encoding: "delta" (keyframes plus quantized changes) or "full" (every frame complete)
+ENCODING = "delta"
+# Delta encoding: a keyframe every N frames, landmarks that moved less than this many pixels are not sent
+KEYFRAME_INTERVAL = 30
+DELTA_THRESHOLD = 0.5
+
+# Transport: "tcp", "udp" (one binary frame per datagram, the server drops stale ones)
+# or "shm" (shared memory ring, only when FreeCAD runs on the same machine; slower than
+# tcp, see shm_transport.py)
+TRANSPORT = "tcp"
+# Switch to TCP if the server refuses UDP datagrams
+UDP_FALLBACK_TO_TCP = True
+# While FreeCAD is down, keep the camera and MediaPipe running and retry after 0.1 s, 0.2 s, ... up to this
+MAX_RECONNECT_BACKOFF = 5.0
+# Binary links send a heartbeat after this many seconds without a frame (e.g. no hands in view)
+HEARTBEAT_INTERVAL = 1.0
+
+# Run MediaPipe on a crop around the previous frame's hands instead of the whole frame.
+# The crop grows by ROI_MARGIN of the hand size on each side and is downsampled to at most
+# ROI_MAX_SIZE pixels; the full frame is searched again every ROI_REDETECT_INTERVAL frames.
+ROI_TRACKING = True
+ROI_MARGIN = 0.3
+ROI_MAX_SIZE = 480
+ROI_REDETECT_INTERVAL = 30
+
+# Skip MediaPipe on frames that look like the last processed one (still hand, empty view) and
+# reuse its landmarks. A frame is new when more than MOTION_MIN_CHANGED of the pixels of a
+# MOTION_WIDTH wide grayscale thumbnail changed by over MOTION_PIXEL_THRESHOLD grey levels.
+# At most MOTION_MAX_SKIP frames are skipped in a row.
+MOTION_GATE = True
+MOTION_WIDTH = 160
+MOTION_PIXEL_THRESHOLD = 15
+MOTION_MIN_CHANGED = 0.001
+MOTION_MAX_SKIP = 10
+
+# Adapt MediaPipe to the machine: while inference runs below GOVERNOR_MIN_FPS, step down to a lighter
+# model, a smaller input and fewer hands; above GOVERNOR_MAX_FPS step back up. The operating point
+# is reported to the server (binary protocol over TCP or UDP), which adjusts its smoothing to it.
+GOVERNOR = True
+GOVERNOR_MIN_FPS = 20.0
+GOVERNOR_MAX_FPS = 40.0
+
+# Send pinch, fist, point, open palm and two-finger gestures as begin/update/end events
+# (binary protocol over TCP or UDP). The fist flag and token come from the same recognizer.
+GESTURE_EVENTS = True
+# Frames a new gesture has to be seen in before it begins
+GESTURE_MIN_FRAMES = 2
+
+# One Euro filter every landmark before it is sent and classified: less jitter, smaller deltas.
+# FreeCAD filters the fingertips itself, so this is off unless another server needs smooth input.
+# Below FILTER_MIN_CUTOFF Hz a hand counts as still; FILTER_BETA (per pixel/s) trades jitter for lag.
+LANDMARK_FILTER = False
+FILTER_MIN_CUTOFF = 1.0
+FILTER_BETA = 0.01
+
+# Camera index, the path of a video file or of a directory of images to run on recorded footage,
+# or "synthetic" (or "synthetic:640x480") for generated frames on machines without a camera
+CAPTURE_SOURCE = 0
+# Cameras: resolution to ask for (None keeps the driver's default) and frames the driver may
+# buffer; 1 means every read returns the newest frame instead of one that waited
+CAPTURE_WIDTH = 1280
+CAPTURE_HEIGHT = 720
+CAPTURE_BUFFER_SIZE = 1
+# Max speed: read files and synthetic frames as fast as the pipeline takes them instead of
+# at their frame rate, to measure inference and encoding throughput offline
+MAX_SPEED = False
+
+# Headless: no window and no drawing, and instead of printing every frame only the counters
+# below are printed every STATS_INTERVAL seconds. For kiosks and for measuring throughput.
+HEADLESS = False
+# Print every sent frame
+VERBOSE = not HEADLESS
+
+# Per-stage fps, queue drops and frame counters are printed this often (seconds)
+STATS_INTERVAL = 5.0
+
+# Capture -> inference -> send latency: drawn on the camera window and written to a JSON file every few seconds
+LATENCY_OVERLAY = True
+LATENCY_DUMP_PATH = "client_latency.json"
 
 # Initialize MediaPipe hands
 mp_hands = mp.solutions.hands
-hands = mp_hands.Hands()
+governor = InferenceGovernor(GOVERNOR_MIN_FPS, GOVERNOR_MAX_FPS) if GOVERNOR else None
+
+
+def create_hands(point, static_image_mode=False):
+    if point is None:
+        return mp_hands.Hands(static_image_mode=static_image_mode)
+    return mp_hands.Hands(static_image_mode=static_image_mode, model_complexity=point.model_complexity,
+                          max_num_hands=point.max_hands)
+
+
+hands = create_hands(governor.point if governor is not None else None)
 mp_draw = mp.solutions.drawing_utils
+# The ROI tracker redetects on full frames with its own static-mode Hands, so hands only sees crops
+roi_tracker = RoiTracker(
+    hands, create_hands(governor.point if governor is not None else None, static_image_mode=True),
+    ROI_MARGIN, ROI_MAX_SIZE, redetect_interval=ROI_REDETECT_INTERVAL
+) if ROI_TRACKING else None
+motion_gate = MotionGate(MOTION_WIDTH, MOTION_PIXEL_THRESHOLD, MOTION_MIN_CHANGED, MOTION_MAX_SKIP) if MOTION_GATE else None
 
 # Set up the socket
-client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 server_address = ('localhost', 12340)
 
-# Open webcam
-cap = cv2.VideoCapture(0)
+# Open webcam (or video file, images, synthetic frames)
+try:
+    source = open_source(CAPTURE_SOURCE, CAPTURE_WIDTH, CAPTURE_HEIGHT, CAPTURE_BUFFER_SIZE, realtime=not MAX_SPEED)
+except IOError as e:
+    print(f"Capture error: {e}")
+    exit(1)
 
-width = cap.get(cv2.CAP_PROP_FRAME_WIDTH)
-height = cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+print(f"Capturing from {source.describe()}")
 
-print(f"Default resolution: {int(width)}x{int(height)}")
 
-width = cap.get(cv2.CAP_PROP_FRAME_WIDTH)
-height = cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+if TRANSPORT != "tcp" and PROTOCOL != "binary":
+    print(f"{TRANSPORT.upper()} transport requires the binary protocol")
+    exit(1)
 
-print(f"Default resolution: {int(width)}x{int(height)}")
-def format_coordinates(hand_landmarks, frame_shape):
-    """matrix format: finger_id,x,y;finger_id,x,y;..."""
-    finger_coords = []
+# Connect to server
+encoder = DeltaEncoder(KEYFRAME_INTERVAL if ENCODING == "delta" else 1, DELTA_THRESHOLD)
+reported_point = None  # Operating point the server was last told about
 
-    # finger landmarks in order: thumb, index, middle, ring, pinky
-    fingers = [
-        mp_hands.HandLandmark.THUMB_TIP,
-        mp_hands.HandLandmark.INDEX_FINGER_TIP,
-        mp_hands.HandLandmark.MIDDLE_FINGER_TIP,
-        mp_hands.HandLandmark.RING_FINGER_TIP,
-        mp_hands.HandLandmark.PINKY_TIP
-    ]
 
-    # Get coordinates for each finger
-    for finger_id, landmark_id in enumerate(fingers):
-        landmark = hand_landmarks.landmark[landmark_id]
-        x = int(landmark.x * frame_shape[1])
-        y = int(landmark.y * frame_shape[0])
+def on_connect():
+    """A new server connection needs a keyframe first, fresh gestures and to hear our operating point."""
+    global reported_point
+    encoder.reset()
+    # The new server has seen none of our gestures begin, so they start over with BEGIN events
+    gestures.reset()
+    # Datagrams can be lost, so over UDP deltas only refer to keyframes the server acknowledged
+    encoder.acknowledged = connection.transport == "udp"
+    reported_point = None
 
-        # Only add if coordinates are within frame
-        if 0 <= x < frame_shape[1] and 0 <= y < frame_shape[0]:
-            finger_coords.append(f"{finger_id},{x},{y}")
 
-    return ";".join(finger_coords) + "\n"
+def on_ack(sequence, source_id):
+    encoder.acknowledge(sequence)
 
 
-# MARK NOTE: Only really needed to you really wanna check for a fist. Otherwise, it just does nothing but that. If you
-# decide you want this, there's also another bit you need to uncomment too. Just ctrl+f is_fist() to find it.
+connection = None
+ring = None
+if TRANSPORT == "shm":
+    try:
+        ring = SharedFrameRing(create=True)
+    except Exception as e:
+        print(f"Shared memory error: {e}")
+        exit(1)
+    print(f"Writing frames to shared memory ring '{ring.name}'")
+else:
+    # Connects in the background; a new server connection needs a keyframe first
+    connection = ReconnectingConnection(
+        server_address, TRANSPORT, binary=(PROTOCOL == "binary"), udp_fallback_to_tcp=UDP_FALLBACK_TO_TCP,
+        on_connect=on_connect, on_ack=on_ack, max_backoff=MAX_RECONNECT_BACKOFF,
+        heartbeat_interval=HEARTBEAT_INTERVAL
+    )
 
-def is_fist(hand_landmarks):
-    """Determine if the hand forms a fist based on fingertip proximity to the palm."""
+# Pipeline: capture thread -> inference thread -> send thread, plus the window on the main thread.
+# The stages are joined by single-slot queues that keep only the freshest frame, so a stall
+# in one stage never builds a backlog in front of the next one.
+sequence = 0
+hands_sent = 0
+fists_sent = 0
+gesture_events_sent = 0
+gestures = GestureEngine(GESTURE_MIN_FRAMES)
+landmark_filters = HandFilters(FILTER_MIN_CUTOFF, FILTER_BETA) if LANDMARK_FILTER else None
+NO_HANDS = np.empty((0, HAND_LANDMARK_COUNT, 3), dtype=np.float32)
+latency = LatencyRecorder(dump_path=LATENCY_DUMP_PATH)
+latency_overlay = []
+latency_overlay_time = 0.0
+last_stats_time = time.monotonic()
+last_results = None  # Newest MediaPipe results, reused for frames the motion gate skips
 
 
-    # Define distances between fingertip and respective base joints
-    fingertips = [
-        mp_hands.HandLandmark.THUMB_TIP,
-        mp_hands.HandLandmark.INDEX_FINGER_TIP,
-        mp_hands.HandLandmark.MIDDLE_FINGER_TIP,
-        mp_hands.HandLandmark.RING_FINGER_TIP,
-        mp_hands.HandLandmark.PINKY_TIP
-    ]
+def capture(_):
+    frame = source.read()
+    if frame is None:
+        raise StopPipeline
+    return frame, time.monotonic()
 
-    bases = [
-        mp_hands.HandLandmark.THUMB_CMC,
-        mp_hands.HandLandmark.INDEX_FINGER_MCP,
-        mp_hands.HandLandmark.MIDDLE_FINGER_MCP,
-        mp_hands.HandLandmark.RING_FINGER_MCP,
-        mp_hands.HandLandmark.PINKY_MCP
-    ]
 
-    for tip, base in zip(fingertips, bases):
-        tip_z = hand_landmarks.landmark[tip].z
-        base_z = hand_landmarks.landmark[base].z
-        print(f"Tip Z: {tip_z}, Base Z: {base_z}, Difference: {tip_z - base_z}")
+def infer(item):
+    global last_results
+    frame, capture_time = item
 
-        if tip_z - base_z > -0.1:  # Adjust this threshold based on testing
-            print(f"Finger {tip} not forming a fist.")
-            return False
-    return True
+    # Flip and convert frame to RGB
+    frame = cv2.flip(frame, 1)
+    if motion_gate is not None and not motion_gate.check(frame):
+        # Nothing moved since the last processed frame, its landmarks still hold
+        return frame, last_results, capture_time, time.monotonic()
 
+    start = time.monotonic()
+    # The governor may shrink the model's input; landmarks are normalized, so the frame keeps its size
+    scale = governor.point.scale if governor is not None else 1.0
+    model_input = frame if scale == 1.0 else cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    if roi_tracker is not None:
+        # Converts only the crop; landmarks come back in full-frame coordinates
+        results = roi_tracker.process(model_input)
+    else:
+        results = hands.process(cv2.cvtColor(model_input, cv2.COLOR_BGR2RGB))
+    last_results = results
+    inference_time = time.monotonic()
 
-# Connect to server
-try:
-    client.connect(server_address)
-    print(f"Connected to server at {server_address}")
-except Exception as e:
-    print(f"Connection error: {e}")
-    exit(1)
+    if governor is not None:
+        point = governor.record(inference_time - start, inference_time)
+        if point is not None:
+            switch_operating_point(point)
+    return frame, results, capture_time, inference_time
+
+
+def switch_operating_point(point):
+    """Run MediaPipe with the governor's new settings from the next frame on."""
+    global hands
+    print(f"Inference at {governor.fps:.1f} fps, switching to {point}")
+    # model_complexity and max_num_hands are fixed when the graph is built
+    hands.close()
+    hands = create_hands(point)
+    if roi_tracker is not None:
+        roi_tracker.hands = hands
+        roi_tracker.detector.close()
+        roi_tracker.detector = create_hands(point, static_image_mode=True)
+        # The crop was in pixels of the old input size
+        roi_tracker.reset()
+
+
+def send(item):
+    """Send one inference result; called with None when idle so heartbeats and reconnects go on."""
+    global sequence, hands_sent, fists_sent, gesture_events_sent, reported_point
+
+    # (Re)connect, push out whatever is left of the previous frame, send a heartbeat if idle
+    if connection is not None:
+        connection.poll()
+        if governor is not None and PROTOCOL == "binary" and reported_point is not governor.point:
+            # Ahead of the frames, like gesture events
+            reported_point = governor.point
+            connection.send_message(encode_status(reported_point, time.monotonic() + connection.clock_offset))
+    if item is None:
+        return
+
+    frame, results, capture_time, inference_time = item
+    # Added to every timestamp we send so the server can compare them with its own clock.
+    # Shared memory readers are on this machine and share our monotonic clock.
+    clock_offset = connection.clock_offset if connection is not None else 0.0
+    stamps = {STAGE_CAPTURE: capture_time, STAGE_INFERENCE: inference_time}
+
+    if results.multi_hand_landmarks:
+        # Read the landmarks out of MediaPipe once; scaling, bounds and gestures are array operations
+        landmarks = to_pixels(results_array(results), frame.shape)
+        handedness, scores = hand_info(results)
+        if landmark_filters is not None:
+            landmarks = landmark_filters(landmarks, capture_time, handedness)
+    else:
+        landmarks, handedness, scores = NO_HANDS, None, None
+        if landmark_filters is not None:
+            landmark_filters.reset()
+
+    # Runs on frames without hands too, so gestures end when the hands leave
+    events = gestures.update(landmarks, handedness, capture_time + clock_offset)
+    # Check for a fist
+    fists = [gesture == GESTURE_FIST for gesture in gestures.hand_gestures]
+    if events and GESTURE_EVENTS and PROTOCOL == "binary" and connection is not None:
+        # Queued ahead of the frame and never superseded by a newer one
+        connection.send_message(encode_gestures(events, sequence, capture_time + clock_offset))
+        gesture_events_sent += len(events)
+        if VERBOSE:
+            for event in events:
+                print(f"Gesture: {event}")
+
+    if len(landmarks):
+        if PROTOCOL == "binary":
+            # One frame per camera frame, carrying all 21 landmarks of every detected hand
+            flags = FLAG_FIST if any(fists) else 0
+            # Stamps in the server's clock
+            timings = (inference_time + clock_offset, time.monotonic() + clock_offset)
+            if ring is not None:
+                ring.write(landmarks, sequence, capture_time, flags,
+                           handedness=handedness, scores=scores, timings=timings)
+            else:
+                if connection.keyframe_waiting:
+                    # This frame replaces the unsent keyframe, so deltas against that one would never decode
+                    encoder.reset()
+                payload = encoder.encode(
+                    landmarks, sequence, capture_time + clock_offset, flags,
+                    handedness=handedness, scores=scores, timings=timings
+                )
+                connection.send(payload, keyframe=(encoder.last_kind == KIND_FRAME))
+            if VERBOSE:
+                print(f"Sent frame {sequence}: {len(landmarks)} hand(s){' (fist)' if flags else ''}")
+        else:
+            # Legacy text format: one message per hand, the fist token replaces the coordinates
+            message = encode_text_hands(landmarks, fists)
+            connection.send(message)
+            if VERBOSE:
+                print(f"Sent: {message.decode('utf-8').strip()}")  # Strip to remove newline when printing
+        stamps[STAGE_SEND] = time.monotonic()
+        sequence += 1
+        hands_sent += len(fists)
+        fists_sent += sum(fists)
+
+    latency.record(stamps)
+    latency.maybe_dump(clock_offset=clock_offset)
 
-# Main loop
-try:
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
 
-        # Flip and convert frame to RGB
-        frame = cv2.flip(frame, 1)
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = hands.process(rgb_frame)
+def report():
+    """One line of counters instead of a line per frame."""
+    line = format_stats(stages)
+    line += f" | sent {sequence} frames, {hands_sent} hands, {fists_sent} fists, {gesture_events_sent} gesture events"
+    if connection is not None:
+        line += f", {connection.dropped_frames} dropped while disconnected"
+    if motion_gate is not None:
+        line += f", inference skipped on {motion_gate.stats()['skip_share']:.0%} of frames"
+    if governor is not None:
+        line += f", MediaPipe level {governor.level} at {governor.fps:.1f} fps"
+    print(line)
 
+
+def show(item):
+    """Draw and display the newest result (main thread, as some platforms require for imshow)."""
+    global latency_overlay, latency_overlay_time, last_stats_time
+
+    now = time.monotonic()
+    if now - last_stats_time >= STATS_INTERVAL:
+        last_stats_time = now
+        report()
+
+    if item is not None:
+        frame, results, capture_time, _ = item
         if results.multi_hand_landmarks:
             for hand_landmarks in results.multi_hand_landmarks:
                 # Draw landmarks
                 mp_draw.draw_landmarks(frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
 
-                # Format and send coordinates
-                coord_str = format_coordinates(hand_landmarks, frame.shape)
-                client.send(coord_str.encode('utf-8'))
-                print(f"Sent: {coord_str.strip()}")  # Strip to remove newline when printing
-
-        #Check for a fist
-        if results.multi_hand_landmarks:
-            for hand_landmarks in results.multi_hand_landmarks:
-                if is_fist(hand_landmarks):
-                    client.send("fist_detected".encode('utf-8'))
-                else:
-                    coord_str = format_coordinates(hand_landmarks, frame.shape)
-                    client.send(coord_str.encode('utf-8'))
+        if LATENCY_OVERLAY:
+            # Percentiles are refreshed once a second, drawing the cached lines is cheap
+            if now - latency_overlay_time >= 1.0:
+                latency_overlay = latency.overlay_lines()
+                latency_overlay_time = now
+            for line_number, line in enumerate(latency_overlay):
+                cv2.putText(frame, line, (10, 20 + 20 * line_number),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
 
         # Display frame (optional - will still work without seeing camera feed)
         cv2.imshow("Hand Tracking", frame)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+
+    if cv2.waitKey(1) & 0xFF == ord('q'):
+        raise StopPipeline
+
+
+captured = LatestSlot()
+inferred = LatestSlot()
+displayed = None if HEADLESS else LatestSlot()
+stages = [
+    PipelineStage("capture", capture, outputs=(captured,)),
+    PipelineStage("inference", infer, captured, outputs=(inferred,) if HEADLESS else (inferred, displayed)),
+    PipelineStage("send", send, inferred, idle_interval=HEARTBEAT_INTERVAL / 4),
+]
+threaded_stages = list(stages)
+if not HEADLESS:
+    stages.append(PipelineStage("display", show, displayed, idle_interval=0.05))
+
+try:
+    for stage in threaded_stages:
+        stage.start()
+    if HEADLESS:
+        # Nothing to draw: report until Ctrl+C or the end of the video
+        while stages[-1].is_alive():
+            stages[-1].join(STATS_INTERVAL)
+            if stages[-1].is_alive():
+                report()
+    else:
+        # The window runs on this thread until 'q' or the end of the capture
+        stages[-1].run()
+except KeyboardInterrupt:
+    pass
 
 finally:
-    cap.release()
-    client.close()
-    cv2.destroyAllWindows()
\ No newline at end of file
+    for stage in threaded_stages:
+        stage.stop()
+    for stage in threaded_stages:
+        stage.join(timeout=2.0)
+    source.close()
+    report()
+    if roi_tracker is not None:
+        print(f"ROI tracking: {roi_tracker.stats()}")
+    if motion_gate is not None:
+        print(f"Motion gate: {motion_gate.stats()}")
+    if governor is not None:
+        print(f"Governor: {governor.stats()}")
+    print("Latency p50 / p95 / p99:")
+    for line in latency.overlay_lines():
+        print(f"  {line}")
+    if connection is not None:
+        print(f"Connection: {connection.stats()}, encoder: {encoder.stats()}")
+        connection.close()
+    if ring is not None:
+        ring.close()
+    if not HEADLESS:
+        cv2.destroyAllWindows()
@@ -1,15 +1,58 @@
 import math
-import socket
+import time
+
+import numpy as np
+
+from landmark_protocol import (
+    HAND_LEFT, PHASE_BEGIN, PHASE_END, PHASE_NAMES, PHASE_UPDATE, ProtocolError, decode_text_frame
+)
+from tracking_server import TRANSPORT_TCP, TrackingServer
+
+
+class ClientState:
+    """What the server remembers about one connected tracking client."""
+
+    def __init__(self, client_id):
+        self.client_id = client_id
+        self.connected_at = time.monotonic()
+        self.index_pos = None
+        self.thumb_pos = None
+        self.last_sequence = None
+        self.gestures = {}  # hand -> newest GestureEvent of its active gesture
+        self.operating_point = None  # MediaPipe settings the client last reported
+
+        # Totals
+        self.frames = 0
+        self.gesture_events = 0
+
+        # Reset after every summary
+        self.interval_frames = 0
+        self.interval_hands = 0
+        self.interval_fingers = 0
+        self.interval_fists = 0
+        self.interval_gestures = 0  # Gestures that began
+
+    def reset_interval(self):
+        self.interval_frames = 0
+        self.interval_hands = 0
+        self.interval_fingers = 0
+        self.interval_fists = 0
+        self.interval_gestures = 0
 
 
 class FingerTrackingServer:
-    def __init__(self, host='localhost', port=12345):
-        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.server.bind((host, port))
-        self.server.listen(1)
-        self.running = True
-        self.buffer = ""
+    """Console server for tracking clients, without FreeCAD; prints a summary per client."""
+
+    def __init__(self, host='localhost', port=12345, transport=TRANSPORT_TCP, summary_interval=5.0, verbose=False):
+        self.tracking_server = TrackingServer(
+            self.process_frame, self._on_client_connection, host=host, port=port, transport=transport,
+            gesture_callback=self.process_gestures, status_callback=self.process_status,
+            tick_callback=self._tick
+        )
+        self.clients = {}  # client_id -> ClientState
+        self.summary_interval = summary_interval
+        self.last_summary = time.monotonic()
+        self.verbose = verbose
 
         # Map finger IDs to names for readable output
         self.finger_names = {
@@ -22,73 +65,133 @@ class FingerTrackingServer:
 
     def start(self):
         print(f"Server started, waiting for connections...")
-        try:
-            client_socket, address = self.server.accept()
-            print(f"Client connected from {address}")
-            self.handle_client(client_socket)
-        except Exception as e:
-            print(f"Error accepting connection: {e}")
-        finally:
-            self.cleanup()
-
-    def handle_client(self, client_socket):
-        while self.running:
-            try:
-                # Receive data
-                data = client_socket.recv(1024).decode('utf-8')
-                if not data:
-                    break
-
-                self.buffer += data
-
-                # Process complete messages (split by newlines)
-                while '\n' in self.buffer:
-                    # Get the first complete message
-                    message, self.buffer = self.buffer.split('\n', 1)
-
-                    # Process the coordinate string
-                    self.process_coordinates(message)
-
-            except socket.error as e:
-                print(f"Socket error: {e}")
-                break
-            except Exception as e:
-                print(f"Error: {e}")
-                break
-
-    def process_coordinates(self, coord_string):
-        """format: finger_id,x,y;finger_id,x,y;..."""
-        if not coord_string:
-            return
+        self.tracking_server.serve_forever()
 
-        print("\nVisible fingers:")
-        # Split based on semicolon
-        finger_coords = coord_string.split(';')
+    def _on_client_connection(self, client_id, connected):
+        if connected:
+            self.clients[client_id] = ClientState(client_id)
+            return
 
-        for coord in finger_coords:
-            if coord:
-                try:
-                    # reads through finger ID and coordinates
-                    finger_id, x, y = map(int, coord.split(','))
-                    finger_name = self.finger_names.get(finger_id, f"finger{finger_id}")
-                    print(f"{finger_name}: x={x}, y={y}")
+        state = self.clients.pop(client_id, None)
+        if state is not None:
+            if state.interval_frames:
+                print(self._summary_line(state, time.monotonic()))
+            duration = time.monotonic() - state.connected_at
+            print(f"Client {client_id}: {state.frames} frames in {duration:.1f} s "
+                  f"({state.frames / max(duration, 1e-9):.1f} fps)")
 
-                    # Check for pinch gesture
-                    if finger_id == 1: # Index
-                        self.index_pos = (x, y)
-                    elif finger_id == 0:  # Thumb
-                        self.thumb_pos = (x, y)
+    def process_coordinates(self, coord_string, client_id=0):
+        """format: finger_id,x,y;finger_id,x,y;..."""
+        if not coord_string:
+            return
 
-                except ValueError as e:
-                    print(f"Error parsing coordinates: {e}")
+        try:
+            frame = decode_text_frame(coord_string)
+        except ProtocolError as e:
+            print(f"Error parsing coordinates: {e}")
+            return
+        self.process_frame(client_id, frame)
+
+    def process_frame(self, client_id, frame):
+        """Track one decoded frame (text, full or delta) of a client."""
+        state = self.clients.get(client_id)
+        if state is None:
+            state = self.clients[client_id] = ClientState(client_id)
+
+        tips = frame.fingertips[:, :, :2]
+        visible = ~np.isnan(tips[..., 0])
+
+        state.frames += 1
+        state.interval_frames += 1
+        state.interval_hands += frame.hand_count
+        state.interval_fingers += int(np.count_nonzero(visible))
+        state.interval_fists += frame.is_fist
+        state.last_sequence = frame.sequence
+
+        # Check for pinch gesture on the first hand
+        if frame.hand_count:
+            state.thumb_pos = tuple(tips[0, 0].tolist()) if visible[0, 0] else None
+            state.index_pos = tuple(tips[0, 1].tolist()) if visible[0, 1] else None
+
+        if self.verbose:
+            self._print_frame(client_id, frame, tips, visible)
+
+    def _tick(self, now):
+        if now - self.last_summary >= self.summary_interval:
+            self._print_summary(now)
+            self.last_summary = now
+
+    def process_gestures(self, client_id, events):
+        """Keep track of the gestures a client recognized; an update without a begin starts the gesture."""
+        state = self.clients.get(client_id)
+        if state is None:
+            state = self.clients[client_id] = ClientState(client_id)
+
+        for event in events:
+            state.gesture_events += 1
+            if event.phase == PHASE_END:
+                state.gestures.pop(event.hand, None)
+            else:
+                if event.phase == PHASE_BEGIN:
+                    state.interval_gestures += 1
+                state.gestures[event.hand] = event
+            if self.verbose and event.phase != PHASE_UPDATE:
+                print(f"Client {client_id}: {event.name} {PHASE_NAMES[event.phase]} "
+                      f"(hand {event.hand}) at x={event.x:.0f}, y={event.y:.0f}")
+
+    def process_status(self, client_id, point):
+        state = self.clients.get(client_id)
+        if state is None:
+            state = self.clients[client_id] = ClientState(client_id)
+        state.operating_point = point
+        print(f"Client {client_id} runs {point}")
+
+    def _print_frame(self, client_id, frame, tips, visible):
+        print(f"\nVisible fingers (client {client_id}, frame {frame.sequence}, {frame.hand_count} hand(s)):")
+        for hand in range(frame.hand_count):
+            if frame.handedness is not None:
+                side = "left" if frame.handedness[hand] == HAND_LEFT else "right"
+                print(f"Hand {hand} ({side}, score {frame.scores[hand]:.2f}):")
+            for finger_id in np.flatnonzero(visible[hand]).tolist():
+                x, y = tips[hand, finger_id].tolist()
+                finger_name = self.finger_names.get(finger_id, f"finger{finger_id}")
+                print(f"{finger_name}: x={x:.0f}, y={y:.0f}")
+
+    def _print_summary(self, now):
+        for state in self.clients.values():
+            print(self._summary_line(state, now))
+            state.reset_interval()
+
+    def _summary_line(self, state, now):
+        frames = state.interval_frames
+        if not frames:
+            return f"Client {state.client_id}: idle"
+
+        # A client that connected during the interval has only been sending for part of it
+        elapsed = now - max(self.last_summary, state.connected_at)
+        line = (f"Client {state.client_id}: {frames / max(elapsed, 1e-9):.1f} fps, "
+                f"{state.interval_hands / frames:.2f} hands/frame, "
+                f"{state.interval_fingers / frames:.1f} fingertips visible, "
+                f"fist {state.interval_fists / frames:.0%}")
+        if state.thumb_pos is not None and state.index_pos is not None:
+            line += f", thumb-index {calculate_distance(state.thumb_pos, state.index_pos):.0f} px"
+        if state.gestures:
+            line += ", " + ", ".join(
+                f"{event.name} (hand {hand})" for hand, event in sorted(state.gestures.items())
+            )
+        if state.interval_gestures:
+            line += f", {state.interval_gestures} gesture(s) began"
+        if state.operating_point is not None:
+            line += f", MediaPipe level {state.operating_point.level}"
+        return line
 
     def cleanup(self):
-        self.running = False
-        self.server.close()
-        print("Server shutdown complete")
+        # The event loop closes every client and the listening socket on its way out
+        self.tracking_server.stop()
 
 def calculate_distance(point1, point2):
-    return math.sqrt((point1["x"] - point2.x) ** 2 + (point1["y"] - point2.y) ** 2)
+    """Distance between two (x, y) points."""
+    return math.hypot(point1[0] - point2[0], point1[1] - point2[1])
 
 
 if __name__ == "__main__":
@@ -97,4 +200,4 @@ if __name__ == "__main__":
         server.start()
     except KeyboardInterrupt:
         print("\nShutting down server...")
-        server.cleanup()
\ No newline at end of file
+        server.cleanup()
@@ -0,0 +1,81 @@
+# Inference governor: picks MediaPipe's model, input resolution and hand count from the measured inference rate
+import time
+
+import numpy as np
+
+from counters import Counters
+from landmark_protocol import OperatingPoint
+
+# From best quality to cheapest: (model_complexity, input scale, max_num_hands)
+OPERATING_POINTS = (
+    (1, 1.0, 2),
+    (1, 0.75, 2),
+    (0, 0.75, 2),
+    (0, 0.5, 2),
+    (0, 0.5, 1),
+)
+
+
+class InferenceGovernor(Counters):
+    """Steps between OPERATING_POINTS to keep the measured inference rate between min_fps and max_fps."""
+
+    COUNTERS = ("downgrades", "upgrades")
+
+    def __init__(self, min_fps=20.0, max_fps=40.0, window=30, hold_time=5.0, retry_interval=30.0,
+                 levels=OPERATING_POINTS, level=0):
+        self.min_fps = min_fps
+        self.max_fps = max_fps
+        self.window = window
+        self.hold_time = hold_time
+        self.retry_interval = retry_interval
+        self.levels = levels
+
+        self.level = level
+        self.point = OperatingPoint(*levels[level], level=level)
+        self.times = []  # Inference times at the current level
+        self.fps = 0.0  # Average inference rate of the last window
+        self.switched_at = None  # Set by the first record(), so the model's warm-up counts as holding time
+        self.blocked_until = {}  # level -> time it may be tried again
+        self.failures = {}  # level -> times it was left for being too slow
+        self.reset_counters()
+
+    def record(self, inference_time, now=None):
+        """Add one inference time in seconds. Returns the new OperatingPoint when the level changed, else None."""
+        now = time.monotonic() if now is None else now
+        if self.switched_at is None:
+            self.switched_at = now
+        self.times.append(inference_time)
+        if len(self.times) < self.window:
+            return None
+        self.times = self.times[-self.window:]
+        fps = self.fps = 1.0 / max(float(np.mean(self.times)), 1e-6)
+        if now - self.switched_at < self.hold_time:
+            return None
+
+        if fps < self.min_fps and self.level < len(self.levels) - 1:
+            # Too slow: this level is off limits for a while, longer every time
+            failures = self.failures[self.level] = self.failures.get(self.level, 0) + 1
+            self.blocked_until[self.level] = now + self.retry_interval * 2 ** (failures - 1)
+            self.downgrades += 1
+            return self._switch(self.level + 1, fps, now)
+        if fps > self.max_fps and self.level > 0 and now >= self.blocked_until.get(self.level - 1, 0.0):
+            self.upgrades += 1
+            return self._switch(self.level - 1, fps, now)
+        return None
+
+    def _switch(self, level, fps, now):
+        self.level = level
+        self.point = OperatingPoint(*self.levels[level], level=level, inference_fps=fps)
+        self.times = []
+        self.switched_at = now
+        return self.point
+
+    def stats(self):
+        return {
+            "level": self.level,
+            "model_complexity": self.point.model_complexity,
+            "scale": self.point.scale,
+            "max_hands": self.point.max_hands,
+            "inference_fps": self.fps,
+            **super().stats(),
+        }
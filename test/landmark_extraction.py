@@ -0,0 +1,45 @@
+# Turns MediaPipe hand results into the arrays the landmark protocol sends
+import numpy as np
+
+from landmark_protocol import HAND_LANDMARK_COUNT, HAND_LEFT, HAND_RIGHT
+
+# detect_fists(): joint each fingertip is compared with, thumb CMC, then the MCP of every finger
+FIST_BASE_INDICES = np.array([1, 5, 9, 13, 17])
+# A fingertip this far (or further) in front of its base joint in MediaPipe's z counts as curled
+FIST_THRESHOLD = -0.1
+
+
+def results_array(results):
+    """Normalized (x, y, z) of every landmark of every detected hand, (hands, 21, 3) float32."""
+    return np.array(
+        [value for hand in results.multi_hand_landmarks for landmark in hand.landmark
+         for value in (landmark.x, landmark.y, landmark.z)],
+        dtype=np.float32
+    ).reshape(-1, HAND_LANDMARK_COUNT, 3)
+
+
+def to_pixels(normalized, frame_shape):
+    """Landmarks in pixels (z scaled like x), NaN where outside the frame."""
+    height, width = frame_shape[:2]
+    coords = normalized * np.array((width, height, width), dtype=np.float32)
+    # Inside the frame means 0 <= x, y < 1 before scaling; one comparison per bound for x and y together
+    xy = normalized[..., :2]
+    coords[((xy < 0) | (xy >= 1)).any(axis=-1)] = np.nan
+    return coords
+
+
+def hand_info(results):
+    """Handedness (HAND_LEFT / HAND_RIGHT) and detection confidence of every detected hand."""
+    classifications = [handedness.classification[0] for handedness in results.multi_handedness]
+    handedness = np.array(
+        [HAND_LEFT if c.label == "Left" else HAND_RIGHT for c in classifications], dtype=np.uint8
+    )
+    scores = np.array([c.score for c in classifications], dtype=np.float32)
+    return handedness, scores
+
+
+def detect_fists(normalized, threshold=FIST_THRESHOLD):
+    """Which hands form a fist, (hands,) bool. The old z-depth heuristic, kept for bench_extraction.py."""
+    # Tips are landmarks 4, 8, ..., 20 and their bases 1, 5, ..., 17: strided views, no copies
+    depth = normalized[:, 4::4, 2] - normalized[:, 1::4, 2]
+    return (depth <= threshold).all(axis=1)
@@ -0,0 +1,89 @@
+# One Euro filtering of landmark arrays: every joint and coordinate smoothed in one set of NumPy operations
+import numpy as np
+
+# Defaults for pixel coordinates. Below MIN_CUTOFF Hz of movement the jitter is
+# smoothed away; BETA raises the cutoff with speed (per pixel/s) so fast moves do not lag.
+MIN_CUTOFF = 1.0
+BETA = 0.01
+DERIVATE_CUTOFF = 1.0
+
+
+def _alpha(cutoff, dt):
+    """Smoothing factor of an exponential filter with this cutoff (Hz, scalar or array) at this sample interval."""
+    return 1.0 / (1.0 + 1.0 / (2 * np.pi * cutoff * dt))
+
+
+def hand_keys(hand_count, handedness=None):
+    """Keys that follow each hand between frames: the handedness when known and unique, else the index."""
+    if handedness is not None and len(set(handedness.tolist())) == len(handedness) == hand_count:
+        return handedness.tolist()
+    return list(range(hand_count))
+
+
+class OneEuroFilter:
+    """One Euro filter (Casiez et al., 2012) over an array of any shape; NaN elements pass through."""
+
+    def __init__(self, min_cutoff=MIN_CUTOFF, beta=BETA, derivate_cutoff=DERIVATE_CUTOFF):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.derivate_cutoff = derivate_cutoff
+        self.reset()
+
+    def reset(self):
+        self.value = None  # Filtered values, NaN where there is no state
+        self.derivate = None  # Filtered speed per element
+        self.timestamp = None
+
+    def __call__(self, values, timestamp):
+        values = np.asarray(values, dtype=np.float32)
+        if self.value is None or self.value.shape != values.shape:
+            self.value = values.copy()
+            self.derivate = np.zeros_like(values)
+            self.timestamp = timestamp
+            return self.value.copy()
+
+        dt = timestamp - self.timestamp
+        if dt <= 0:
+            return self.value.copy()
+        self.timestamp = timestamp
+
+        # Elements without state (hidden until now) start at their raw value
+        fresh = np.isnan(self.value)
+        previous = np.where(fresh, values, self.value)
+
+        speed = (values - previous) / dt
+        self.derivate += _alpha(self.derivate_cutoff, dt) * (speed - self.derivate)
+
+        # The faster an element moves, the higher its cutoff
+        cutoff = self.min_cutoff + self.beta * np.abs(self.derivate)
+        self.value = previous + _alpha(cutoff, dt) * (values - previous)
+
+        # Hidden elements lose their state
+        hidden = np.isnan(values)
+        self.derivate[hidden] = 0.0
+        return self.value.copy()
+
+
+class HandFilters:
+    """One OneEuroFilter per hand, keyed by hand_keys()."""
+
+    def __init__(self, min_cutoff=MIN_CUTOFF, beta=BETA, derivate_cutoff=DERIVATE_CUTOFF):
+        self.parameters = (min_cutoff, beta, derivate_cutoff)
+        self.filters = {}  # hand key -> OneEuroFilter
+
+    def __call__(self, landmarks, timestamp, handedness=None):
+        """Filter a (hands, landmarks, dims) array, returning a new array of the same shape."""
+        keys = hand_keys(len(landmarks), handedness)
+        filtered = np.empty_like(landmarks, dtype=np.float32)
+        for index, key in enumerate(keys):
+            hand_filter = self.filters.get(key)
+            if hand_filter is None:
+                hand_filter = self.filters[key] = OneEuroFilter(*self.parameters)
+            filtered[index] = hand_filter(landmarks[index], timestamp)
+
+        for key in [key for key in self.filters if key not in keys]:
+            del self.filters[key]
+        return filtered
+
+    def reset(self):
+        self.filters = {}
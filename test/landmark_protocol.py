@@ -0,0 +1,575 @@
+# Wire format shared by hand_tracking_client.py and the FreeCAD side (test_commands.py)
+import struct
+
+import numpy as np
+
+from counters import Counters
+
+# Binary frame layout (little endian):
+#   magic, version, kind, flags, hand_count, landmark_count, dims, source_id,
+#   sequence, capture timestamp, payload size
+# followed by a packed float32 array of shape (hand_count, landmark_count, dims)
+# and, with FLAG_HAND_INFO, one (score, handedness) record per hand, and with
+# FLAG_TIMING, the inference-end and send times of the frame.
+#
+# KIND_GESTURE messages carry hand_count gesture events of GESTURE_EVENT each
+# instead of landmarks (landmark_count and dims are 0). KIND_STATUS messages
+# carry one STATUS record and no hands. KIND_ACK messages are header only: the
+# server stored the keyframe with that sequence and source_id.
+#
+# All times are time.monotonic() seconds. A client on another clock adds the
+# offset measured with the KIND_CLOCK handshake, so the receiver can compare
+# them with its own clock.
+MAGIC = b"HTLF"
+PROTOCOL_VERSION = 1
+HEADER = struct.Struct("<4sBBBBBBHIdI")
+HEADER_SIZE = HEADER.size
+
+KIND_FRAME = 1  # Full frame, also the keyframe for delta frames
+KIND_DELTA = 2  # Quantized changes relative to a keyframe
+KIND_CLOCK = 3  # Clock offset handshake: sent by the client, echoed back with the server times
+KIND_HEARTBEAT = 4  # Header only, keeps an idle link (no hands in view) alive
+KIND_GESTURE = 5  # Gesture begin/update/end events recognized by the client
+KIND_STATUS = 6  # The client's MediaPipe operating point, sent when it changes
+KIND_ACK = 7  # Sent back by the server for a keyframe with FLAG_ACK: it will decode deltas against it
+
+FLAG_FIST = 0x01
+FLAG_HAND_INFO = 0x02  # Handedness and detection confidence follow the landmarks
+FLAG_TIMING = 0x04  # Inference-end and send times follow the hand info
+FLAG_ACK = 0x08  # Keyframe the sender only uses for deltas once the server acknowledged it
+# Set by the encoders from what they actually append, never taken from the caller
+TRAILER_FLAGS = FLAG_HAND_INFO | FLAG_TIMING
+
+FORMAT_BINARY = "binary"
+FORMAT_TEXT = "text"
+
+# Token sent by the legacy text client instead of coordinates when a fist is detected
+FIST_TOKEN = "fist_detected"
+
+# Number of fingertips carried by the legacy text format (thumb, index, middle, ring, pinky)
+FINGERTIP_COUNT = 5
+
+# MediaPipe hand model: 21 landmarks per hand, fingertips at these indices
+HAND_LANDMARK_COUNT = 21
+FINGERTIP_INDICES = np.array([4, 8, 12, 16, 20])
+
+HAND_LEFT = 0
+HAND_RIGHT = 1
+
+LANDMARK_DTYPE = np.dtype("<f4")
+HAND_INFO_DTYPE = np.dtype([("score", "<f4"), ("handedness", "u1")])
+
+# Timing block: inference end, send
+TIMING = struct.Struct("<dd")
+
+# Clock payload: server receive time, server send time. The header timestamp
+# carries the client send time; requests leave the payload zeroed.
+CLOCK = struct.Struct("<dd")
+CLOCK_MESSAGE_SIZE = HEADER_SIZE + CLOCK.size
+
+# Gesture event: gesture, phase, hand (HAND_LEFT / HAND_RIGHT, or the hand's index when the
+# handedness is unknown), then the anchor point in pixels and a gesture specific value
+# (pinch: thumb-index distance in palm lengths)
+GESTURE_EVENT = struct.Struct("<BBBxfff")
+
+GESTURE_NONE = 0
+GESTURE_PINCH = 1
+GESTURE_FIST = 2
+GESTURE_POINT = 3
+GESTURE_OPEN_PALM = 4
+GESTURE_TWO_FINGER = 5
+GESTURE_NAMES = {
+    GESTURE_NONE: "none",
+    GESTURE_PINCH: "pinch",
+    GESTURE_FIST: "fist",
+    GESTURE_POINT: "point",
+    GESTURE_OPEN_PALM: "open palm",
+    GESTURE_TWO_FINGER: "two fingers",
+}
+
+PHASE_BEGIN = 0
+PHASE_UPDATE = 1
+PHASE_END = 2
+PHASE_NAMES = {PHASE_BEGIN: "begin", PHASE_UPDATE: "update", PHASE_END: "end"}
+
+# Status: model complexity, max hands, governor level (0 = best quality), then the
+# input resolution scale and the inference rate measured when the level was chosen
+STATUS = struct.Struct("<BBBxff")
+
+# Pipeline stages a frame is stamped at, in order. The capture time is the
+# frame timestamp, the others are kept in LandmarkFrame.stamps.
+STAGE_CAPTURE = "capture"
+STAGE_INFERENCE = "inference"
+STAGE_SEND = "send"
+STAGE_RECEIVE = "receive"
+STAGE_DEQUEUE = "dequeue"
+STAGE_UPDATE = "update"
+STAGE_RENDER = "render"
+STAGES = (STAGE_CAPTURE, STAGE_INFERENCE, STAGE_SEND, STAGE_RECEIVE, STAGE_DEQUEUE, STAGE_UPDATE, STAGE_RENDER)
+
+# Delta payload: keyframe sequence, quantization step, number of changed landmarks,
+# then uint16 flat landmark indices and uint16 quantized deltas (offset binary)
+DELTA_HEADER = struct.Struct("<IfH")
+DELTA_DTYPE = np.dtype("<u2")
+DELTA_OFFSET = 32768
+
+
+class ProtocolError(ValueError):
+    """Raised when a frame cannot be decoded."""
+
+
+class LandmarkFrame:
+    """One decoded frame of hand landmarks, independent of the wire format."""
+
+    def __init__(self, landmarks, sequence=0, timestamp=0.0, flags=0, source_id=0,
+                 handedness=None, scores=None):
+        self.landmarks = landmarks  # float32 array: (hands, landmarks, dims), NaN = not visible
+        self.sequence = sequence
+        self.timestamp = timestamp
+        self.flags = flags
+        self.source_id = source_id
+        self.handedness = handedness  # uint8 array (hands,): HAND_LEFT / HAND_RIGHT, None if unknown
+        self.scores = scores  # float32 array (hands,): detection confidence, None if unknown
+        self.stamps = {}  # stage -> time.monotonic() of the later pipeline stages
+
+    @property
+    def hand_count(self):
+        return self.landmarks.shape[0]
+
+    @property
+    def is_fist(self):
+        return bool(self.flags & FLAG_FIST)
+
+    @property
+    def fingertips(self):
+        """The five fingertips of every hand, (hands, 5, dims), whatever landmark set was sent."""
+        return fingertips(self.landmarks)
+
+
+class GestureEvent:
+    """A gesture of one hand beginning, moving or ending."""
+
+    def __init__(self, gesture, phase, hand, x=0.0, y=0.0, value=0.0, timestamp=0.0):
+        self.gesture = gesture
+        self.phase = phase
+        self.hand = hand
+        self.x = x  # Anchor point in pixels: pinch midpoint, index tip when pointing, palm centre otherwise
+        self.y = y
+        self.value = value
+        self.timestamp = timestamp
+
+    @property
+    def name(self):
+        return GESTURE_NAMES.get(self.gesture, f"gesture {self.gesture}")
+
+    def __repr__(self):
+        return (f"GestureEvent({self.name} {PHASE_NAMES.get(self.phase, self.phase)}, hand {self.hand}, "
+                f"({self.x:.0f}, {self.y:.0f}), {self.value:.2f})")
+
+
+class OperatingPoint:
+    """The MediaPipe settings a client runs with: model, input resolution and number of hands."""
+
+    def __init__(self, model_complexity=1, scale=1.0, max_hands=2, level=0, inference_fps=0.0):
+        self.model_complexity = model_complexity
+        self.scale = scale  # Frames are resized by this before inference
+        self.max_hands = max_hands
+        self.level = level
+        self.inference_fps = inference_fps
+
+    def __repr__(self):
+        return (f"OperatingPoint(level {self.level}: complexity {self.model_complexity}, {self.scale:.0%} resolution, "
+                f"{self.max_hands} hand(s), {self.inference_fps:.0f} fps)")
+
+
+def fingertips(landmarks):
+    """Select the fingertips from a full (hands, 21, dims) array; 5-landmark arrays pass through."""
+    if landmarks.shape[1] == HAND_LANDMARK_COUNT:
+        return landmarks[:, FINGERTIP_INDICES]
+    return landmarks[:, :FINGERTIP_COUNT]
+
+
+def _hand_info(hand_count, handedness, scores):
+    """Pack per-hand handedness and confidence, or b"" when there is none."""
+    if handedness is None:
+        return b""
+    info = np.empty(hand_count, dtype=HAND_INFO_DTYPE)
+    info["handedness"] = handedness
+    info["score"] = 1.0 if scores is None else scores
+    return info.tobytes()
+
+
+def _read_hand_info(buffer, offset, hand_count):
+    info = np.frombuffer(buffer, dtype=HAND_INFO_DTYPE, count=hand_count, offset=offset)
+    return info["handedness"].copy(), info["score"].copy()
+
+
+def _timing(timings):
+    """Pack the (inference end, send) times, or b"" when there are none."""
+    if timings is None:
+        return b""
+    return TIMING.pack(*timings)
+
+
+def _trailer_size(flags, hand_count):
+    """Bytes of hand info and timing that follow the landmark data."""
+    size = hand_count * HAND_INFO_DTYPE.itemsize if flags & FLAG_HAND_INFO else 0
+    if flags & FLAG_TIMING:
+        size += TIMING.size
+    return size
+
+
+def _read_trailer(frame, buffer, offset):
+    """Fill in the hand info and timing of frame from the bytes at offset."""
+    if frame.flags & FLAG_HAND_INFO:
+        frame.handedness, frame.scores = _read_hand_info(buffer, offset, frame.hand_count)
+        offset += frame.hand_count * HAND_INFO_DTYPE.itemsize
+    if frame.flags & FLAG_TIMING:
+        frame.stamps[STAGE_INFERENCE], frame.stamps[STAGE_SEND] = TIMING.unpack_from(buffer, offset)
+
+
+def encode_frame(landmarks, sequence, timestamp, flags=0, source_id=0, handedness=None, scores=None,
+                 timings=None):
+    """Pack a (hands, landmarks, dims) array, with optional hand info and timings, into a binary frame."""
+    landmarks = np.ascontiguousarray(landmarks, dtype=LANDMARK_DTYPE)
+    if landmarks.ndim != 3:
+        raise ProtocolError(f"Expected a (hands, landmarks, dims) array, got shape {landmarks.shape}")
+
+    hand_count, landmark_count, dims = landmarks.shape
+    flags &= ~TRAILER_FLAGS
+    hand_info = _hand_info(hand_count, handedness, scores)
+    if hand_info:
+        flags |= FLAG_HAND_INFO
+    timing = _timing(timings)
+    if timing:
+        flags |= FLAG_TIMING
+
+    header = HEADER.pack(
+        MAGIC, PROTOCOL_VERSION, KIND_FRAME, flags,
+        hand_count, landmark_count, dims, source_id,
+        sequence & 0xFFFFFFFF, timestamp, landmarks.nbytes + len(hand_info) + len(timing)
+    )
+    return b"".join((header, landmarks.tobytes(), hand_info, timing))
+
+
+def decode_header(buffer, offset=0):
+    """Validate a header; returns (kind, flags, hands, landmarks, dims, source, sequence, timestamp, payload_size)."""
+    (magic, version, kind, flags, hand_count, landmark_count, dims,
+     source_id, sequence, timestamp, payload_size) = HEADER.unpack_from(buffer, offset)
+
+    if magic != MAGIC:
+        raise ProtocolError(f"Bad frame magic: {magic!r}")
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"Unsupported protocol version: {version}")
+    if kind == KIND_FRAME and payload_size != (hand_count * landmark_count * dims * LANDMARK_DTYPE.itemsize
+                                               + _trailer_size(flags, hand_count)):
+        raise ProtocolError(f"Payload size {payload_size} does not match frame shape")
+    if kind == KIND_CLOCK and payload_size != CLOCK.size:
+        raise ProtocolError(f"Payload size {payload_size} does not match clock message")
+    if kind == KIND_HEARTBEAT and payload_size:
+        raise ProtocolError(f"Heartbeat with a {payload_size} byte payload")
+    if kind == KIND_GESTURE and payload_size != hand_count * GESTURE_EVENT.size:
+        raise ProtocolError(f"Payload size {payload_size} does not match {hand_count} gesture events")
+    if kind == KIND_STATUS and payload_size != STATUS.size:
+        raise ProtocolError(f"Payload size {payload_size} does not match status message")
+
+    return kind, flags, hand_count, landmark_count, dims, source_id, sequence, timestamp, payload_size
+
+
+def decode_frame(buffer, offset=0):
+    """Decode one binary frame. Returns (frame, frame_size); the landmarks are a view into buffer."""
+    (kind, flags, hand_count, landmark_count, dims, source_id,
+     sequence, timestamp, payload_size) = decode_header(buffer, offset)
+
+    if kind != KIND_FRAME:
+        raise ProtocolError(f"Unknown frame kind: {kind}")
+
+    frame_size = HEADER_SIZE + payload_size
+    if len(buffer) - offset < frame_size:
+        raise ProtocolError("Incomplete frame")
+
+    landmarks = np.frombuffer(
+        buffer, dtype=LANDMARK_DTYPE,
+        count=hand_count * landmark_count * dims,
+        offset=offset + HEADER_SIZE
+    ).reshape(hand_count, landmark_count, dims)
+
+    frame = LandmarkFrame(landmarks, sequence, timestamp, flags, source_id)
+    _read_trailer(frame, buffer, offset + HEADER_SIZE + landmarks.nbytes)
+    return frame, frame_size
+
+
+def encode_clock(client_time, server_receive=0.0, server_send=0.0):
+    """Pack a clock handshake message; the client sends it with only client_time set."""
+    header = HEADER.pack(MAGIC, PROTOCOL_VERSION, KIND_CLOCK, 0, 0, 0, 0, 0, 0, client_time, CLOCK.size)
+    return header + CLOCK.pack(server_receive, server_send)
+
+
+def encode_heartbeat(timestamp):
+    return HEADER.pack(MAGIC, PROTOCOL_VERSION, KIND_HEARTBEAT, 0, 0, 0, 0, 0, 0, timestamp, 0)
+
+
+def encode_ack(sequence, source_id=0):
+    return HEADER.pack(MAGIC, PROTOCOL_VERSION, KIND_ACK, 0, 0, 0, 0, source_id, sequence & 0xFFFFFFFF, 0.0, 0)
+
+
+def decode_ack(buffer, offset=0):
+    """Unpack a keyframe acknowledgement. Returns (sequence, source_id)."""
+    kind, *_, source_id, sequence, _, _ = decode_header(buffer, offset)
+    if kind != KIND_ACK:
+        raise ProtocolError(f"Expected an acknowledgement, got kind {kind}")
+    return sequence, source_id
+
+
+def decode_clock(buffer, offset=0):
+    """Unpack a clock handshake message. Returns (client_time, server_receive, server_send)."""
+    kind, *_, client_time, payload_size = decode_header(buffer, offset)
+    if kind != KIND_CLOCK:
+        raise ProtocolError(f"Expected a clock message, got kind {kind}")
+    if len(buffer) - offset < CLOCK_MESSAGE_SIZE:
+        raise ProtocolError("Incomplete clock message")
+    return (client_time, *CLOCK.unpack_from(buffer, offset + HEADER_SIZE))
+
+
+def encode_gestures(events, sequence, timestamp, source_id=0):
+    """Pack up to 255 GestureEvents into one message."""
+    if len(events) > 255:
+        raise ProtocolError(f"Too many gesture events for one message: {len(events)}")
+    header = HEADER.pack(MAGIC, PROTOCOL_VERSION, KIND_GESTURE, 0, len(events), 0, 0, source_id,
+                         sequence & 0xFFFFFFFF, timestamp, len(events) * GESTURE_EVENT.size)
+    return header + b"".join(
+        GESTURE_EVENT.pack(event.gesture, event.phase, event.hand, event.x, event.y, event.value)
+        for event in events
+    )
+
+
+def decode_gestures(buffer, offset=0):
+    """Unpack a gesture message. Returns (events, source_id, message_size)."""
+    kind, _, count, _, _, source_id, _, timestamp, payload_size = decode_header(buffer, offset)
+    if kind != KIND_GESTURE:
+        raise ProtocolError(f"Expected a gesture message, got kind {kind}")
+    if len(buffer) - offset < HEADER_SIZE + payload_size:
+        raise ProtocolError("Incomplete gesture message")
+    events = [
+        GestureEvent(*GESTURE_EVENT.unpack_from(buffer, offset + HEADER_SIZE + index * GESTURE_EVENT.size),
+                     timestamp=timestamp)
+        for index in range(count)
+    ]
+    return events, source_id, HEADER_SIZE + payload_size
+
+
+def encode_status(point, timestamp, source_id=0):
+    """Pack an OperatingPoint into a status message."""
+    header = HEADER.pack(MAGIC, PROTOCOL_VERSION, KIND_STATUS, 0, 0, 0, 0, source_id, 0, timestamp, STATUS.size)
+    return header + STATUS.pack(point.model_complexity, point.max_hands, point.level, point.scale,
+                                point.inference_fps)
+
+
+def decode_status(buffer, offset=0):
+    """Unpack a status message. Returns (point, source_id, message_size)."""
+    kind, *_, source_id, _, _, payload_size = decode_header(buffer, offset)
+    if kind != KIND_STATUS:
+        raise ProtocolError(f"Expected a status message, got kind {kind}")
+    if len(buffer) - offset < HEADER_SIZE + payload_size:
+        raise ProtocolError("Incomplete status message")
+    model_complexity, max_hands, level, scale, inference_fps = STATUS.unpack_from(buffer, offset + HEADER_SIZE)
+    point = OperatingPoint(model_complexity, scale, max_hands, level, inference_fps)
+    return point, source_id, HEADER_SIZE + payload_size
+
+
+def decode_text_frame(message):
+    """Decode a legacy "finger_id,x,y;..." message; missing fingers are NaN."""
+    message = message.strip()
+    if message == FIST_TOKEN:
+        return LandmarkFrame(np.empty((0, FINGERTIP_COUNT, 2), dtype=LANDMARK_DTYPE), flags=FLAG_FIST)
+
+    landmarks = np.full((1, FINGERTIP_COUNT, 2), np.nan, dtype=LANDMARK_DTYPE)
+    for finger_data in message.split(";"):
+        if not finger_data:
+            continue
+        parts = finger_data.split(",")
+        if len(parts) != 3:
+            raise ProtocolError(f"Malformed finger entry: {finger_data!r}")
+
+        finger_id, x, y = map(float, parts)
+        if not 0 <= finger_id < FINGERTIP_COUNT:
+            raise ProtocolError(f"Unknown finger id: {finger_id}")
+        landmarks[0, int(finger_id)] = (x, y)
+
+    return LandmarkFrame(landmarks)
+
+
+def encode_text_frame(landmarks, fist=False):
+    """Legacy "finger_id,x,y;..." message for the first hand's visible fingertips, or the fist token."""
+    if fist:
+        return FIST_TOKEN.encode('utf-8')
+    if not len(landmarks):
+        return b""
+    tips = fingertips(np.asarray(landmarks))[0, :, :2]
+    return (";".join(
+        f"{finger_id},{int(x)},{int(y)}"
+        for finger_id, (x, y) in enumerate(tips.tolist()) if x == x and y == y
+    ) + "\n").encode('utf-8')
+
+
+def encode_text_hands(landmarks, fists):
+    """What the old client sent for a whole frame: one encode_text_frame() message per hand, back to back."""
+    tips = fingertips(landmarks)[:, :, :2].tolist()
+    return "".join(
+        FIST_TOKEN if fist else ";".join(
+            f"{finger_id},{int(x)},{int(y)}" for finger_id, (x, y) in enumerate(hand_tips) if x == x and y == y
+        ) + "\n"
+        for hand_tips, fist in zip(tips, fists)
+    ).encode('utf-8')
+
+
+def detect_format(data):
+    """Pick the wire format of a connection from the first bytes it sent."""
+    prefix = bytes(data[:len(MAGIC)])
+    if prefix and MAGIC.startswith(prefix):
+        return FORMAT_BINARY
+    return FORMAT_TEXT
+
+
+class DeltaEncoder(Counters):
+    """Encodes landmarks as keyframes plus quantized deltas against the last keyframe the server has."""
+
+    COUNTERS = ("keyframes", "deltas")
+
+    def __init__(self, keyframe_interval=30, threshold=0.5, step=1 / 16, acknowledged=False):
+        self.keyframe_interval = keyframe_interval
+        self.threshold = threshold
+        self.step = step
+        self.acknowledged = acknowledged
+
+        self.reset()
+        self.reset_counters()
+
+    def reset(self):
+        """Forget the keyframe, e.g. after reconnecting, so the next frame is a keyframe again."""
+        self.keyframe = None
+        self.keyframe_sequence = 0
+        self.frames_since_keyframe = 0
+        self.unconfirmed = None  # (sequence, landmarks) of the newest keyframe waiting for its acknowledgement
+        self.last_kind = None  # KIND_FRAME or KIND_DELTA, whichever encode() returned last
+
+    def acknowledge(self, sequence):
+        """The server stored keyframe sequence; deltas can use it if it is the newest one we sent."""
+        if self.unconfirmed is not None and self.unconfirmed[0] == sequence & 0xFFFFFFFF:
+            self.keyframe_sequence, self.keyframe = self.unconfirmed
+            self.frames_since_keyframe = 0
+            self.unconfirmed = None
+
+    def encode(self, landmarks, sequence, timestamp, flags=0, source_id=0, handedness=None, scores=None,
+               timings=None):
+        landmarks = np.ascontiguousarray(landmarks, dtype=LANDMARK_DTYPE)
+        flags &= ~(TRAILER_FLAGS | FLAG_ACK)
+        hand_info = _hand_info(len(landmarks), handedness, scores)
+        if hand_info:
+            flags |= FLAG_HAND_INFO
+        trailer = hand_info + _timing(timings)
+        if timings is not None:
+            flags |= FLAG_TIMING
+
+        if not self._needs_keyframe(landmarks):
+            # Hidden landmarks are NaN in both frames, treat them as unchanged
+            delta = np.nan_to_num(landmarks - self.keyframe)
+            quantized = np.rint(delta / self.step)
+            if np.abs(quantized).max(initial=0) < DELTA_OFFSET:
+                self.frames_since_keyframe += 1
+                self.deltas += 1
+                self.last_kind = KIND_DELTA
+                return self._encode_delta(
+                    landmarks.shape, delta, quantized, sequence, timestamp, flags, source_id, trailer
+                )
+
+        if self.acknowledged:
+            # The server replaces its keyframe with this one if it arrives, so the old one is no use either
+            self.keyframe = None
+            self.unconfirmed = (sequence & 0xFFFFFFFF, landmarks.copy())
+            flags |= FLAG_ACK
+        else:
+            self.keyframe = landmarks.copy()
+            self.keyframe_sequence = sequence & 0xFFFFFFFF
+        self.frames_since_keyframe = 0
+        self.keyframes += 1
+        self.last_kind = KIND_FRAME
+        return encode_frame(landmarks, sequence, timestamp, flags, source_id, handedness, scores, timings)
+
+    def _needs_keyframe(self, landmarks):
+        return (
+            self.keyframe is None
+            or self.frames_since_keyframe + 1 >= self.keyframe_interval
+            or landmarks.shape != self.keyframe.shape
+            or (np.isnan(landmarks) != np.isnan(self.keyframe)).any()
+        )
+
+    def _encode_delta(self, shape, delta, quantized, sequence, timestamp, flags, source_id, trailer):
+        hand_count, landmark_count, dims = shape
+        changed = (np.abs(delta) >= self.threshold).any(axis=-1).reshape(-1)
+        indices = np.flatnonzero(changed).astype(DELTA_DTYPE)
+        values = (quantized.reshape(-1, dims)[indices] + DELTA_OFFSET).astype(DELTA_DTYPE)
+
+        payload_size = DELTA_HEADER.size + indices.nbytes + values.nbytes + len(trailer)
+        header = HEADER.pack(
+            MAGIC, PROTOCOL_VERSION, KIND_DELTA, flags,
+            hand_count, landmark_count, dims, source_id,
+            sequence & 0xFFFFFFFF, timestamp, payload_size
+        )
+        delta_header = DELTA_HEADER.pack(self.keyframe_sequence, self.step, len(indices))
+        return b"".join((header, delta_header, indices.tobytes(), values.tobytes(), trailer))
+
+
+class DeltaDecoder(Counters):
+    """Decodes full and delta frames, remembering the last keyframe of every source."""
+
+    COUNTERS = ("missing_keyframe",)
+
+    def __init__(self):
+        self.keyframes = {}  # source_id -> (sequence, landmarks)
+        self.reset_counters()
+
+    def decode(self, buffer, offset=0):
+        """Decode one full or delta frame. Returns (frame, frame_size), frame None if its keyframe is missing."""
+        (kind, flags, hand_count, landmark_count, dims, source_id,
+         sequence, timestamp, payload_size) = decode_header(buffer, offset)
+
+        if kind == KIND_FRAME:
+            frame, frame_size = decode_frame(buffer, offset)
+            frame.landmarks = frame.landmarks.copy()
+            self.keyframes[source_id] = (sequence, frame.landmarks)
+            return frame, frame_size
+
+        if kind != KIND_DELTA:
+            raise ProtocolError(f"Unknown frame kind: {kind}")
+
+        frame_size = HEADER_SIZE + payload_size
+        if len(buffer) - offset < frame_size or payload_size < DELTA_HEADER.size:
+            raise ProtocolError("Incomplete frame")
+
+        position = offset + HEADER_SIZE
+        keyframe_sequence, step, changed = DELTA_HEADER.unpack_from(buffer, position)
+        if payload_size != (DELTA_HEADER.size + changed * (1 + dims) * DELTA_DTYPE.itemsize
+                            + _trailer_size(flags, hand_count)):
+            raise ProtocolError(f"Payload size {payload_size} does not match delta frame")
+
+        keyframe = self.keyframes.get(source_id)
+        if (keyframe is None or keyframe[0] != keyframe_sequence
+                or keyframe[1].shape != (hand_count, landmark_count, dims)):
+            self.missing_keyframe += 1
+            return None, frame_size
+
+        position += DELTA_HEADER.size
+        indices = np.frombuffer(buffer, dtype=DELTA_DTYPE, count=changed, offset=position)
+        values = np.frombuffer(
+            buffer, dtype=DELTA_DTYPE, count=changed * dims, offset=position + indices.nbytes
+        ).reshape(changed, dims)
+        if changed and indices.max() >= hand_count * landmark_count:
+            raise ProtocolError("Delta landmark index out of range")
+
+        landmarks = keyframe[1].copy()
+        landmarks.reshape(-1, dims)[indices] += (values.astype(np.float32) - DELTA_OFFSET) * step
+
+        frame = LandmarkFrame(landmarks, sequence, timestamp, flags, source_id)
+        _read_trailer(frame, buffer, position + indices.nbytes + values.nbytes)
+        return frame, frame_size
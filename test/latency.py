@@ -0,0 +1,174 @@
+# Per-stage latency of the tracking pipeline, from camera capture to the FreeCAD view
+import json
+import math
+import os
+import socket
+import time
+
+import numpy as np
+
+from landmark_protocol import (
+    CLOCK_MESSAGE_SIZE, STAGE_CAPTURE, STAGES, ProtocolError, decode_clock, encode_clock
+)
+
+
+def frame_stamps(frame):
+    """All stage times of a LandmarkFrame, with its timestamp (if any) as the capture time."""
+    stamps = dict(frame.stamps)
+    if frame.timestamp:
+        stamps[STAGE_CAPTURE] = frame.timestamp
+    return stamps
+
+
+class LatencyHistogram:
+    """Log-bucketed histogram in the spirit of HdrHistogram."""
+
+    def __init__(self, lowest=1e-6, highest=60.0, precision=0.01):
+        self.lowest = lowest
+        self.highest = highest
+        self._log_ratio = math.log1p(precision)
+        bucket_count = int(math.log(highest / lowest) / self._log_ratio) + 1
+        self.counts = np.zeros(bucket_count, dtype=np.int64)
+        # Upper bound of every bucket, reported for the percentiles
+        self.bounds = lowest * np.exp(self._log_ratio * np.arange(1, bucket_count + 1))
+
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        value = min(max(value, self.lowest), self.highest)
+        self.counts[int(math.log(value / self.lowest) / self._log_ratio)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        """Value below which percent of the recorded values fall (0 when empty)."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * percent / 100))
+        bucket = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return min(float(self.bounds[bucket]), self.max)
+
+    def reset(self):
+        self.counts[:] = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def summary(self):
+        """Count plus mean, p50/p95/p99 and max in milliseconds."""
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(50) * 1000,
+            "p95_ms": self.percentile(95) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+
+class LatencyRecorder:
+    """Aggregates the stage timestamps of every frame into per-stage latency histograms."""
+
+    def __init__(self, dump_path=None, dump_interval=5.0):
+        self.histograms = {}  # "stage->stage" or "total" -> LatencyHistogram
+        self.dump_path = dump_path
+        self.dump_interval = dump_interval
+        self.last_dump = time.monotonic()
+
+        # Intervals that came out negative, i.e. the clock offset was off
+        self.negative_intervals = 0
+
+    def record(self, stamps):
+        """Record one frame from a {stage: time.monotonic()} dict."""
+        stamped = [(stage, stamps[stage]) for stage in STAGES if stamps.get(stage) is not None]
+        if len(stamped) < 2:
+            return
+
+        for (previous, start), (stage, end) in zip(stamped, stamped[1:]):
+            self._add(f"{previous}->{stage}", end - start)
+        self._add("total", stamped[-1][1] - stamped[0][1])
+
+    def record_frame(self, frame):
+        self.record(frame_stamps(frame))
+
+    def _add(self, name, interval):
+        if interval < 0:
+            self.negative_intervals += 1
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        histogram.record(interval)
+
+    def summary(self):
+        """Per-interval summaries in pipeline order, "total" last."""
+        order = {stage: index for index, stage in enumerate(STAGES)}
+        # Copy the keys: the client records on its send thread while the window thread reads
+        names = sorted(
+            (name for name in list(self.histograms) if name != "total"),
+            key=lambda name: order[name.split("->")[0]]
+        )
+        if "total" in self.histograms:
+            names.append("total")
+        return {name: self.histograms[name].summary() for name in names}
+
+    def overlay_lines(self):
+        """One short "interval p50/p95/p99" line per interval, for an on-screen overlay."""
+        return [
+            f"{name}: {stats['p50_ms']:.1f} / {stats['p95_ms']:.1f} / {stats['p99_ms']:.1f} ms"
+            for name, stats in self.summary().items()
+        ]
+
+    def maybe_dump(self, now=None, **extra):
+        """Write the summary to dump_path if dump_interval has passed. extra is added to the JSON."""
+        now = time.monotonic() if now is None else now
+        if not self.dump_path or now - self.last_dump < self.dump_interval:
+            return False
+        self.last_dump = now
+
+        report = {"time": time.time(), "negative_intervals": self.negative_intervals, **extra,
+                  "latency": self.summary()}
+        # Write next to the target and swap, so a reader never sees half a file
+        temporary_path = f"{self.dump_path}.tmp"
+        with open(temporary_path, "w") as dump_file:
+            json.dump(report, dump_file, indent=2)
+        os.replace(temporary_path, self.dump_path)
+        return True
+
+
+def measure_clock_offset(sock, rounds=8, timeout=0.25):
+    """Estimate how far the server's clock is ahead of ours. Returns (offset, rtt), or None."""
+    best = None
+    reply = bytearray(CLOCK_MESSAGE_SIZE)
+    view = memoryview(reply)
+    previous_timeout = sock.gettimeout()
+    sock.settimeout(timeout)
+    try:
+        for _ in range(rounds):
+            client_send = time.monotonic()
+            sock.sendall(encode_clock(client_send))
+
+            received = 0
+            while received < CLOCK_MESSAGE_SIZE:
+                count = sock.recv_into(view[received:])
+                if not count:
+                    raise ConnectionError("Server closed the connection during clock sync")
+                received += count
+            client_receive = time.monotonic()
+
+            request_time, server_receive, server_send = decode_clock(reply)
+            if request_time != client_send:
+                break  # Answer to a request that timed out earlier; the stream is out of step
+
+            rtt = (client_receive - client_send) - (server_send - server_receive)
+            offset = ((server_receive - client_send) + (server_send - client_receive)) / 2
+            if best is None or rtt < best[1]:
+                best = (offset, rtt)
+    except (socket.timeout, ProtocolError):
+        pass
+    finally:
+        sock.settimeout(previous_timeout)
+    return best
@@ -0,0 +1,334 @@
+# Load generator: many synthetic tracking clients streaming at once, to find the receive path's ceiling
+#
+# Usage:
+#   python load_generator.py --clients 8 --rate 60 --duration 10              (in-process TrackingServer)
+#   python load_generator.py --clients 1 --target localhost:12345 --protocol text   (FingerTrackingServer)
+import argparse
+import multiprocessing
+import queue
+import socket
+import threading
+import time
+
+import numpy as np
+
+from frame_sender import LatestFrameSender
+from landmark_protocol import (
+    HAND_LANDMARK_COUNT, HAND_LEFT, HAND_RIGHT, KIND_ACK, KIND_FRAME, DeltaEncoder, ProtocolError, decode_ack,
+    decode_header, encode_text_frame
+)
+from latency import LatencyHistogram
+
+TRAJECTORIES = ("circle", "pinch", "dropout", "partial")
+
+FRAME_WIDTH = 1280
+FRAME_HEIGHT = 720
+
+LOCAL_PORT = 12342
+# Seconds past the run's duration to wait for the generator's totals (connecting, draining)
+RESULT_TIMEOUT = 10.0
+
+
+def _hand_template():
+    """A flat open right hand, (21, 3) pixels around the wrist at the origin, in MediaPipe order."""
+    template = np.zeros((HAND_LANDMARK_COUNT, 3), dtype=np.float32)
+    # Thumb to pinky: direction from the wrist and joint spacing
+    angles = np.radians([-50, -15, 0, 15, 30])
+    spacing = np.array([28, 34, 36, 33, 26], dtype=np.float32)
+    for finger, (angle, step) in enumerate(zip(angles, spacing)):
+        joints = np.arange(1, 5, dtype=np.float32) * step + (40 if finger else 10)
+        template[1 + 4 * finger:5 + 4 * finger, 0] = np.sin(angle) * joints
+        template[1 + 4 * finger:5 + 4 * finger, 1] = -np.cos(angle) * joints
+    template[:, 2] = -np.linspace(0, 20, HAND_LANDMARK_COUNT)
+    return template
+
+
+HAND_TEMPLATE = _hand_template()
+THUMB_TIP, INDEX_TIP = 4, 8
+
+
+def synthetic_hands(trajectory, t, phase=0.0):
+    """Landmarks (hands, 21, 3) of one synthetic frame of trajectory at t seconds; NaN outside the frame."""
+    angle = 2 * np.pi * 0.25 * t + phase
+    center = np.array([FRAME_WIDTH / 2 + 250 * np.cos(angle), FRAME_HEIGHT / 2 + 150 * np.sin(angle), 0],
+                      dtype=np.float32)
+
+    if trajectory == "dropout" and (t + phase) % 2.0 < 0.5:
+        return np.empty((0, HAND_LANDMARK_COUNT, 3), dtype=np.float32)
+
+    hand = HAND_TEMPLATE + center
+    if trajectory == "pinch":
+        closing = 0.5 - 0.5 * np.cos(2 * np.pi * t + phase)  # 0 open .. 1 touching
+        middle = (hand[THUMB_TIP] + hand[INDEX_TIP]) / 2
+        hand[THUMB_TIP] += (middle - hand[THUMB_TIP]) * closing
+        hand[INDEX_TIP] += (middle - hand[INDEX_TIP]) * closing
+        hands = hand[np.newaxis]
+    elif trajectory == "partial":
+        # The second hand mirrors the first and slides past the right edge and back
+        other = HAND_TEMPLATE * (-1, 1, 1) + (FRAME_WIDTH - 60 + 120 * np.sin(angle), FRAME_HEIGHT / 2, 0)
+        hands = np.stack((hand, other.astype(np.float32)))
+    else:
+        hands = hand[np.newaxis]
+
+    outside = (hands[..., 0] < 0) | (hands[..., 0] >= FRAME_WIDTH) | (hands[..., 1] < 0) | (hands[..., 1] >= FRAME_HEIGHT)
+    hands[outside] = np.nan
+    return hands
+
+
+class SyntheticClient:
+    """One generated tracking client: its own socket, trajectory and encoder."""
+
+    def __init__(self, index, address, trajectory, protocol="binary", encoding="delta", transport="tcp"):
+        self.index = index
+        self.trajectory = trajectory
+        self.protocol = protocol
+        self.phase = index * 0.7  # Keep the clients out of step
+
+        sock_type = socket.SOCK_DGRAM if transport == "udp" else socket.SOCK_STREAM
+        sock = socket.socket(socket.AF_INET, sock_type)
+        sock.connect(address)
+        self.sender = LatestFrameSender(sock, datagram=(transport == "udp"))
+        # Over UDP, deltas only refer to keyframes the server acknowledged, like the real client
+        self.encoder = DeltaEncoder(30 if encoding == "delta" else 1, acknowledged=(transport == "udp"))
+        self.sequence = 0
+
+    def _read_acks(self):
+        while True:
+            try:
+                data = self.sender.sock.recv(4096)
+            except (BlockingIOError, ConnectionRefusedError):
+                return
+            try:
+                if decode_header(data)[0] == KIND_ACK:
+                    self.encoder.acknowledge(decode_ack(data)[0])
+            except ProtocolError:
+                pass
+
+    def send(self, t, now):
+        """Generate and submit the frame for time t; now is the capture timestamp."""
+        hands = synthetic_hands(self.trajectory, t, self.phase)
+        if self.protocol == "text":
+            payload = encode_text_frame(hands)
+            if not payload:
+                return
+        else:
+            hand_count = len(hands)
+            handedness = np.array([HAND_RIGHT, HAND_LEFT][:hand_count], dtype=np.uint8)
+            scores = np.full(hand_count, 0.9, dtype=np.float32)
+            if self.encoder.acknowledged:
+                self._read_acks()
+            if self.sender.keyframe_waiting:
+                self.encoder.reset()  # Replacing an unsent keyframe with a delta would orphan the deltas after it
+            payload = self.encoder.encode(hands, self.sequence, now, handedness=handedness, scores=scores)
+        self.sequence += 1
+        try:
+            self.sender.submit(payload, keyframe=(self.encoder.last_kind == KIND_FRAME))
+        except ConnectionRefusedError:
+            pass  # UDP with nobody listening yet
+
+    def close(self):
+        self.sender.sock.close()
+
+
+def generate(address, clients, rate, duration, trajectories, protocol, encoding, transport, results):
+    """Stream from every synthetic client on one paced loop, then put the totals on results."""
+    generators = [
+        SyntheticClient(index, address, trajectories[index % len(trajectories)], protocol, encoding, transport)
+        for index in range(clients)
+    ]
+
+    interval = 1.0 / rate
+    start = next_tick = time.monotonic()
+    ticks = late_ticks = 0
+    while True:
+        now = time.monotonic()
+        t = now - start
+        if t >= duration:
+            break
+        for generator in generators:
+            generator.send(t, now)
+        ticks += 1
+
+        next_tick += interval
+        delay = next_tick - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            late_ticks += 1
+
+    # Give the outboxes a moment to drain before counting
+    drain_until = time.monotonic() + 0.5
+    while time.monotonic() < drain_until and any(g.sender.pending for g in generators):
+        for generator in generators:
+            generator.sender.flush()
+        time.sleep(0.001)
+
+    totals = dict.fromkeys(LatestFrameSender.COUNTERS, 0)
+    for generator in generators:
+        for key, value in generator.sender.stats().items():
+            totals[key] += value
+        generator.close()
+    totals.update(ticks=ticks, late_ticks=late_ticks, elapsed=time.monotonic() - start)
+    results.put(totals)
+
+
+class MailboxConsumer:
+    """Stands in for ServerConnect: newest frame per client, taken by a slower consumer thread."""
+
+    def __init__(self, work_time=0.0):
+        self.work_time = work_time
+        self.latest_frames = {}
+        self.condition = threading.Condition()
+        self.running = True
+        self.received = 0
+        self.coalesced = 0
+        self.consumed = 0
+        self.receive_lag = LatencyHistogram()  # Capture to arrival on the server thread
+        self.consume_lag = LatencyHistogram()  # Capture to consumption
+
+        self.thread = threading.Thread(target=self._consume, daemon=True)
+        self.thread.start()
+
+    def post(self, client_id, frame):
+        now = time.monotonic()
+        if frame.timestamp:
+            self.receive_lag.record(now - frame.timestamp)
+        with self.condition:
+            self.received += 1
+            if client_id in self.latest_frames:
+                self.coalesced += 1
+            self.latest_frames[client_id] = frame
+            self.condition.notify()
+
+    def _consume(self):
+        while True:
+            with self.condition:
+                while self.running and not self.latest_frames:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                frames, self.latest_frames = self.latest_frames, {}
+
+            for frame in frames.values():
+                if self.work_time:
+                    time.sleep(self.work_time)
+                if frame.timestamp:
+                    self.consume_lag.record(time.monotonic() - frame.timestamp)
+                self.consumed += 1
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
+
+
+def run_local(args, trajectories):
+    """Generate against an in-process TrackingServer, the receive path ServerConnect uses."""
+    from tracking_server import TRANSPORT_BOTH, TrackingServer
+
+    consumer = MailboxConsumer(args.work_ms / 1000)
+    server = TrackingServer(consumer.post, port=LOCAL_PORT, transport=TRANSPORT_BOTH)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    time.sleep(0.2)
+
+    try:
+        cpu_start = time.process_time()
+        generator = run_generator(("localhost", LOCAL_PORT), args, trajectories)
+        time.sleep(0.2)  # Let the server read what is still in flight
+        server_cpu = time.process_time() - cpu_start
+        udp_stats = [peer.tracker.stats() for peer in server.udp_peers.values()]
+    finally:
+        server.stop()
+        server_thread.join()
+        consumer.stop()
+
+    elapsed = generator["elapsed"]
+    print(f"Server received {consumer.received} frames ({consumer.received / elapsed:.0f} fps), "
+          f"consumed {consumer.consumed} ({consumer.consumed / elapsed:.0f} fps), "
+          f"coalesced {consumer.coalesced}, server CPU {server_cpu / elapsed * 100:.0f}%")
+    if udp_stats:
+        lost = sum(stats["lost"] for stats in udp_stats)
+        reordered = sum(stats["reordered"] + stats["duplicates"] for stats in udp_stats)
+        print(f"UDP lost {lost}, reordered/duplicate {reordered}")
+    for name, histogram in (("receive lag", consumer.receive_lag), ("consume lag", consumer.consume_lag)):
+        if not histogram.count:
+            continue  # Text frames carry no capture time
+        stats = histogram.summary()
+        print(f"{name:<12} p50 {stats['p50_ms']:.2f} ms, p95 {stats['p95_ms']:.2f} ms, "
+              f"p99 {stats['p99_ms']:.2f} ms, max {stats['max_ms']:.2f} ms")
+
+
+def _wait_for_totals(process, results, timeout):
+    """The generator's totals; raises RuntimeError if it dies or stalls instead of reporting them."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            totals = results.get(timeout=0.5)
+            break
+        except queue.Empty:
+            pass
+        if not process.is_alive():
+            # It may have reported just before exiting
+            try:
+                totals = results.get(timeout=0.5)
+                break
+            except queue.Empty:
+                process.join()
+                raise RuntimeError(f"generator process exited with code {process.exitcode} without results")
+        if time.monotonic() > deadline:
+            process.terminate()
+            process.join()
+            raise RuntimeError(f"generator process gave no results within {timeout:.0f} s")
+    process.join()
+    if process.exitcode:
+        raise RuntimeError(f"generator process exited with code {process.exitcode}")
+    return totals
+
+
+def run_generator(address, args, trajectories):
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=generate, args=(
+        address, args.clients, args.rate, args.duration, trajectories,
+        args.protocol, args.encoding, args.transport, results
+    ))
+    process.start()
+    totals = _wait_for_totals(process, results, args.duration + RESULT_TIMEOUT)
+
+    elapsed = totals["elapsed"]
+    wire_format = args.protocol if args.protocol == "text" else f"{args.protocol}/{args.encoding}"
+    print(f"{args.clients} client(s) x {args.rate:.0f} fps for {elapsed:.1f} s "
+          f"({', '.join(trajectories)}, {wire_format} over {args.transport})")
+    print(f"Generated {totals['frames_submitted']} frames ({totals['frames_submitted'] / elapsed:.0f} fps, "
+          f"{totals['late_ticks']} of {totals['ticks']} ticks late), "
+          f"accepted by the sockets {totals['frames_sent']} ({totals['frames_sent'] / elapsed:.0f} fps), "
+          f"coalesced in the outbox {totals['frames_superseded']}, {totals['bytes_sent'] / elapsed / 1024:.0f} KiB/s")
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream synthetic hands from many clients at a tracking server")
+    parser.add_argument("--clients", type=int, default=4, help="concurrent connections")
+    parser.add_argument("--rate", type=float, default=60.0, help="frames per second per client")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+    parser.add_argument("--trajectory", choices=TRAJECTORIES + ("mixed",), default="mixed",
+                        help="hand motion; mixed gives each client the next one in turn")
+    parser.add_argument("--protocol", choices=("binary", "text"), default="binary")
+    parser.add_argument("--encoding", choices=("delta", "full"), default="delta")
+    parser.add_argument("--transport", choices=("tcp", "udp"), default="tcp")
+    parser.add_argument("--target", help="host:port of a running server (ServerConnect 12340, "
+                                         "FingerTrackingServer 12345); default runs a TrackingServer in-process")
+    parser.add_argument("--work-ms", type=float, default=0.0,
+                        help="in-process mode: simulated per-frame update cost of the consumer")
+    args = parser.parse_args()
+
+    trajectories = TRAJECTORIES if args.trajectory == "mixed" else (args.trajectory,)
+    try:
+        if args.target:
+            host, port = args.target.rsplit(":", 1)
+            run_generator((host, int(port)), args, trajectories)
+        else:
+            run_local(args, trajectories)
+    except RuntimeError as e:
+        raise SystemExit(f"Load generator failed: {e}")
@@ -0,0 +1,47 @@
+# Motion gate: skip hand inference on camera frames that did not change
+import cv2
+import numpy as np
+
+from counters import Counters
+
+
+class MotionGate(Counters):
+    """Decides per frame whether MediaPipe has to run, by comparing thumbnails with the last processed frame."""
+
+    COUNTERS = ("frames", "skipped", "forced", "wakeups")
+
+    def __init__(self, width=160, pixel_threshold=15, min_changed=0.001, max_skip=10):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_changed = min_changed
+        self.max_skip = max_skip
+
+        self.reference = None  # Thumbnail of the last processed frame
+        self.skipped_in_row = 0
+        self.reset_counters()  # forced: processed because max_skip was reached, wakeups: changed after a skip
+
+    def check(self, frame):
+        """True if the BGR frame should be processed, False if the previous results still hold."""
+        self.frames += 1
+        height, width = frame.shape[:2]
+        thumbnail = cv2.resize(frame, (self.width, max(1, self.width * height // width)),
+                               interpolation=cv2.INTER_AREA)
+        thumbnail = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY)
+
+        if self.reference is not None and self.reference.shape == thumbnail.shape:
+            changed = np.count_nonzero(cv2.absdiff(thumbnail, self.reference) > self.pixel_threshold)
+            if changed <= self.min_changed * thumbnail.size:
+                if self.skipped_in_row < self.max_skip:
+                    self.skipped_in_row += 1
+                    self.skipped += 1
+                    return False
+                self.forced += 1
+            elif self.skipped_in_row:
+                self.wakeups += 1
+
+        self.reference = thumbnail
+        self.skipped_in_row = 0
+        return True
+
+    def stats(self):
+        return {**super().stats(), "skip_share": self.skipped / self.frames if self.frames else 0.0}
@@ -0,0 +1,249 @@
+# Multi-camera launcher: one tracking process per camera or video, all frames sent to FreeCAD on one connection
+#
+# Usage:
+#   python multi_camera.py 0 1                     (two webcams)
+#   python multi_camera.py 0 recording.mp4 --no-roi
+#   python multi_camera.py frames/ synthetic --max-speed   (image directory and generated frames, unpaced)
+#   python multi_camera.py 0 1 --port 12345        (FingerTrackingServer)
+import argparse
+import multiprocessing
+import queue
+import time
+
+import numpy as np
+
+from connection_manager import ReconnectingConnection
+from landmark_protocol import FLAG_FIST, GESTURE_FIST, HAND_LANDMARK_COUNT, DeltaEncoder, encode_gestures
+
+STATUS_INTERVAL = 5.0
+# A worker that sent no frame or status for this long is reported as stalled. Without hands in
+# view it only sends its status, so this has to leave room for a late one.
+STALL_TIMEOUT = 2 * STATUS_INTERVAL
+# Frames waiting for the sender; workers drop their frame instead of waiting when it is full
+FRAME_QUEUE_SIZE = 16
+
+NO_HANDS = np.empty((0, HAND_LANDMARK_COUNT, 3), dtype=np.float32)
+
+
+def camera_worker(camera_id, source, frames, statuses, stop, connects, use_roi=True, flip=True, realtime=True):
+    """Capture and run MediaPipe for one camera in its own process, putting results on frames."""
+    # Imported here so the launcher itself starts without a camera stack
+    import cv2
+    import mediapipe as mp
+
+    from frame_sources import open_source
+    from gestures import GestureEngine
+    from landmark_extraction import hand_info, results_array, to_pixels
+    from roi_tracking import RoiTracker
+
+    try:
+        capture = open_source(source, 1280, 720, realtime=realtime)
+    except IOError as e:
+        statuses.put({"camera_id": camera_id, "error": str(e)})
+        return
+    hands = mp.solutions.hands.Hands()
+    gestures = GestureEngine()
+    roi_tracker = RoiTracker(hands, mp.solutions.hands.Hands(static_image_mode=True)) if use_roi else None
+
+    connects_seen = connects.value
+    frames_read = dropped = 0
+    inference_total = 0.0
+    last_status = time.monotonic()
+    last_frames = 0
+    try:
+        while not stop.is_set():
+            frame = capture.read()
+            if frame is None:
+                break
+            capture_time = time.monotonic()
+            frames_read += 1
+
+            if flip:
+                frame = cv2.flip(frame, 1)
+            if roi_tracker is not None:
+                results = roi_tracker.process(frame)
+            else:
+                results = hands.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            inference_time = time.monotonic()
+            inference_total += inference_time - capture_time
+
+            if results.multi_hand_landmarks:
+                landmarks = to_pixels(results_array(results), frame.shape)
+                handedness, scores = hand_info(results)
+            else:
+                landmarks, handedness, scores = NO_HANDS, None, None
+
+            if connects.value != connects_seen:
+                # The new server has seen none of our gestures begin
+                connects_seen = connects.value
+                gestures.reset()
+            events = gestures.update(landmarks, handedness, capture_time)
+            if events:
+                statuses.put({"camera_id": camera_id, "gestures": events, "timestamp": capture_time})
+
+            if len(landmarks):
+                flags = FLAG_FIST if GESTURE_FIST in gestures.hand_gestures else 0
+                try:
+                    frames.put_nowait((camera_id, landmarks, handedness, scores, flags, capture_time, inference_time))
+                except queue.Full:
+                    dropped += 1
+
+            now = time.monotonic()
+            if now - last_status >= STATUS_INTERVAL:
+                statuses.put({
+                    "camera_id": camera_id,
+                    "fps": (frames_read - last_frames) / (now - last_status),
+                    "frames": frames_read,
+                    "dropped": dropped,
+                    "inference_ms": inference_total / frames_read * 1000,
+                    "roi_share": roi_tracker.stats()["roi_share"] if roi_tracker is not None else 0.0,
+                })
+                last_status, last_frames = now, frames_read
+    finally:
+        capture.close()
+        hands.close()
+        if roi_tracker is not None:
+            roi_tracker.detector.close()
+        statuses.put({"camera_id": camera_id, "finished": True, "frames": frames_read})
+
+
+class CameraProcess:
+    """Parent-side handle and health of one camera worker."""
+
+    def __init__(self, camera_id, source, frames, statuses, stop, connects, use_roi, flip, realtime):
+        self.camera_id = camera_id
+        self.source = source
+        self.process = multiprocessing.Process(
+            target=camera_worker, args=(camera_id, source, frames, statuses, stop, connects, use_roi, flip, realtime),
+            name=f"camera-{camera_id}", daemon=True
+        )
+        self.last_seen = time.monotonic()
+        self.status = {}
+        self.sent = 0
+
+    def health(self, now):
+        if "error" in self.status:
+            return f"error: {self.status['error']}"
+        if not self.process.is_alive():
+            if self.status.get("finished"):
+                return "finished"
+            return f"died (exit code {self.process.exitcode})"
+        if now - self.last_seen > STALL_TIMEOUT:
+            return f"stalled for {now - self.last_seen:.0f} s"
+        return "ok"
+
+    def describe(self, now):
+        line = f"Camera {self.camera_id} ({self.source}, pid {self.process.pid}): {self.health(now)}"
+        if "fps" in self.status:
+            line += (f", {self.status['fps']:.1f} fps, inference {self.status['inference_ms']:.1f} ms, "
+                     f"ROI {self.status['roi_share']:.0%}, dropped {self.status['dropped']}, sent {self.sent}")
+        return line
+
+
+def run(sources, address, use_roi=True, flip=True, keyframe_interval=30, realtime=True):
+    """Start a worker per source and forward their frames until all of them are done."""
+    frames = multiprocessing.Queue(FRAME_QUEUE_SIZE)
+    statuses = multiprocessing.Queue()
+    stop = multiprocessing.Event()
+    connects = multiprocessing.Value("i", 0)
+    cameras = [CameraProcess(camera_id, source, frames, statuses, stop, connects, use_roi, flip, realtime)
+               for camera_id, source in enumerate(sources)]
+
+    # One delta encoder per camera, all restarted with keyframes after a reconnect
+    encoders = [DeltaEncoder(keyframe_interval) for _ in cameras]
+
+    def on_connect():
+        for encoder in encoders:
+            encoder.reset()
+        # Tells the workers to restart their gestures
+        with connects.get_lock():
+            connects.value += 1
+
+    connection = ReconnectingConnection(address, on_connect=on_connect)
+    sequences = [0] * len(cameras)
+    latest = {}  # camera_id -> newest frame not sent yet
+    last_report = time.monotonic()
+
+    for camera in cameras:
+        camera.process.start()
+    try:
+        while any(camera.process.is_alive() for camera in cameras) or latest:
+            try:
+                item = frames.get(timeout=0.05)
+            except queue.Empty:
+                item = None
+            # Take everything that is waiting, keeping only the newest frame of each camera
+            while item is not None:
+                latest[item[0]] = item
+                cameras[item[0]].last_seen = time.monotonic()
+                try:
+                    item = frames.get_nowait()
+                except queue.Empty:
+                    item = None
+
+            connection.poll()
+            if latest and not connection.pending:
+                # All cameras' frames go out as one write on the shared connection
+                payload = []
+                for camera_id, landmarks, handedness, scores, flags, capture_time, inference_time in latest.values():
+                    offset = connection.clock_offset
+                    payload.append(encoders[camera_id].encode(
+                        landmarks, sequences[camera_id], capture_time + offset, flags, camera_id,
+                        handedness, scores, (inference_time + offset, time.monotonic() + offset)
+                    ))
+                    sequences[camera_id] += 1
+                    cameras[camera_id].sent += 1
+                connection.send(b"".join(payload))
+                latest.clear()
+
+            while True:
+                try:
+                    status = statuses.get_nowait()
+                except queue.Empty:
+                    break
+                camera = cameras[status["camera_id"]]
+                camera.last_seen = time.monotonic()
+                if "gestures" in status:
+                    # Gesture events are sent in order as they come, ahead of the frames
+                    offset = connection.clock_offset
+                    connection.send_message(encode_gestures(
+                        status["gestures"], sequences[camera.camera_id], status["timestamp"] + offset, camera.camera_id
+                    ))
+                    continue
+                camera.status.update(status)
+
+            now = time.monotonic()
+            if now - last_report >= STATUS_INTERVAL:
+                last_report = now
+                for camera in cameras:
+                    print(camera.describe(now))
+                print(f"Connection: {connection.stats()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        for camera in cameras:
+            camera.process.join(timeout=2.0)
+            if camera.process.is_alive():
+                camera.process.terminate()
+        now = time.monotonic()
+        for camera in cameras:
+            print(camera.describe(now))
+        print(f"Connection: {connection.stats()}")
+        connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Track hands on several cameras, one process each")
+    parser.add_argument("sources", nargs="+",
+                        help="camera index, video file, image directory or 'synthetic', one per camera")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=12340)
+    parser.add_argument("--no-roi", action="store_true", help="run MediaPipe on the full frame every time")
+    parser.add_argument("--no-flip", action="store_true", help="do not mirror the image")
+    parser.add_argument("--max-speed", action="store_true",
+                        help="read files and synthetic frames as fast as possible instead of at their frame rate")
+    args = parser.parse_args()
+
+    sources = [int(source) if source.isdigit() else source for source in args.sources]
+    run(sources, (args.host, args.port), use_roi=not args.no_roi, flip=not args.no_flip, realtime=not args.max_speed)
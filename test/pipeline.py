@@ -0,0 +1,124 @@
+# Threaded stages for the tracking client: capture -> inference -> send, connected by freshest-frame slots
+import threading
+import time
+import traceback
+
+from counters import Counters
+
+
+class StopPipeline(Exception):
+    """Raised by a stage's work function when its source is exhausted (e.g. end of a video)."""
+
+
+class LatestSlot(Counters):
+    """Single-slot queue between two stages; put() replaces an item not taken yet."""
+
+    COUNTERS = ("put_count", "dropped")
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._item = None
+        self._full = False
+        self.closed = False
+        self.reset_counters()
+
+    def put(self, item):
+        with self._condition:
+            self.put_count += 1
+            if self._full:
+                self.dropped += 1
+            self._item = item
+            self._full = True
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        """Take the item, waiting up to timeout seconds. Returns None on timeout or once closed and empty."""
+        with self._condition:
+            if not self._full and not self.closed:
+                self._condition.wait(timeout)
+            if not self._full:
+                return None
+            item, self._item, self._full = self._item, None, False
+            return item
+
+    def close(self):
+        """Wake up the consumer; get() returns None from now on once the slot is empty."""
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+
+class PipelineStage(threading.Thread):
+    """Runs work(item) on its own thread for every item from source, putting results into outputs."""
+
+    def __init__(self, name, work, source=None, outputs=(), idle_interval=None):
+        super().__init__(name=name, daemon=True)
+        self.work = work
+        self.source = source
+        self.outputs = outputs
+        self.idle_interval = idle_interval
+        self.running = True
+        self.frames = 0
+        self.errors = 0
+        self._last_frames = 0  # Frames and time of the previous stats() call
+        self._last_time = time.monotonic()
+
+    def run(self):
+        try:
+            while self.running:
+                item = None
+                if self.source is not None:
+                    item = self.source.get(self.idle_interval or 0.1)
+                    if item is None:
+                        if self.source.closed:
+                            break
+                        if self.idle_interval is None:
+                            continue
+
+                try:
+                    result = self.work(item)
+                except StopPipeline:
+                    break
+                except Exception:
+                    # One bad frame must not take the whole client down
+                    self.errors += 1
+                    traceback.print_exc()
+                    continue
+
+                if item is not None or self.source is None:
+                    self.frames += 1
+                if result is not None:
+                    for output in self.outputs:
+                        output.put(result)
+        finally:
+            for output in self.outputs:
+                output.close()
+
+    def stop(self):
+        self.running = False
+        if self.source is not None:
+            self.source.close()
+
+    def stats(self):
+        """Frames per second since the previous call, plus totals and the drops of the input slot."""
+        now = time.monotonic()
+        fps = (self.frames - self._last_frames) / max(now - self._last_time, 1e-9)
+        self._last_frames, self._last_time = self.frames, now
+        stats = {"fps": fps, "frames": self.frames}
+        if self.source is not None:
+            stats["dropped"] = self.source.dropped
+        if self.errors:
+            stats["errors"] = self.errors
+        return stats
+
+
+def format_stats(stages):
+    """One line with the fps and input drops of every stage."""
+    parts = []
+    for stage in stages:
+        stats = stage.stats()
+        part = f"{stage.name} {stats['fps']:.1f} fps"
+        if "dropped" in stats:
+            part += f" (dropped {stats['dropped']})"
+        parts.append(part)
+    return " | ".join(parts)
@@ -0,0 +1,104 @@
+# Resamples a hand's pose from capture-time samples to display time: latency compensation and smooth steps
+import time
+
+import numpy as np
+
+from counters import Counters
+
+# A sample that looks older than this (or from the future) was not stamped in our clock, e.g. a
+# replayed recording or a client without clock sync: it is extrapolated from its arrival instead.
+MAX_LATENCY = 1.0
+
+
+class PoseResampler(Counters):
+    """Turns irregular pose samples into a pose for any display time, extrapolating up to max_prediction."""
+
+    COUNTERS = ("samples", "stale")
+
+    def __init__(self, max_prediction=0.15, velocity_smoothing=0.5, error_smoothing=0.1):
+        self.max_prediction = max_prediction
+        self.velocity_smoothing = velocity_smoothing
+        self.error_smoothing = error_smoothing
+
+        self.position = None  # Newest sample
+        self.velocity = None  # Per second, smoothed
+        self.timestamp = None  # Capture time of the newest sample
+        self.origin = None  # Time extrapolation starts from: the capture time, or the arrival time
+        self.interval = None  # Average time between samples
+        self.correction = None  # Old estimate minus new one when the newest sample arrived
+        self.correction_time = 0.0
+        self.prediction_error = None  # Smoothed error of the extrapolated positions
+        self.hold_error = None  # The same for just holding the newest sample
+        self.reset_counters()  # stale: samples not newer than the newest one, ignored
+
+    @property
+    def predicting(self):
+        return self.prediction_error is None or bool(self.prediction_error <= self.hold_error)
+
+    def add(self, positions, timestamp, now=None):
+        """Take a new sample captured at timestamp; now is the display clock's current time."""
+        positions = np.asarray(positions, dtype=np.float64)
+        now = time.monotonic() if now is None else now
+        if self.position is None:
+            self.position, self.velocity = positions, np.zeros_like(positions)
+            self.timestamp = timestamp
+            self.origin = self._origin(timestamp, now)
+            self.samples += 1
+            return
+
+        dt = timestamp - self.timestamp
+        if dt <= 0:
+            self.stale += 1
+            return
+        self.samples += 1
+
+        # Score the estimates we had for this capture time
+        predicted = self.position + self.velocity * min(dt, self.max_prediction)
+        self._score(float(np.linalg.norm(predicted - positions, axis=-1).mean()),
+                    float(np.linalg.norm(self.position - positions, axis=-1).mean()))
+
+        before = self.sample(now)
+        speed = (positions - self.position) / dt
+        self.velocity += self.velocity_smoothing * (speed - self.velocity)
+        self.position, self.timestamp = positions, timestamp
+        self.origin = self._origin(timestamp, now)
+        self.interval = dt if self.interval is None else self.interval + 0.2 * (dt - self.interval)
+        # Start from where the view is and fade the difference out over one sample interval
+        self.correction = before - self._extrapolate(now)
+        self.correction_time = now
+
+    def sample(self, now=None):
+        """Pose at display time now."""
+        now = time.monotonic() if now is None else now
+        pose = self._extrapolate(now)
+        if self.correction is not None:
+            fade = 1.0 - (now - self.correction_time) / self.interval
+            if fade > 0:
+                pose = pose + self.correction * min(fade, 1.0)
+        return pose
+
+    def _extrapolate(self, now):
+        if not self.predicting:
+            return self.position
+        ahead = min(max(now - self.origin, 0.0), self.max_prediction)
+        return self.position + self.velocity * ahead
+
+    @staticmethod
+    def _origin(timestamp, now):
+        return timestamp if 0.0 <= now - timestamp <= MAX_LATENCY else now
+
+    def _score(self, prediction_error, hold_error):
+        if self.prediction_error is None:
+            self.prediction_error, self.hold_error = prediction_error, hold_error
+            return
+        self.prediction_error += self.error_smoothing * (prediction_error - self.prediction_error)
+        self.hold_error += self.error_smoothing * (hold_error - self.hold_error)
+
+    def stats(self):
+        return {
+            **super().stats(),
+            "interval": self.interval,
+            "prediction_error": self.prediction_error,
+            "hold_error": self.hold_error,
+            "predicting": self.predicting,
+        }
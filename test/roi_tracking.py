@@ -0,0 +1,107 @@
+# Region-of-interest tracking: run MediaPipe on a crop around the hands found in the previous frame
+import cv2
+import numpy as np
+
+from counters import Counters
+
+
+class RoiTracker(Counters):
+    """Runs hands on a crop around the last hands; detector redetects on the full frame now and then."""
+
+    COUNTERS = ("roi_frames", "full_frames", "misses", "moves")
+
+    def __init__(self, hands, detector, margin=0.3, max_size=480, min_size=128, redetect_interval=30):
+        self.hands = hands
+        self.detector = detector
+        self.margin = margin
+        self.max_size = max_size
+        self.min_size = min_size
+        self.redetect_interval = redetect_interval
+
+        self.roi = None  # (x0, y0, x1, y1) in pixels, None until hands were found
+        self.frames_since_full = 0
+        self.reset_counters()  # misses: crops without hands, re-run on the full frame
+
+    def reset(self):
+        """Forget the crop, e.g. when the frame size changes; the next frame is searched in full."""
+        self.roi = None
+        self.frames_since_full = 0
+
+    def process(self, frame):
+        """Detect hands in a BGR frame. Returns MediaPipe results in full-frame coordinates."""
+        if self.roi is None or self.frames_since_full >= self.redetect_interval:
+            return self._process_full(frame)
+
+        x0, y0, x1, y1 = self.roi
+        crop = frame[y0:y1, x0:x1]
+        size = max(x1 - x0, y1 - y0)
+        if size > self.max_size:
+            scale = self.max_size / size
+            crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        results = self.hands.process(cv2.cvtColor(crop, cv2.COLOR_BGR2RGB))
+        if not results.multi_hand_landmarks:
+            self.misses += 1
+            return self._process_full(frame)
+
+        self.roi_frames += 1
+        self.frames_since_full += 1
+        self._to_full_frame(results, frame.shape)
+        self._update_roi(results, frame.shape)
+        return results
+
+    def _process_full(self, frame):
+        results = self.detector.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        self.full_frames += 1
+        self.frames_since_full = 0
+        if results.multi_hand_landmarks:
+            self._update_roi(results, frame.shape)
+        else:
+            self.roi = None
+        return results
+
+    def _to_full_frame(self, results, frame_shape):
+        """Map crop-normalized landmarks to frame-normalized ones in place."""
+        height, width = frame_shape[:2]
+        x0, y0, x1, y1 = self.roi
+        scale_x, scale_y = (x1 - x0) / width, (y1 - y0) / height
+        offset_x, offset_y = x0 / width, y0 / height
+        for hand_landmarks in results.multi_hand_landmarks:
+            for landmark in hand_landmarks.landmark:
+                landmark.x = offset_x + landmark.x * scale_x
+                landmark.y = offset_y + landmark.y * scale_y
+                # MediaPipe scales z like x
+                landmark.z *= scale_x
+
+    def _update_roi(self, results, frame_shape):
+        height, width = frame_shape[:2]
+        points = np.array([
+            (landmark.x, landmark.y)
+            for hand_landmarks in results.multi_hand_landmarks
+            for landmark in hand_landmarks.landmark
+        ]) * (width, height)
+        left, top = points.min(axis=0)
+        right, bottom = points.max(axis=0)
+        box_size = max(right - left, bottom - top)
+
+        if self.roi is not None:
+            # Keep the crop while the hands stay inside its inner area and still fill a fair part of it
+            x0, y0, x1, y1 = self.roi
+            inset = (x1 - x0) * self.margin / (1 + 2 * self.margin) / 2
+            if (left >= x0 + inset and right <= x1 - inset and top >= y0 + inset and bottom <= y1 - inset
+                    and box_size >= (x1 - x0) / (2 * (1 + 2 * self.margin))):
+                return
+
+        size = int(max(box_size * (1 + 2 * self.margin), self.min_size))
+        if size >= min(width, height):
+            # Hands too close to the camera or far apart: a crop would not save anything
+            self.roi = None
+            return
+        # Centre the square on the hands, shifted back inside the frame at the edges
+        x0 = int(np.clip((left + right - size) / 2, 0, width - size))
+        y0 = int(np.clip((top + bottom - size) / 2, 0, height - size))
+        self.roi = (x0, y0, x0 + size, y0 + size)
+        self.moves += 1
+
+    def stats(self):
+        processed = self.full_frames + self.roi_frames
+        return {**super().stats(), "roi_share": self.roi_frames / processed if processed else 0.0}
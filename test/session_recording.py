@@ -0,0 +1,276 @@
+# Record landmark sessions to a fixed-record file and replay them without a camera
+#
+# Usage:
+#   python session_recording.py record session.htlr [--port 12340]
+#   python session_recording.py info session.htlr
+#   python session_recording.py replay session.htlr [--speed 2 | --max] [--port 12345]
+import argparse
+import os
+import socket
+import struct
+import time
+
+import numpy as np
+
+from landmark_protocol import (
+    FLAG_HAND_INFO, FLAG_TIMING, HAND_LANDMARK_COUNT, LANDMARK_DTYPE, STAGE_INFERENCE, STAGE_RECEIVE,
+    STAGE_SEND, LandmarkFrame, encode_frame
+)
+
+# File layout: a 64 byte header, then one fixed-size record per frame, so the
+# whole file maps onto a numpy structured array.
+FILE_MAGIC = b"HTLR"
+FILE_VERSION = 1
+FILE_HEADER = struct.Struct("<4sHHHHI")  # magic, version, max_hands, landmark_count, dims, record size
+FILE_HEADER_SIZE = 64
+
+
+def record_dtype(max_hands=2, landmark_count=HAND_LANDMARK_COUNT, dims=3):
+    """One recorded frame. Frames with fewer hands, landmarks or dims are padded with NaN."""
+    return np.dtype([
+        ("receive_time", "<f8"),  # Recorder's time.monotonic(), drives the replay pacing
+        ("timestamp", "<f8"),  # Capture time as sent by the client
+        ("timings", "<f8", (2,)),  # Inference end, send (FLAG_TIMING)
+        ("sequence", "<u4"),
+        ("source_id", "<u2"),  # Client id of the tracking link the frame came in on
+        ("flags", "u1"),
+        ("hand_count", "u1"),
+        ("landmark_count", "u1"),
+        ("dims", "u1"),
+        ("handedness", "u1", (max_hands,)),
+        ("scores", "<f4", (max_hands,)),
+        ("landmarks", LANDMARK_DTYPE, (max_hands, landmark_count, dims)),
+    ])
+
+
+class SessionRecorder:
+    """Appends every frame it is given to a session file, flushed every flush_interval seconds."""
+
+    def __init__(self, path, max_hands=2, landmark_count=HAND_LANDMARK_COUNT, dims=3, flush_interval=1.0):
+        self.path = path
+        self.dtype = record_dtype(max_hands, landmark_count, dims)
+        self.max_hands = max_hands
+        self.flush_interval = flush_interval
+        self.last_flush = time.monotonic()
+
+        header = FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, max_hands, landmark_count, dims, self.dtype.itemsize)
+        if os.path.exists(path) and os.path.getsize(path) >= FILE_HEADER_SIZE:
+            with open(path, "rb") as existing:
+                if existing.read(FILE_HEADER.size) != header:
+                    raise ValueError(f"{path} was recorded with a different layout")
+            self._file = open(path, "r+b")
+            # Drop a partial record left by a crash so records stay aligned
+            self._file.truncate(FILE_HEADER_SIZE + self._complete_records() * self.dtype.itemsize)
+            self._file.seek(0, os.SEEK_END)
+        else:
+            self._file = open(path, "wb")
+            self._file.write(header.ljust(FILE_HEADER_SIZE, b"\0"))
+
+        # Filled in place for every frame
+        self._record = np.zeros((), dtype=self.dtype)
+        self.frames = 0
+        self.truncated_frames = 0  # Frames that had more hands/landmarks/dims than the layout
+
+    def _complete_records(self):
+        return (os.path.getsize(self.path) - FILE_HEADER_SIZE) // self.dtype.itemsize
+
+    def record(self, frame, source_id=None, receive_time=None):
+        """Append one LandmarkFrame; source_id defaults to the frame's own."""
+        if receive_time is None:
+            receive_time = frame.stamps.get(STAGE_RECEIVE) or time.monotonic()
+
+        record = self._record
+        slots = record["landmarks"]
+        hand_count = min(frame.hand_count, slots.shape[0])
+        landmark_count = min(frame.landmarks.shape[1], slots.shape[1])
+        dims = min(frame.landmarks.shape[2], slots.shape[2])
+        if (hand_count, landmark_count, dims) != frame.landmarks.shape:
+            self.truncated_frames += 1
+
+        record["receive_time"] = receive_time
+        record["timestamp"] = frame.timestamp
+        record["timings"] = (frame.stamps.get(STAGE_INFERENCE, 0.0), frame.stamps.get(STAGE_SEND, 0.0))
+        record["sequence"] = frame.sequence & 0xFFFFFFFF
+        record["source_id"] = frame.source_id if source_id is None else source_id
+        record["flags"] = frame.flags
+        record["hand_count"] = hand_count
+        record["landmark_count"] = landmark_count
+        record["dims"] = dims
+        record["handedness"] = 0
+        record["scores"] = 0.0
+        if frame.handedness is not None:
+            record["handedness"][:hand_count] = frame.handedness[:hand_count]
+            record["scores"][:hand_count] = frame.scores[:hand_count]
+        slots[...] = np.nan
+        slots[:hand_count, :landmark_count, :dims] = frame.landmarks[:hand_count, :landmark_count, :dims]
+
+        self._file.write(record.tobytes())
+        self.frames += 1
+
+        now = time.monotonic()
+        if now - self.last_flush >= self.flush_interval:
+            self._file.flush()
+            self.last_flush = now
+
+    def close(self):
+        self._file.close()
+
+
+def open_session(path):
+    """Map a session file read-only. Returns a structured array of its complete records."""
+    with open(path, "rb") as session_file:
+        magic, version, max_hands, landmark_count, dims, record_size = FILE_HEADER.unpack(
+            session_file.read(FILE_HEADER.size)
+        )
+    if magic != FILE_MAGIC or version != FILE_VERSION:
+        raise ValueError(f"{path} is not a landmark session file")
+
+    dtype = record_dtype(max_hands, landmark_count, dims)
+    if dtype.itemsize != record_size:
+        raise ValueError(f"{path} has records of {record_size} bytes, expected {dtype.itemsize}")
+
+    count = (os.path.getsize(path) - FILE_HEADER_SIZE) // record_size
+    if not count:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=FILE_HEADER_SIZE, shape=(count,))
+
+
+def record_frame(record):
+    """Turn one record back into a LandmarkFrame (views into the mapped file)."""
+    hand_count, landmark_count, dims = int(record["hand_count"]), int(record["landmark_count"]), int(record["dims"])
+    flags = int(record["flags"])
+    frame = LandmarkFrame(
+        record["landmarks"][:hand_count, :landmark_count, :dims],
+        int(record["sequence"]),
+        float(record["timestamp"]),
+        flags,
+        int(record["source_id"])
+    )
+    if flags & FLAG_HAND_INFO:
+        frame.handedness = record["handedness"][:hand_count]
+        frame.scores = record["scores"][:hand_count]
+    if flags & FLAG_TIMING:
+        frame.stamps[STAGE_INFERENCE], frame.stamps[STAGE_SEND] = record["timings"].tolist()
+    return frame
+
+
+class SessionReplayer:
+    """Plays a session back with its recorded timing, scaled by speed (0 = as fast as possible)."""
+
+    def __init__(self, path, speed=1.0):
+        self.records = open_session(path)
+        self.speed = speed
+        self.frames = 0
+        self.max_lag = 0.0  # Furthest the consumer fell behind the schedule, in seconds
+        self.elapsed = 0.0
+
+    def frames_due(self):
+        """Yield (source_id, frame) pairs, each one when it is due."""
+        if not len(self.records):
+            return
+
+        start = time.monotonic()
+        first = float(self.records[0]["receive_time"])
+        for record in self.records:
+            if self.speed:
+                due = start + (float(record["receive_time"]) - first) / self.speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    self.max_lag = max(self.max_lag, -delay)
+
+            frame = record_frame(record)
+            frame.timestamp = time.monotonic()
+            frame.stamps = {}
+            self.frames += 1
+            self.elapsed = time.monotonic() - start
+            yield frame.source_id, frame
+
+    def replay(self, callback):
+        """Call callback(source_id, frame) for every frame, e.g. ServerConnect._post_frame."""
+        for source_id, frame in self.frames_due():
+            callback(source_id, frame)
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "elapsed": self.elapsed,
+            "fps": self.frames / self.elapsed if self.elapsed else 0.0,
+            "max_lag": self.max_lag,
+        }
+
+
+def replay_to_server(replayer, address):
+    """Send a session to a running server as binary frames, one TCP connection per recorded source."""
+    connections = {}
+    try:
+        for source_id, frame in replayer.frames_due():
+            sock = connections.get(source_id)
+            if sock is None:
+                sock = connections[source_id] = socket.create_connection(address)
+            sock.sendall(encode_frame(
+                frame.landmarks, frame.sequence, frame.timestamp, frame.flags,
+                handedness=frame.handedness, scores=frame.scores
+            ))
+    finally:
+        for sock in connections.values():
+            sock.close()
+
+
+def print_info(path):
+    records = open_session(path)
+    print(f"{path}: {len(records)} frames, layout {records.dtype['landmarks'].shape}")
+    if len(records) < 2:
+        return
+
+    receive_times = np.asarray(records["receive_time"])
+    duration = receive_times[-1] - receive_times[0]
+    gaps = np.diff(receive_times) * 1000
+    print(f"Duration {duration:.2f} s, {(len(records) - 1) / duration:.1f} fps, "
+          f"frame gap p50 {np.percentile(gaps, 50):.1f} ms, p99 {np.percentile(gaps, 99):.1f} ms")
+    sources, counts = np.unique(np.asarray(records["source_id"]), return_counts=True)
+    for source_id, count in zip(sources.tolist(), counts.tolist()):
+        print(f"  source {source_id}: {count} frames")
+    hands = np.asarray(records["hand_count"])
+    print(f"Frames without hands: {np.count_nonzero(hands == 0)}, with two or more: {np.count_nonzero(hands >= 2)}")
+
+
+def record_server(path, host, port):
+    """Stand in for FreeCAD: accept tracking clients and record everything they send."""
+    from tracking_server import TRANSPORT_BOTH, TrackingServer
+
+    recorder = SessionRecorder(path)
+    server = TrackingServer(lambda client_id, frame: recorder.record(frame, client_id),
+                            host=host, port=port, transport=TRANSPORT_BOTH)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.close()
+        print(f"Recorded {recorder.frames} frames to {path} ({recorder.truncated_frames} truncated)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record and replay landmark sessions")
+    parser.add_argument("command", choices=("record", "info", "replay"))
+    parser.add_argument("path", help="session file")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=12340,
+                        help="port to record on / replay to (FingerTrackingServer listens on 12345)")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier")
+    parser.add_argument("--max", action="store_true", help="replay as fast as possible")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record_server(args.path, args.host, args.port)
+    elif args.command == "info":
+        print_info(args.path)
+    else:
+        replayer = SessionReplayer(args.path, 0 if args.max else args.speed)
+        try:
+            replay_to_server(replayer, (args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        print(f"Replayed {replayer.stats()}")
@@ -0,0 +1,177 @@
+# Reassembles complete landmark frames from a TCP byte stream
+import time
+from collections import deque
+
+from counters import Counters
+from landmark_protocol import (
+    FIST_TOKEN, FORMAT_BINARY, HEADER_SIZE, KIND_CLOCK, KIND_GESTURE, KIND_HEARTBEAT, KIND_STATUS, MAGIC, STAGE_RECEIVE,
+    DeltaDecoder, ProtocolError, decode_clock, decode_gestures, decode_header, decode_status, decode_text_frame,
+    detect_format
+)
+
+FIST_TOKEN_BYTES = FIST_TOKEN.encode('utf-8')
+
+
+class FrameReader(Counters):
+    """Receive buffer that only hands complete frames to the parser, and collects control messages."""
+
+    COUNTERS = ("bytes_received", "frames", "heartbeats", "gesture_events", "status_messages", "malformed_frames")
+
+    def __init__(self, buffer_size=64 * 1024):
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._start = 0  # First byte that has not been parsed yet
+        self._end = 0  # End of the received data
+        self._resyncing = False  # Skipping bytes after a corrupt header, counted once
+
+        self.wire_format = None
+        self.decoder = DeltaDecoder()
+        self.receive_time = 0.0
+        self.clock_requests = deque(maxlen=8)
+        self.gestures = deque()
+        self.statuses = deque()
+        self.reset_counters()
+
+    def recv_from(self, sock):
+        """Receive available data from sock. Returns the byte count, 0 when the peer closed."""
+        if self._end == len(self._buffer):
+            self._compact()
+
+        count = sock.recv_into(self._view[self._end:])
+        self._received(count)
+        return count
+
+    def feed(self, data):
+        """Append already received bytes (e.g. a datagram) to the buffer."""
+        data = memoryview(data)
+        while len(data):
+            if self._end == len(self._buffer):
+                self._compact()
+            count = min(len(data), len(self._buffer) - self._end)
+            self._view[self._end:self._end + count] = data[:count]
+            self._received(count)
+            data = data[count:]
+
+    def read_frames(self):
+        """Yield every complete LandmarkFrame currently in the buffer."""
+        if self.wire_format is None:
+            if self._end == self._start:
+                return
+            self.wire_format = detect_format(self._view[self._start:self._end])
+
+        parse = self._next_binary_frame if self.wire_format == FORMAT_BINARY else self._next_text_frame
+        while True:
+            frame = parse()
+            if frame is None:
+                break
+            self.frames += 1
+            frame.stamps[STAGE_RECEIVE] = self.receive_time
+            yield frame
+
+        if self._start == self._end:
+            self._start = self._end = 0
+
+    def stats(self):
+        return {**super().stats(), **self.decoder.stats()}
+
+    def _received(self, count):
+        self.receive_time = time.monotonic()
+        self._end += count
+        self.bytes_received += count
+
+    def _compact(self):
+        """Move unparsed data to the front of the buffer to make room."""
+        pending = self._end - self._start
+        if self._start == 0:
+            # A single frame does not fit in the buffer, it can never be completed
+            self.malformed_frames += 1
+            pending = 0
+        elif pending:
+            self._buffer[:pending] = self._buffer[self._start:self._end]
+        self._start, self._end = 0, pending
+
+    def _next_binary_frame(self):
+        while self._end - self._start >= HEADER_SIZE:
+            try:
+                header = decode_header(self._view, self._start)
+                kind, payload_size = header[0], header[-1]
+                if payload_size > len(self._buffer) - HEADER_SIZE:
+                    raise ProtocolError(f"Frame of {payload_size} bytes is too large")
+            except ProtocolError:
+                self._resync()
+                continue
+            self._resyncing = False
+
+            if self._end - self._start < HEADER_SIZE + payload_size:
+                return None
+
+            if kind == KIND_CLOCK:
+                self.clock_requests.append((decode_clock(self._view, self._start)[0], self.receive_time))
+                self._start += HEADER_SIZE + payload_size
+                continue
+            if kind == KIND_HEARTBEAT:
+                self.heartbeats += 1
+                self._start += HEADER_SIZE
+                continue
+            if kind == KIND_GESTURE:
+                events, source_id, message_size = decode_gestures(self._view[:self._end], self._start)
+                self.gesture_events += len(events)
+                self.gestures.append((source_id, events))
+                self._start += message_size
+                continue
+            if kind == KIND_STATUS:
+                point, source_id, message_size = decode_status(self._view[:self._end], self._start)
+                self.status_messages += 1
+                self.statuses.append((source_id, point))
+                self._start += message_size
+                continue
+
+            try:
+                frame, frame_size = self.decoder.decode(self._view[:self._end], self._start)
+            except ProtocolError:
+                self._resync()
+                continue
+
+            self._start += frame_size
+            if frame is None:
+                continue  # Delta frame whose keyframe we never saw
+            return frame
+
+        return None
+
+    def _resync(self):
+        """Skip to the next frame magic after a corrupt header."""
+        if not self._resyncing:
+            self.malformed_frames += 1
+            self._resyncing = True
+        index = self._buffer.find(MAGIC, self._start + 1, self._end)
+        if index == -1:
+            # Keep a possible partial magic at the end of the data
+            index = max(self._start + 1, self._end - len(MAGIC) + 1)
+        self._start = index
+
+    def _next_text_frame(self):
+        while self._start < self._end:
+            # Legacy clients send the fist token without a newline, so it can be
+            # glued to the front of a coordinate message
+            if self._buffer.startswith(FIST_TOKEN_BYTES, self._start, self._end):
+                self._start += len(FIST_TOKEN_BYTES)
+                return decode_text_frame(FIST_TOKEN)
+            if FIST_TOKEN_BYTES.startswith(self._view[self._start:self._end]):
+                return None  # Partial fist token, wait for the rest
+
+            newline = self._buffer.find(b"\n", self._start, self._end)
+            if newline == -1:
+                return None
+
+            line = self._view[self._start:newline]
+            self._start = newline + 1
+            if not line:
+                continue
+
+            try:
+                return decode_text_frame(str(line, 'utf-8'))
+            except (ProtocolError, UnicodeDecodeError):
+                self.malformed_frames += 1
+
+        return None
@@ -1,14 +1,22 @@
 import time
-from PySide2.QtCore import QTimer
 from PySide2.QtWidgets import QLabel
 from PySide2 import QtCore
-import math
+import numpy as np
 from setup import setup_freecad_env
 setup_freecad_env()
 
 from commands import CommandProcessor
+from landmark_protocol import (
+    FINGERTIP_COUNT, FORMAT_BINARY, HAND_LEFT, PHASE_END, STAGE_DEQUEUE, STAGE_RECEIVE, STAGE_RENDER, STAGE_UPDATE,
+    DeltaDecoder, ProtocolError, decode_text_frame, detect_format
+)
+from landmark_filter import HandFilters, hand_keys
+from latency import LatencyRecorder, frame_stamps
+from pose_resampler import PoseResampler
+from session_recording import SessionRecorder, SessionReplayer
+from shm_transport import TRANSPORT_SHM, SharedFrameRing
+from tracking_server import TRANSPORT_BOTH, TrackingServer
 
-import socket
 import threading
 import FreeCAD
 import FreeCADGui
@@ -16,8 +24,12 @@ import Part
 
 
 class ServerConnect(QtCore.QObject):
-    update_signal = QtCore.Signal(int, float, float)
-    snap_signal = QtCore.Signal()
+    update_signal = QtCore.Signal(int, int, object)
+    snap_signal = QtCore.Signal(int, object)
+    frames_ready_signal = QtCore.Signal()
+    client_signal = QtCore.Signal(int, bool)
+    gesture_signal = QtCore.Signal(int, object)
+    status_signal = QtCore.Signal(int, object)
 
     def __init__(self, process_data_callback, doc):
         super().__init__()
@@ -29,6 +41,7 @@ class ServerConnect(QtCore.QObject):
 
         self.finger_lines = {}
         self.finger_spheres = {}  # Dictionary to store sphere objects
+        self.marker_sets = set()  # (client_id, hand) pairs that have lines and spheres, hand from hand_keys()
         self.main_window = FreeCADGui.getMainWindow()
 
         # Camera resolution
@@ -52,8 +65,58 @@ class ServerConnect(QtCore.QObject):
 
         # Rate limiting parameters
         self.last_update_time = time.time()
-        self.update_interval = 0.05  # 50ms between updates (20 fps)
-        self.pending_updates = {}  # Store the most recent updates
+        self.update_interval = 1 / 60  # Markers move at display rate, between and ahead of the camera samples
+
+        # Fingertip positions (5, 2) per (client_id, hand), resampled from capture time to display
+        # time: extrapolated up to max_prediction seconds to make up for the pipeline latency
+        # (0 only interpolates) and eased from one sample to the next
+        self.max_prediction = 0.15
+        self.resamplers = {}  # (client_id, hand) -> PoseResampler, keyed like the filters so hand swaps do not mix them
+
+        # Fingertips are One Euro filtered per client and hand, so a still hand stays still.
+        # Markers that would move less than min_marker_move FreeCAD units are not
+        # updated at all, which saves the shape rebuilds and the recompute.
+        self.filter_min_cutoff = 1.0  # Hz
+        self.filter_beta = 0.01  # Per pixel/s
+        self.landmark_filters = {}  # client_id -> HandFilters
+        # Clients report the MediaPipe settings their governor picked; lighter ones are smoothed harder
+        self.operating_points = {}  # client_id -> OperatingPoint
+        self.min_marker_move = 0.2
+        self.marker_positions = {}  # Positions last shown per (client_id, hand), absent when at the origin
+        self.skipped_updates = 0
+
+        # Newest frame per client waiting for the Qt thread. If the GUI falls behind, older
+        # frames are replaced instead of queued, so the markers always show the latest pose.
+        self.latest_frames = {}
+        self.latest_frames_lock = threading.Lock()
+        self.superseded_frames = 0
+
+        # Time from camera capture to the view, per pipeline stage, shown in a label and
+        # written to freecad_latency.json every few seconds
+        self.latency = LatencyRecorder(dump_path="freecad_latency.json", dump_interval=5.0)
+        self.latency_stamps = {}  # Stage times of the newest frame per client whose marker update is pending
+        self.latency_label_time = 0.0
+
+        # Keyframes for binary messages passed to process_server_data
+        self.frame_decoder = DeltaDecoder()
+
+        # One event loop serves every tracking client over TCP and UDP. With TRANSPORT_SHM
+        # a client on the same machine writes into a shared memory ring instead, polled by
+        # the update timer, which is slower than the sockets (see shm_transport.py). Read by
+        # run_server_in_thread(), so it can be changed until then.
+        self.transport = TRANSPORT_BOTH
+        self.shared_ring = None
+        self.shared_ring_checked = 0.0
+        self.shared_ring_last_frame = 0.0
+        self.tracking_server = None
+        self.server_thread = None
+
+        # Gestures recognized by the clients, newest event per (client_id, hand) until it ends
+        self.active_gestures = {}
+
+        # Set to a file name to record every received frame for replay_session()
+        self.recording_path = None
+        self.recorder = None
 
         if not self.main_window:
             print("Error: Could not get FreeCAD main window.")
@@ -64,6 +127,10 @@ class ServerConnect(QtCore.QObject):
         # Connect signals
         self.update_signal.connect(self._create_line)
         self.snap_signal.connect(self._snap_lines_to_origin)
+        self.frames_ready_signal.connect(self._process_latest_frames)
+        self.client_signal.connect(self._on_client_connection)
+        self.gesture_signal.connect(self._on_gestures)
+        self.status_signal.connect(self._on_status)
 
         # Create initial objects
         self._create_initial_objects()
@@ -76,43 +143,107 @@ class ServerConnect(QtCore.QObject):
     def _process_pending_updates(self):
         """Process any pending updates at the specified interval."""
         try:
-            if not self.pending_updates:
-                return
+            if self.transport == TRANSPORT_SHM:
+                self._poll_shared_ring()
 
-            # Process all pending updates
-            for finger_id, (x, y) in self.pending_updates.items():
-                self._update_objects(finger_id, x, y)
+            if not self.resamplers:
+                return
 
-            # Clear pending updates
-            self.pending_updates.clear()
+            # Where every hand is now, by the latest samples
+            now = time.monotonic()
+            moved = False
+            for (client_id, hand), resampler in self.resamplers.items():
+                positions = resampler.sample(now)
+                last = self.marker_positions.get((client_id, hand))
+                if last is not None and np.abs(positions - last).max() < self.min_marker_move:
+                    self.skipped_updates += 1
+                    continue
+                self.marker_positions[(client_id, hand)] = positions
+                self._update_objects(client_id, hand, positions)
+                moved = True
+            if not moved:
+                # The view already shows these frames' poses
+                self.latency_stamps.clear()
+                return
+            update_time = time.monotonic()
 
             # Update the view
             FreeCAD.ActiveDocument.recompute()
+            self._record_latency(update_time, time.monotonic())
 
         except Exception as e:
             print(f"Error processing pending updates: {e}")
             import traceback
             traceback.print_exc()
 
-    def _update_objects(self, finger_id, x, y):
-        """Update line and sphere positions."""
+    def _record_latency(self, update_time, render_time):
+        """Stamp the frames that were just shown and refresh the latency label and dump."""
+        for stamps in self.latency_stamps.values():
+            stamps[STAGE_UPDATE] = update_time
+            # The scene graph is up to date here, Qt paints it on its next pass
+            stamps[STAGE_RENDER] = render_time
+            self.latency.record(stamps)
+        self.latency_stamps.clear()
+
+        if render_time - self.latency_label_time >= 1.0:
+            self.latency_label_time = render_time
+            lines = self.latency.overlay_lines()
+            errors = [(resampler.prediction_error, resampler.hold_error) for resampler in self.resamplers.values()
+                      if resampler.prediction_error is not None]
+            if errors:
+                prediction_error, hold_error = np.mean(errors, axis=0).tolist()
+                lines.append(f"prediction error {prediction_error:.1f} (unpredicted {hold_error:.1f})")
+            self.latency_label.setText("Latency p50 / p95 / p99\n" + "\n".join(lines))
+        self.latency.maybe_dump(render_time, superseded_frames=self.superseded_frames,
+                                skipped_updates=self.skipped_updates,
+                                prediction={f"{client_id}/{hand}": resampler.stats()
+                                            for (client_id, hand), resampler in self.resamplers.items()})
+
+    def _poll_shared_ring(self):
+        """Process the newest frame in the shared memory ring, attaching to it when needed."""
+        now = time.monotonic()
+        if self.shared_ring is None:
+            if now - self.shared_ring_checked < 1.0:
+                return
+            self.shared_ring_checked = now
+            try:
+                self.shared_ring = SharedFrameRing()
+            except (FileNotFoundError, ValueError):
+                return
+            self.shared_ring_last_frame = now
+            print("Attached to the shared memory landmark ring")
+
+        frame = self.shared_ring.read_latest()
+        if frame is None:
+            if now - self.shared_ring_last_frame > 2.0:
+                # The client may have restarted with a new ring, attach again
+                self.shared_ring.close()
+                self.shared_ring = None
+            return
+
+        self.shared_ring_last_frame = now
+        frame.stamps[STAGE_RECEIVE] = frame.stamps[STAGE_DEQUEUE] = now
+        if self.recorder is not None:
+            self.recorder.record(frame, 0)
+        self.process_frame(frame)
+
+    def _update_objects(self, client_id, hand, positions):
+        """Update line and sphere positions of one hand from its (5, 2) FreeCAD coordinates."""
         try:
-            # Transform coordinates
-            x_freecad, y_freecad = self._transform_coordinates(x, y)
-            endpoint = FreeCAD.Vector(x_freecad, y_freecad, 0)
+            for finger_id, (x_freecad, y_freecad) in enumerate(positions.tolist()):
+                endpoint = FreeCAD.Vector(x_freecad, y_freecad, 0)
 
-            line_name = f"FingerLine_{finger_id}"
-            sphere_name = f"FingerSphere_{finger_id}"
+                line_name, sphere_name = self._marker_names(client_id, finger_id, hand)
 
-            # Update line
-            if line_name in self.finger_lines:
-                line = Part.makeLine(FreeCAD.Vector(0, 0, 0), endpoint)
-                self.finger_lines[line_name].Shape = line
+                # Update line
+                if line_name in self.finger_lines:
+                    line = Part.makeLine(FreeCAD.Vector(0, 0, 0), endpoint)
+                    self.finger_lines[line_name].Shape = line
 
-            # Update sphere
-            if sphere_name in self.finger_spheres:
-                sphere = Part.makeSphere(self.sphere_radius, endpoint)
-                self.finger_spheres[sphere_name].Shape = sphere
+                # Update sphere
+                if sphere_name in self.finger_spheres:
+                    sphere = Part.makeSphere(self.sphere_radius, endpoint)
+                    self.finger_spheres[sphere_name].Shape = sphere
 
         except Exception as e:
             print(f"Error updating objects: {e}")
@@ -150,8 +281,21 @@ class ServerConnect(QtCore.QObject):
         except Exception as e:
             print(f"Error creating working area: {e}")
 
+    def _marker_names(self, client_id, finger_id, hand=0):
+        """Object names of the line and sphere showing one finger of one hand of one client."""
+        if hand:
+            return f"FingerLine_{client_id}_h{hand}_{finger_id}", f"FingerSphere_{client_id}_h{hand}_{finger_id}"
+        if client_id == 0:
+            # The first hand of the first client keeps the original object names
+            return f"FingerLine_{finger_id}", f"FingerSphere_{finger_id}"
+        return f"FingerLine_{client_id}_{finger_id}", f"FingerSphere_{client_id}_{finger_id}"
+
     def _create_initial_objects(self):
         """Create initial lines and spheres at origin."""
+        self._create_marker_set(0)
+
+    def _create_marker_set(self, client_id, hand=0):
+        """Create the lines and spheres for one hand of one client at origin."""
         try:
             # Create a tiny line at origin
             origin_line = Part.makeLine(
@@ -162,9 +306,13 @@ class ServerConnect(QtCore.QObject):
             # Create a normal-sized sphere at origin
             sphere = Part.makeSphere(self.sphere_radius, FreeCAD.Vector(0, 0, 0))
 
+            self.marker_sets.add((client_id, hand))
             for finger_id in range(5):
+                line_name, sphere_name = self._marker_names(client_id, finger_id, hand)
+                if line_name in self.finger_lines:
+                    continue
+
                 # Create line
-                line_name = f"FingerLine_{finger_id}"
                 line_obj = FreeCAD.ActiveDocument.addObject("Part::Feature", line_name)
                 line_obj.Shape = origin_line
                 line_obj.ViewObject.LineColor = self.finger_colors[finger_id]
@@ -172,7 +320,6 @@ class ServerConnect(QtCore.QObject):
                 self.finger_lines[line_name] = line_obj
 
                 # Create sphere
-                sphere_name = f"FingerSphere_{finger_id}"
                 sphere_obj = FreeCAD.ActiveDocument.addObject("Part::Feature", sphere_name)
                 sphere_obj.Shape = sphere
                 sphere_obj.ViewObject.ShapeColor = self.finger_colors[finger_id]
@@ -185,8 +332,32 @@ class ServerConnect(QtCore.QObject):
             import traceback
             traceback.print_exc()
 
+    def _remove_marker_set(self, client_id):
+        """Remove the lines and spheres of every hand of a client that disconnected."""
+        try:
+            for hand in self._client_hands(client_id):
+                self.marker_sets.discard((client_id, hand))
+                self.resamplers.pop((client_id, hand), None)
+                self.marker_positions.pop((client_id, hand), None)
+
+                for finger_id in range(5):
+                    line_name, sphere_name = self._marker_names(client_id, finger_id, hand)
+                    if line_name in self.finger_lines:
+                        FreeCAD.ActiveDocument.removeObject(self.finger_lines.pop(line_name).Name)
+                    if sphere_name in self.finger_spheres:
+                        FreeCAD.ActiveDocument.removeObject(self.finger_spheres.pop(sphere_name).Name)
+
+            FreeCAD.ActiveDocument.recompute()
+
+        except Exception as e:
+            print(f"Error removing objects: {e}")
+
+    def _client_hands(self, client_id):
+        """Hands of a client that currently have a marker set."""
+        return sorted(hand for client, hand in self.marker_sets if client == client_id)
+
     def _transform_coordinates(self, x, y):
-        """Transform webcam coordinates to FreeCAD coordinates."""
+        """Transform webcam coordinates (scalars or arrays) to FreeCAD coordinates."""
         # Normalize coordinates to [-1, 1] range
         x_norm = (x / self.cam_width) * 2 - 1
         y_norm = -((y / self.cam_height) * 2 - 1)  # Flip Y axis
@@ -197,13 +368,26 @@ class ServerConnect(QtCore.QObject):
 
         return x_freecad, y_freecad
 
-    def _create_line(self, finger_id, x, y):
-        """Queue update for processing."""
-        self.pending_updates[finger_id] = (x, y)
+    def _create_line(self, client_id, hand, sample):
+        """Queue update for processing: sample is the hand's (positions, capture time)."""
+        if (client_id, hand) not in self.marker_sets:
+            self._create_marker_set(client_id, hand)
+        resampler = self.resamplers.get((client_id, hand))
+        if resampler is None:
+            resampler = self.resamplers[(client_id, hand)] = PoseResampler(self.max_prediction)
+        resampler.add(*sample)
 
-    def _snap_lines_to_origin(self):
+    def _snap_lines_to_origin(self, client_id=0, hands=None):
         """Safely snap all lines and spheres to origin in the main thread."""
         try:
+            hands = self._client_hands(client_id) if hands is None else hands
+            for hand in hands:
+                self.resamplers.pop((client_id, hand), None)
+            # Markers already at the origin are left alone, so a fist or an empty view costs nothing
+            hands = [hand for hand in hands if self.marker_positions.pop((client_id, hand), None) is not None]
+            if not hands:
+                return
+
             # Create a very short line at origin
             origin_line = Part.makeLine(
                 FreeCAD.Vector(0, 0, 0),
@@ -214,15 +398,15 @@ class ServerConnect(QtCore.QObject):
             origin_sphere = Part.makeSphere(self.sphere_radius, FreeCAD.Vector(0, 0, 0))
 
             # Update each line and sphere
-            for finger_id in range(5):
-                line_name = f"FingerLine_{finger_id}"
-                sphere_name = f"FingerSphere_{finger_id}"
+            for hand in hands:
+                for finger_id in range(5):
+                    line_name, sphere_name = self._marker_names(client_id, finger_id, hand)
 
-                if line_name in self.finger_lines:
-                    self.finger_lines[line_name].Shape = origin_line
+                    if line_name in self.finger_lines:
+                        self.finger_lines[line_name].Shape = origin_line
 
-                if sphere_name in self.finger_spheres:
-                    self.finger_spheres[sphere_name].Shape = origin_sphere
+                    if sphere_name in self.finger_spheres:
+                        self.finger_spheres[sphere_name].Shape = origin_sphere
 
             FreeCAD.ActiveDocument.recompute()
             print("Objects reset to origin")
@@ -233,33 +417,167 @@ class ServerConnect(QtCore.QObject):
             traceback.print_exc()
 
     def process_server_data(self, data):
-        """Process the data received from the server."""
+        """Process one message: legacy text, or a binary full/delta frame as bytes."""
+        try:
+            if isinstance(data, str):
+                frame = decode_text_frame(data)
+            elif detect_format(data) == FORMAT_BINARY:
+                frame, _ = self.frame_decoder.decode(data)
+                if frame is None:
+                    return  # Delta frame whose keyframe has not arrived yet
+            else:
+                frame = decode_text_frame(bytes(data).decode('utf-8'))
+        except (ProtocolError, UnicodeDecodeError) as e:
+            print(f"Error processing data: {e}")
+            return
+
+        self.process_frame(frame)
+
+    def _receive_frame(self, client_id, frame):
+        """Frame from a tracking client: record it if recording, then pass it to the Qt thread."""
+        if self.recorder is not None:
+            self.recorder.record(frame, client_id)
+        self._post_frame(client_id, frame)
+
+    def _post_frame(self, client_id, frame):
+        """Hand a frame from the tracking server thread to the Qt thread."""
+        with self.latest_frames_lock:
+            wake_up = not self.latest_frames
+            if client_id in self.latest_frames:
+                self.superseded_frames += 1
+            self.latest_frames[client_id] = frame
+
+        # Only signal once per batch; the slot takes whatever is newest when it runs
+        if wake_up:
+            self.frames_ready_signal.emit()
+
+    def _process_latest_frames(self):
+        """Process the newest frame of every client (Qt thread)."""
+        with self.latest_frames_lock:
+            frames, self.latest_frames = self.latest_frames, {}
+
+        now = time.monotonic()
+        for client_id, frame in frames.items():
+            frame.stamps[STAGE_DEQUEUE] = now
+            self.process_frame(frame, client_id)
+
+    def _on_client_connection(self, client_id, connected):
+        """Give every connected client its own marker set."""
+        if not connected:
+            with self.latest_frames_lock:
+                self.latest_frames.pop(client_id, None)
+            self.landmark_filters.pop(client_id, None)
+            self.operating_points.pop(client_id, None)
+            self._end_gestures(client_id)
+
+        if connected:
+            self._create_marker_set(client_id)
+        elif client_id == 0:
+            # The first marker set stays in the document, just park it at the origin
+            self._snap_lines_to_origin(0)
+        else:
+            self._remove_marker_set(client_id)
+
+    def _on_gestures(self, client_id, events):
+        """Gesture begin/update/end events of a client (Qt thread).
+
+        An update for a gesture we never saw begin (its begin was lost, e.g.
+        to a reconnect) simply starts it.
+        """
+        for event in events:
+            if event.phase == PHASE_END:
+                self.active_gestures.pop((client_id, event.hand), None)
+            else:
+                self.active_gestures[(client_id, event.hand)] = event
+        self._update_gesture_label()
+
+    def _on_status(self, client_id, point):
+        """A client switched MediaPipe settings (Qt thread): refilter its hands to match."""
+        self.operating_points[client_id] = point
+        self.landmark_filters[client_id] = HandFilters(*self._filter_parameters(point))
+        print(f"Client {client_id} runs {point}")
+
+    def _filter_parameters(self, point):
+        """One Euro min_cutoff and beta for a client's operating point (None when it reported none)."""
+        min_cutoff = self.filter_min_cutoff
+        if point is not None:
+            # A smaller input and the lite model jitter more, in frame pixels: lower the cutoff
+            min_cutoff *= point.scale * (0.7 if point.model_complexity == 0 else 1.0)
+        return min_cutoff, self.filter_beta
+
+    def _end_gestures(self, client_id):
+        for key in [key for key in self.active_gestures if key[0] == client_id]:
+            del self.active_gestures[key]
+        self._update_gesture_label()
+
+    def _update_gesture_label(self):
+        if not hasattr(self, "gesture_label"):
+            return
+        if not self.active_gestures:
+            self.gesture_label.setText("No gesture detected")
+            return
+        parts = []
+        for (client_id, hand), event in sorted(self.active_gestures.items()):
+            side = "left" if hand == HAND_LEFT else "right"
+            part = f"{event.name.capitalize()} ({side}"
+            part += f", client {client_id})" if client_id else ")"
+            parts.append(part)
+        self.gesture_label.setText(", ".join(parts))
+
+    def process_frame(self, frame, client_id=0):
+        """Process a decoded landmark frame (binary or text)."""
         if not FreeCAD.ActiveDocument:
             print("No active document!")
             return
 
         try:
-            finger_data_list = data.split(";")
-
-            # If we don't see exactly 5 fingers, snap all lines to origin
-            if len(finger_data_list) != 5:
-                self.snap_signal.emit()
+            # Fingertips of every hand, (hands, 5, 2) pixels, whether 5 or 21 landmarks were sent
+            tips = frame.fingertips[:, :, :2]
+            filters = self.landmark_filters.get(client_id)
+            if filters is None:
+                filters = self.landmark_filters[client_id] = HandFilters(
+                    *self._filter_parameters(self.operating_points.get(client_id))
+                )
+            # Text frames carry no capture time
+            timestamp = frame.timestamp or time.monotonic()
+            tips = filters(tips, timestamp, frame.handedness)
+
+            # A hand only drives its markers while all 5 fingertips are visible
+            visible = ~np.isnan(tips).any(axis=(1, 2))
+
+            # If no hand shows all 5 fingers (or we see a fist), snap all lines to origin
+            if frame.is_fist or not visible.any():
+                self.snap_signal.emit(client_id, None)
                 # Update labels for all fingers as not visible
-                for i in range(5):
-                    self._update_label(i, None, None)
+                if client_id == 0:
+                    for i in range(FINGERTIP_COUNT):
+                        self._update_label(i, None, None)
                 return
 
-            # Process finger positions
-            for finger_data in finger_data_list:
-                parts = finger_data.split(",")
-                if len(parts) != 3:
-                    continue
-
-                finger_id, x, y = map(float, parts)
-                # Update label
-                self._update_label(int(finger_id), x, y)
-                # Queue update
-                self.update_signal.emit(int(finger_id), x, y)
+            # Transform every fingertip of every hand in one go
+            x_freecad, y_freecad = self._transform_coordinates(tips[..., 0], tips[..., 1])
+            positions = np.stack((x_freecad, y_freecad), axis=-1)
+
+            # Marker sets and resamplers follow hands by the filters' keys, not their order in the
+            # frame, which MediaPipe swaps: a swap would otherwise look like a jump to extrapolate
+            keys = hand_keys(len(tips), frame.handedness)
+            shown = {keys[index] for index in np.flatnonzero(visible).tolist()}
+            # Queue updates for visible hands, park the markers of hands that left
+            hidden = [hand for hand in self._client_hands(client_id) if hand not in shown]
+            if hidden:
+                self.snap_signal.emit(client_id, hidden)
+            for index in np.flatnonzero(visible).tolist():
+                self.update_signal.emit(client_id, keys[index], (positions[index], timestamp))
+            self.latency_stamps[client_id] = frame_stamps(frame)
+
+            # Labels only follow the first hand of the first client
+            if client_id == 0:
+                for finger_id in range(FINGERTIP_COUNT):
+                    if visible[0]:
+                        x, y = tips[0, finger_id].tolist()
+                        self._update_label(finger_id, x, y)
+                    else:
+                        self._update_label(finger_id, None, None)
 
         except Exception as e:
             print(f"Error processing data: {e}")
@@ -293,16 +611,17 @@ class ServerConnect(QtCore.QObject):
             self.finger_3_label = self._create_label("Finger 3: Waiting...", 10, 130)
             self.finger_4_label = self._create_label("Finger 4: Waiting...", 10, 170)
             self.gesture_label = self._create_gesture_label("No gesture detected", 10, 210)
+            self.latency_label = self._create_label("Latency: waiting...", 10, 260, height=170)
         except Exception as e:
             print(f"Error initializing labels: {e}")
 
-    def _create_label(self, text, x, y):
+    def _create_label(self, text, x, y, width=300, height=30):
         label = QLabel(self.main_window)
         label.setText(text)
         label.setStyleSheet(
             "QLabel { background-color: black; color: white; padding: 5px; border-radius: 5px; }"
         )
-        label.setGeometry(x, y, 300, 30)
+        label.setGeometry(x, y, width, height)
         label.show()
         return label
 
@@ -318,41 +637,59 @@ class ServerConnect(QtCore.QObject):
         return label
 
     def start_server(self):
-        """Start the server and listen for incoming connections."""
-        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        server.bind(('localhost', 12340))
-        server.listen(1)
-        print("FreeCAD server listening on port 12340...")
-
+        """Start the server and serve every tracking client from one event loop."""
         try:
-            while True:
-                client, address = server.accept()
-                print(f"Connection from {address} has been established.")
-
-                try:
-                    while True:
-                        data = client.recv(1024).decode('utf-8')
-                        if not data:
-                            print(f"Client {address} disconnected.")
-                            break
-
-                        self.process_server_data(data)
-                except (socket.error, ConnectionResetError) as e:
-                    print(f"Connection error with {address}: {e}")
-                finally:
-                    client.close()
-                    print(f"Connection with {address} has been closed.")
-
+            self.tracking_server.serve_forever()
         except KeyboardInterrupt:
             print("Server shutting down...")
-        finally:
-            server.close()
+
+    def replay_session(self, path, speed=1.0):
+        """Feed a recorded session through the same path as live frames, in a background thread.
+
+        speed 0 replays as fast as possible, to benchmark the FreeCAD update path.
+        """
+        replayer = SessionReplayer(path, speed)
+
+        def replay():
+            replayer.replay(self._post_frame)
+            print(f"Replay of {path} finished: {replayer.stats()}, superseded frames: {self.superseded_frames}")
+
+        threading.Thread(target=replay, daemon=True).start()
+        return replayer
 
     def run_server_in_thread(self):
         """Run the server in a background thread."""
-        server_thread = threading.Thread(
+        if self.recording_path:
+            self.recorder = SessionRecorder(self.recording_path)
+            print(f"Recording frames to {self.recording_path}")
+
+        if self.transport == TRANSPORT_SHM:
+            print("Reading frames from shared memory, socket server not started")
+            return
+
+        self.tracking_server = TrackingServer(self._receive_frame, self.client_signal.emit, transport=self.transport,
+                                              gesture_callback=self.gesture_signal.emit,
+                                              status_callback=self.status_signal.emit)
+        self.server_thread = threading.Thread(
             target=self.start_server,
             daemon=True
         )
-        server_thread.start()
-        print("Server thread started")
\ No newline at end of file
+        self.server_thread.start()
+        print("Server thread started")
+
+    def stop(self):
+        """Shut down: stop the server and the marker updates, then close the recording."""
+        if hasattr(self, "update_timer"):
+            self.update_timer.stop()
+        if self.tracking_server is not None:
+            self.tracking_server.stop()
+            # The server thread writes the recording, so it has to be done first
+            if self.server_thread is not None:
+                self.server_thread.join(timeout=2.0)
+        if self.shared_ring is not None:
+            self.shared_ring.close()
+            self.shared_ring = None
+        if self.recorder is not None:
+            self.recorder.close()
+            print(f"Recorded {self.recorder.frames} frames to {self.recording_path}")
+            self.recorder = None
\ No newline at end of file
@@ -0,0 +1,362 @@
+import numpy as np
+import pytest
+
+from landmark_protocol import (
+    DELTA_HEADER, FLAG_ACK, FLAG_FIST, FLAG_HAND_INFO, FLAG_TIMING, FORMAT_BINARY, FORMAT_TEXT, GESTURE_PINCH,
+    HAND_LANDMARK_COUNT, HAND_LEFT, HAND_RIGHT, HEADER_SIZE, KIND_ACK, KIND_DELTA, KIND_FRAME, KIND_HEARTBEAT,
+    MAGIC, PHASE_BEGIN, PHASE_END, STAGE_INFERENCE, STAGE_RECEIVE, STAGE_SEND, DeltaDecoder, DeltaEncoder,
+    GestureEvent, OperatingPoint, ProtocolError, decode_ack, decode_clock, decode_frame, decode_gestures,
+    decode_header, decode_status, decode_text_frame, detect_format, encode_ack, encode_clock, encode_frame,
+    encode_gestures, encode_heartbeat, encode_status, encode_text_frame, encode_text_hands
+)
+from stream_framing import FrameReader
+
+
+def make_landmarks(hands=2, seed=0):
+    return np.random.default_rng(seed).uniform(0, 720, (hands, HAND_LANDMARK_COUNT, 3)).astype(np.float32)
+
+
+def test_binary_round_trip():
+    landmarks = make_landmarks()
+    data = encode_frame(landmarks, 7, 12.5, FLAG_FIST, source_id=3)
+
+    frame, size = decode_frame(data)
+    assert size == len(data)
+    np.testing.assert_array_equal(frame.landmarks, landmarks)
+    assert (frame.sequence, frame.timestamp, frame.source_id) == (7, 12.5, 3)
+    assert frame.is_fist
+    assert frame.handedness is None and frame.scores is None
+
+
+def test_binary_round_trip_with_trailer():
+    landmarks = make_landmarks()
+    data = encode_frame(landmarks, 1, 2.0, handedness=[HAND_LEFT, HAND_RIGHT], scores=[0.9, 0.8],
+                        timings=(2.1, 2.2))
+
+    frame, _ = decode_frame(data)
+    assert frame.flags & FLAG_HAND_INFO and frame.flags & FLAG_TIMING
+    assert frame.handedness.tolist() == [HAND_LEFT, HAND_RIGHT]
+    np.testing.assert_allclose(frame.scores, [0.9, 0.8], rtol=1e-6)
+    assert (frame.stamps[STAGE_INFERENCE], frame.stamps[STAGE_SEND]) == (2.1, 2.2)
+
+
+def test_trailer_flags_follow_the_data():
+    # A caller cannot claim a trailer that is not there
+    frame, _ = decode_frame(encode_frame(make_landmarks(), 0, 0.0, FLAG_HAND_INFO | FLAG_TIMING))
+    assert not frame.flags & (FLAG_HAND_INFO | FLAG_TIMING)
+
+
+def test_nan_landmarks_survive():
+    landmarks = make_landmarks(1)
+    landmarks[0, 4] = np.nan
+    frame, _ = decode_frame(encode_frame(landmarks, 0, 0.0))
+    assert np.isnan(frame.landmarks[0, 4]).all()
+    assert not np.isnan(frame.landmarks[0, 5]).any()
+
+
+def test_decode_rejects_bad_header():
+    data = bytearray(encode_frame(make_landmarks(), 0, 0.0))
+    with pytest.raises(ProtocolError):
+        decode_header(b"XXXX" + bytes(data[4:]))
+    data[4] = 99  # Version
+    with pytest.raises(ProtocolError):
+        decode_header(data)
+
+
+def test_decode_rejects_truncated_frame():
+    data = encode_frame(make_landmarks(), 0, 0.0)
+    with pytest.raises(ProtocolError):
+        decode_frame(data[:-1])
+
+
+def test_control_messages():
+    assert decode_clock(encode_clock(1.5, 2.5, 3.5)) == (1.5, 2.5, 3.5)
+    assert decode_header(encode_heartbeat(4.0))[0] == KIND_HEARTBEAT
+    assert len(encode_heartbeat(4.0)) == HEADER_SIZE
+    assert decode_header(encode_ack(9, 2))[0] == KIND_ACK
+    assert decode_ack(encode_ack(9, 2)) == (9, 2)
+    with pytest.raises(ProtocolError):
+        decode_ack(encode_heartbeat(0.0))
+
+
+def test_gesture_round_trip():
+    events = [GestureEvent(GESTURE_PINCH, PHASE_BEGIN, HAND_LEFT, 10.0, 20.0, 0.5),
+              GestureEvent(GESTURE_PINCH, PHASE_END, HAND_RIGHT, 30.0, 40.0, 0.25)]
+    data = encode_gestures(events, 5, 6.0, source_id=1)
+
+    decoded, source_id, size = decode_gestures(data)
+    assert (source_id, size) == (1, len(data))
+    assert [(e.gesture, e.phase, e.hand, e.x, e.y, e.value, e.timestamp) for e in decoded] == [
+        (GESTURE_PINCH, PHASE_BEGIN, HAND_LEFT, 10.0, 20.0, 0.5, 6.0),
+        (GESTURE_PINCH, PHASE_END, HAND_RIGHT, 30.0, 40.0, 0.25, 6.0),
+    ]
+
+
+def test_status_round_trip():
+    data = encode_status(OperatingPoint(0, 0.5, 1, 2, 24.0), 1.0, source_id=4)
+    point, source_id, size = decode_status(data)
+    assert (source_id, size) == (4, len(data))
+    assert (point.model_complexity, point.scale, point.max_hands, point.level, point.inference_fps) == (
+        0, 0.5, 1, 2, 24.0)
+
+
+def test_text_round_trip():
+    landmarks = np.zeros((1, HAND_LANDMARK_COUNT, 3), dtype=np.float32)
+    landmarks[0, [4, 8, 12, 16, 20], :2] = [[10, 11], [20, 21], [30, 31], [40, 41], [50, 51]]
+    landmarks[0, 12] = np.nan
+
+    message = encode_text_frame(landmarks)
+    assert message == b"0,10,11;1,20,21;3,40,41;4,50,51\n"
+    frame = decode_text_frame(message.decode())
+    assert frame.landmarks.shape == (1, 5, 2)
+    assert np.isnan(frame.landmarks[0, 2]).all()
+    np.testing.assert_array_equal(frame.landmarks[0, [0, 1, 3, 4]], [[10, 11], [20, 21], [40, 41], [50, 51]])
+
+
+def test_text_fist_token():
+    assert encode_text_frame(make_landmarks(), fist=True) == b"fist_detected"
+    assert encode_text_frame(np.empty((0, HAND_LANDMARK_COUNT, 3))) == b""
+    frame = decode_text_frame("fist_detected")
+    assert frame.is_fist and frame.hand_count == 0
+
+
+@pytest.mark.parametrize("message", ["0,1", "7,1,2", "a,b,c"])
+def test_text_rejects_malformed(message):
+    with pytest.raises((ProtocolError, ValueError)):
+        decode_text_frame(message)
+
+
+def test_detect_format():
+    assert detect_format(encode_heartbeat(0.0)) == FORMAT_BINARY
+    assert detect_format(MAGIC[:2]) == FORMAT_BINARY
+    assert detect_format(b"0,1,2\n") == FORMAT_TEXT
+    assert detect_format(b"fist_detected") == FORMAT_TEXT
+
+
+def binary_stream(count=10):
+    return [encode_frame(make_landmarks(seed=sequence), sequence, float(sequence)) for sequence in range(count)]
+
+
+def read_all(reader, data, chunk_size):
+    frames = []
+    for start in range(0, len(data), chunk_size):
+        reader.feed(data[start:start + chunk_size])
+        frames.extend(reader.read_frames())
+    return frames
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 100, 100000])
+def test_reader_reassembles_chunks(chunk_size):
+    messages = binary_stream()
+    reader = FrameReader()
+
+    frames = read_all(reader, b"".join(messages), chunk_size)
+    assert [frame.sequence for frame in frames] == list(range(10))
+    np.testing.assert_array_equal(frames[3].landmarks, make_landmarks(seed=3))
+    assert all(STAGE_RECEIVE in frame.stamps for frame in frames)
+    assert reader.malformed_frames == 0
+
+
+def test_reader_waits_for_truncated_frame():
+    data = binary_stream(1)[0]
+    reader = FrameReader()
+    reader.feed(data[:-5])
+    assert list(reader.read_frames()) == []
+    reader.feed(data[-5:])
+    assert [frame.sequence for frame in reader.read_frames()] == [0]
+
+
+def test_reader_resyncs_after_garbage():
+    messages = binary_stream(4)
+    reader = FrameReader()
+
+    data = messages[0] + messages[1][:10] + b"garbage" + messages[2] + messages[3]
+    frames = read_all(reader, data, 7)
+    assert [frame.sequence for frame in frames] == [0, 2, 3]
+    assert reader.malformed_frames == 1
+
+
+def test_reader_resyncs_after_corrupt_magic():
+    messages = binary_stream(3)
+    reader = FrameReader()
+
+    frames = read_all(reader, messages[0] + b"HTLX" + messages[1][4:] + messages[2], 7)
+    assert [frame.sequence for frame in frames] == [0, 2]
+    assert reader.malformed_frames == 1
+
+
+def test_reader_drops_oversized_frame():
+    reader = FrameReader(buffer_size=256)
+    frames = read_all(reader, binary_stream(1)[0] + encode_heartbeat(0.0), 64)
+    assert frames == []
+    assert reader.malformed_frames >= 1
+
+
+def test_reader_collects_control_messages():
+    events = [GestureEvent(GESTURE_PINCH, PHASE_BEGIN, HAND_LEFT, 1.0, 2.0)]
+    point = OperatingPoint(1, 1.0, 2, 0, 30.0)
+    data = b"".join((
+        encode_clock(1.0), encode_heartbeat(2.0), encode_gestures(events, 0, 3.0, source_id=2),
+        encode_status(point, 4.0, source_id=2), binary_stream(1)[0],
+    ))
+    reader = FrameReader()
+
+    frames = read_all(reader, data, 7)
+    assert [frame.sequence for frame in frames] == [0]
+    assert [client_time for client_time, _ in reader.clock_requests] == [1.0]
+    assert reader.heartbeats == 1
+    source_id, received = reader.gestures.popleft()
+    assert source_id == 2 and received[0].gesture == GESTURE_PINCH
+    assert reader.statuses.popleft()[1].inference_fps == 30.0
+    assert reader.stats()["gesture_events"] == 1 and reader.stats()["status_messages"] == 1
+
+
+def test_reader_text_stream():
+    reader = FrameReader()
+    data = b"0,1,2;1,3,4\n" + b"fist_detected" + b"0,5,6\n" + b"bad line\n" + b"2,7,8\n"
+
+    frames = read_all(reader, data, 3)
+    assert reader.wire_format == FORMAT_TEXT
+    assert [frame.is_fist for frame in frames] == [False, True, False, False]
+    np.testing.assert_array_equal(frames[3].landmarks[0, 2], [7, 8])
+    assert reader.malformed_frames == 1
+
+
+def test_encode_text_hands():
+    landmarks = np.zeros((2, HAND_LANDMARK_COUNT, 3), dtype=np.float32)
+    assert encode_text_hands(landmarks, [False, True]) == b"0,0,0;1,0,0;2,0,0;3,0,0;4,0,0\nfist_detected"
+
+
+def moving_stream(count, speed, seed=0):
+    rng = np.random.default_rng(seed)
+    landmarks = make_landmarks(seed=seed)
+    for _ in range(count):
+        landmarks = landmarks + rng.normal(0, speed, landmarks.shape).astype(np.float32)
+        yield landmarks
+
+
+def test_delta_error_within_quantization():
+    encoder = DeltaEncoder(keyframe_interval=30, threshold=0.5, step=1 / 16)
+    decoder = DeltaDecoder()
+
+    for sequence, landmarks in enumerate(moving_stream(200, 2.0)):
+        data = encoder.encode(landmarks, sequence, 0.0)
+        frame, size = decoder.decode(data)
+        assert size == len(data)
+        error = np.abs(frame.landmarks - landmarks)
+        # Unsent landmarks moved less than the threshold, sent ones are off by at most half a step
+        assert error.max() < encoder.threshold
+        if encoder.last_kind == KIND_DELTA:
+            moved = (np.abs(landmarks - encoder.keyframe) >= encoder.threshold).any(axis=-1)
+            assert error[moved].max(initial=0) <= encoder.step / 2 + 1e-3
+    assert encoder.deltas > encoder.keyframes > 1
+
+
+def test_delta_keyframe_interval():
+    encoder = DeltaEncoder(keyframe_interval=5)
+    kinds = [decode_header(encoder.encode(landmarks, sequence, 0.0))[0]
+             for sequence, landmarks in enumerate(moving_stream(12, 1.0))]
+    assert kinds == [KIND_FRAME, KIND_DELTA, KIND_DELTA, KIND_DELTA, KIND_DELTA] * 2 + [KIND_FRAME, KIND_DELTA]
+
+
+def test_delta_small_moves_are_not_sent():
+    encoder = DeltaEncoder(threshold=0.5)
+    landmarks = make_landmarks()
+    encoder.encode(landmarks, 0, 0.0)
+
+    data = encoder.encode(landmarks + 0.1, 1, 0.0)
+    assert encoder.last_kind == KIND_DELTA
+    assert len(data) == HEADER_SIZE + DELTA_HEADER.size
+
+
+def test_delta_nan_joints():
+    encoder = DeltaEncoder()
+    decoder = DeltaDecoder()
+    landmarks = make_landmarks()
+    landmarks[1, 8] = np.nan
+    decoder.decode(encoder.encode(landmarks, 0, 0.0))
+
+    moved = landmarks + 3.0
+    frame, _ = decoder.decode(encoder.encode(moved, 1, 0.0))
+    assert encoder.last_kind == KIND_DELTA
+    assert np.isnan(frame.landmarks[1, 8]).all()
+    np.testing.assert_allclose(frame.landmarks[0], moved[0], atol=encoder.step / 2)
+
+    # A joint that appears or disappears needs a keyframe
+    moved[1, 8] = 5.0
+    frame, _ = decoder.decode(encoder.encode(moved, 2, 0.0))
+    assert encoder.last_kind == KIND_FRAME
+    np.testing.assert_array_equal(frame.landmarks, moved)
+
+
+def test_delta_overflow_falls_back_to_keyframe():
+    encoder = DeltaEncoder(step=1 / 16)
+    decoder = DeltaDecoder()
+    landmarks = make_landmarks()
+    decoder.decode(encoder.encode(landmarks, 0, 0.0))
+
+    # 32768 steps of 1/16 px is 2048 px
+    jumped = landmarks + 3000.0
+    frame, _ = decoder.decode(encoder.encode(jumped, 1, 0.0))
+    assert encoder.last_kind == KIND_FRAME
+    np.testing.assert_array_equal(frame.landmarks, jumped)
+
+
+def test_delta_shape_change_is_keyframe():
+    encoder = DeltaEncoder()
+    encoder.encode(make_landmarks(2), 0, 0.0)
+    encoder.encode(make_landmarks(1), 1, 0.0)
+    assert encoder.last_kind == KIND_FRAME
+
+
+def test_delta_without_keyframe_is_counted():
+    encoder = DeltaEncoder()
+    decoder = DeltaDecoder()
+    stream = list(moving_stream(4, 1.0))
+    keyframe = encoder.encode(stream[0], 0, 0.0)  # Lost
+    deltas = [encoder.encode(landmarks, sequence, 0.0) for sequence, landmarks in enumerate(stream[1:], 1)]
+
+    for data in deltas:
+        frame, size = decoder.decode(data)
+        assert frame is None and size == len(data)
+    assert decoder.missing_keyframe == 3
+
+    # A keyframe from an older stream does not make its deltas decodable either
+    decoder.decode(encode_frame(stream[0], 99, 0.0))
+    assert decoder.decode(deltas[0])[0] is None
+    assert decoder.missing_keyframe == 4
+
+    decoder.decode(keyframe)
+    frame, _ = decoder.decode(deltas[-1])
+    np.testing.assert_allclose(frame.landmarks, stream[-1], atol=encoder.threshold)
+
+
+def test_reader_skips_delta_without_keyframe():
+    encoder = DeltaEncoder()
+    stream = list(moving_stream(3, 1.0))
+    messages = [encoder.encode(landmarks, sequence, 0.0) for sequence, landmarks in enumerate(stream)]
+    reader = FrameReader()
+
+    frames = read_all(reader, b"".join(messages[1:]), 7)
+    assert frames == []
+    assert reader.stats()["missing_keyframe"] == 2
+    assert reader.malformed_frames == 0
+
+
+def test_acknowledged_deltas_wait_for_ack():
+    encoder = DeltaEncoder(acknowledged=True)
+    stream = list(moving_stream(4, 1.0))
+
+    first = encoder.encode(stream[0], 0, 0.0)
+    assert decode_header(first)[1] & FLAG_ACK
+    encoder.encode(stream[1], 1, 0.0)
+    assert encoder.last_kind == KIND_FRAME  # Still no acknowledgement
+
+    encoder.acknowledge(0)  # For a keyframe that was superseded
+    encoder.encode(stream[2], 2, 0.0)
+    assert encoder.last_kind == KIND_FRAME
+
+    encoder.acknowledge(2)
+    data = encoder.encode(stream[3], 3, 0.0)
+    assert encoder.last_kind == KIND_DELTA
+    assert DELTA_HEADER.unpack_from(data, HEADER_SIZE)[0] == 2
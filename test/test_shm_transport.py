@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from landmark_protocol import HAND_LANDMARK_COUNT, HAND_LEFT, HAND_RIGHT
+from shm_transport import SharedFrameRing
+
+RING_NAME = "freecad_hand_tracking_test"
+
+
+def make_landmarks(value, hands=2):
+    return np.full((hands, HAND_LANDMARK_COUNT, 3), value, dtype=np.float32)
+
+
+@pytest.fixture
+def rings():
+    writer = SharedFrameRing(name=RING_NAME, create=True, capacity=4)
+    reader = SharedFrameRing(name=RING_NAME)
+    yield writer, reader
+    reader.close()
+    writer.close()
+
+
+def test_read_latest(rings):
+    writer, reader = rings
+    assert reader.read_latest() is None
+
+    writer.write(make_landmarks(1.0), 0, 1.0)
+    writer.write(make_landmarks(2.0), 1, 2.0, handedness=[HAND_LEFT, HAND_RIGHT], timings=(2.1, 2.2))
+    frame = reader.read_latest()
+    assert (frame.sequence, frame.timestamp) == (1, 2.0)
+    np.testing.assert_array_equal(frame.landmarks, make_landmarks(2.0))
+    assert frame.handedness.tolist() == [HAND_LEFT, HAND_RIGHT]
+    assert reader.read_latest() is None
+
+
+def test_frame_is_a_copy(rings):
+    writer, reader = rings
+    writer.write(make_landmarks(1.0), 0, 1.0)
+    frame = reader.read_latest()
+
+    # The writer laps the ring while the frame is still in use
+    for sequence in range(1, 2 * writer.capacity):
+        writer.write(make_landmarks(float(sequence)), sequence, float(sequence))
+    np.testing.assert_array_equal(frame.landmarks, make_landmarks(1.0))
+
+
+class LappingSlots:
+    """Slots that let the writer reuse the newest slot while the reader copies it."""
+
+    def __init__(self, slots, writer):
+        self.slots = slots
+        self.writer = writer
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            copy = self.slots[index].copy()
+            for _ in range(self.writer.capacity):
+                self.writer.write(make_landmarks(9.0), 100, 100.0)
+            return copy
+        return self.slots[index]
+
+
+def test_torn_read_is_dropped(rings):
+    writer, reader = rings
+    writer.write(make_landmarks(1.0), 0, 1.0)
+    reader.slots = LappingSlots(reader.slots, writer)
+
+    assert reader.read_latest() is None
+    assert reader.torn_reads == 1
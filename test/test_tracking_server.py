@@ -0,0 +1,123 @@
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from landmark_protocol import (
+    CLOCK_MESSAGE_SIZE, HAND_LANDMARK_COUNT, DeltaEncoder, decode_ack, decode_clock, encode_clock
+)
+from tracking_server import TRANSPORT_UDP, SequenceTracker, TrackingServer
+
+
+def make_landmarks(offset=0.0):
+    return np.full((1, HAND_LANDMARK_COUNT, 3), 100.0 + offset, dtype=np.float32)
+
+
+@pytest.fixture
+def udp_server():
+    """A TrackingServer with only its UDP socket open, read by calling _read_datagrams()."""
+    frames = []
+    server = TrackingServer(lambda client_id, frame: frames.append(frame), transport=TRANSPORT_UDP)
+    server.udp_server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.udp_server.bind(("localhost", 0))
+    server.udp_server.setblocking(False)
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client.connect(server.udp_server.getsockname())
+    client.settimeout(1.0)
+    yield server, client, frames
+    client.close()
+    server.udp_server.close()
+
+
+def clock_replies(data):
+    offsets = range(0, len(data) - CLOCK_MESSAGE_SIZE + 1, CLOCK_MESSAGE_SIZE)
+    return [decode_clock(data, offset)[0] for offset in offsets]
+
+
+def deliver(server, client, *datagrams):
+    for datagram in datagrams:
+        client.send(datagram)
+    time.sleep(0.05)
+    server._read_datagrams()
+
+
+def test_late_keyframe_is_not_acknowledged(udp_server):
+    server, client, frames = udp_server
+    encoder = DeltaEncoder(acknowledged=True)
+    old = encoder.encode(make_landmarks(), 0, 0.0)
+    new = encoder.encode(make_landmarks(10), 1, 0.0)
+
+    deliver(server, client, new)
+    assert decode_ack(client.recv(100)) == (1, 0)
+    encoder.acknowledge(1)
+
+    # The older keyframe arrives late: dropped, not stored and not acknowledged
+    deliver(server, client, old)
+    peer = server.udp_peers[client.getsockname()]
+    assert peer.tracker.reordered == 1 and peer.acks == 1
+    assert peer.decoder.keyframes[0][0] == 1
+
+    deliver(server, client, encoder.encode(make_landmarks(12), 2, 0.0))
+    assert [frame.sequence for frame in frames] == [1, 2]
+    np.testing.assert_allclose(frames[-1].landmarks, make_landmarks(12))
+    assert peer.decoder.missing_keyframe == 0
+
+
+def test_sequence_tracker_drops_reordered_frames():
+    tracker = SequenceTracker()
+    assert [tracker.accept(sequence, now=0.0) for sequence in (0, 1, 3, 2, 3, 4)] == [
+        True, True, True, False, False, True]
+    assert (tracker.lost, tracker.reordered, tracker.duplicates) == (1, 1, 1)
+
+
+def test_sequence_tracker_follows_restarted_client():
+    tracker = SequenceTracker()
+    for sequence in range(500):
+        tracker.accept(sequence, now=sequence / 30)
+    end = 499 / 30
+
+    # A late keyframe right after newer frames is reordering, not a restart
+    assert not tracker.accept(400, keyframe=True, now=end + 0.01)
+    # A delta from a restarted client cannot be decoded anyway
+    assert not tracker.accept(0, now=end + 1.0)
+    # Its first keyframe after a pause starts the new stream
+    assert tracker.accept(0, keyframe=True, now=end + 1.0)
+    assert tracker.accept(1, now=end + 1.03)
+    assert tracker.restarts == 1 and tracker.last_sequence == 1
+
+
+def test_clock_replies_survive_a_full_socket():
+    server = TrackingServer(lambda client_id, frame: None, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    while server.server is None:
+        time.sleep(0.01)
+
+    client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    client.connect(server.server.getsockname())
+    while not server.clients:
+        time.sleep(0.01)
+    server.clients[0].sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+
+    # More replies than fit in the socket buffers while nobody reads them
+    requests = 2000
+    for start in range(0, requests, 4):
+        client.sendall(b"".join(encode_clock(float(index)) for index in range(start, start + 4)))
+        time.sleep(0.001)
+    assert server.clients[0].outbox
+
+    # Every reply arrives whole and in order. The server only answers the newest
+    # requests of each read, so some are skipped.
+    received = b""
+    client.settimeout(2.0)
+    while len(received) % CLOCK_MESSAGE_SIZE or clock_replies(received)[-1:] != [requests - 1.0]:
+        received += client.recv(65536)
+    client.close()
+    server.stop()
+    thread.join()
+
+    client_times = clock_replies(received)
+    assert client_times == sorted(set(client_times))
@@ -0,0 +1,379 @@
+# Event loop server that receives landmark frames from any number of tracking clients
+import selectors
+import socket
+import time
+
+from landmark_protocol import (
+    FLAG_ACK, HEADER_SIZE, KIND_CLOCK, KIND_FRAME, KIND_GESTURE, KIND_HEARTBEAT, KIND_STATUS, STAGE_RECEIVE,
+    DeltaDecoder, ProtocolError, decode_clock, decode_gestures, decode_header, decode_status, encode_ack, encode_clock
+)
+from counters import Counters
+from stream_framing import FrameReader
+
+TRANSPORT_TCP = "tcp"
+TRANSPORT_UDP = "udp"
+TRANSPORT_BOTH = "both"
+
+# Largest datagram we accept; a landmark frame is a few hundred bytes
+MAX_DATAGRAM_SIZE = 64 * 1024
+# Longest the event loop waits for traffic before it checks on UDP peers and ticks
+LOOP_TIMEOUT = 0.5
+
+
+class ClientConnection:
+    """Parser state for one connected tracking client."""
+
+    def __init__(self, client_id, sock, address):
+        self.client_id = client_id
+        self.sock = sock
+        self.address = address
+        self.reader = FrameReader()
+        self.outbox = bytearray()  # Clock replies the socket has not taken yet
+        # Frame source_id -> client id. Source 0 is the connection itself, further
+        # cameras multiplexed on the same connection get client ids of their own
+        self.source_clients = {0: client_id}
+
+
+class SequenceTracker(Counters):
+    """Latest-frame-wins filter for one datagram sender."""
+
+    # A jump back by more than this is taken as a restarted client, not reordering
+    RESTART_WINDOW = 1000
+    # So is a keyframe that jumps back after this many seconds without frames
+    RESTART_GAP = 0.5
+
+    COUNTERS = ("received", "lost", "reordered", "duplicates", "superseded", "restarts")
+
+    def __init__(self):
+        self.last_sequence = None
+        self.last_time = 0.0
+        self.reset_counters()
+
+    def accept(self, sequence, keyframe=False, now=None):
+        """Return True if the frame is newer than every frame seen before, or starts a restarted stream."""
+        now = time.monotonic() if now is None else now
+        self.received += 1
+        if self.last_sequence is None:
+            self.last_sequence, self.last_time = sequence, now
+            return True
+
+        delta = (sequence - self.last_sequence) & 0xFFFFFFFF
+        if delta == 0:
+            self.duplicates += 1
+            return False
+        if delta >= 0x80000000:
+            if (0x100000000 - delta <= self.RESTART_WINDOW
+                    and not (keyframe and now - self.last_time >= self.RESTART_GAP)):
+                # Arrived after a newer frame, showing it would move the hand backwards
+                self.reordered += 1
+                return False
+            self.restarts += 1
+        else:
+            self.lost += delta - 1
+
+        self.last_sequence, self.last_time = sequence, now
+        return True
+
+
+class DatagramPeer(Counters):
+    """State for one client sending frames over UDP."""
+
+    COUNTERS = ("malformed_frames", "acks")
+
+    def __init__(self, client_id, address):
+        self.client_id = client_id
+        self.address = address
+        self.tracker = SequenceTracker()
+        self.decoder = DeltaDecoder()
+        self.last_seen = time.monotonic()
+        self.reset_counters()
+
+    def stats(self):
+        return {**self.tracker.stats(), **self.decoder.stats(), **super().stats()}
+
+
+class TrackingServer:
+    """Serves every tracking client, TCP and UDP, from a single selectors loop."""
+
+    def __init__(self, frame_callback, connection_callback=None, host='localhost', port=12340,
+                 transport=TRANSPORT_TCP, udp_timeout=2.0, gesture_callback=None, status_callback=None,
+                 tick_callback=None):
+        self.frame_callback = frame_callback
+        self.connection_callback = connection_callback
+        self.gesture_callback = gesture_callback
+        self.status_callback = status_callback
+        self.tick_callback = tick_callback
+        self.address = (host, port)
+        self.transport = transport
+        self.udp_timeout = udp_timeout
+        self.selector = selectors.DefaultSelector()
+        self.server = None
+        self.udp_server = None
+        self.clients = {}  # client_id -> ClientConnection or DatagramPeer
+        self.udp_peers = {}  # address -> DatagramPeer
+        self.running = False
+
+        # Reused for every datagram
+        self._datagram = bytearray(MAX_DATAGRAM_SIZE)
+        self._datagram_view = memoryview(self._datagram)
+
+    def serve_forever(self):
+        """Accept and read clients until stop() is called."""
+        if self.transport in (TRANSPORT_TCP, TRANSPORT_BOTH):
+            self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.server.bind(self.address)
+            self.server.listen()
+            self.server.setblocking(False)
+            self.selector.register(self.server, selectors.EVENT_READ)
+            print(f"FreeCAD server listening on TCP port {self.address[1]}...")
+
+        if self.transport in (TRANSPORT_UDP, TRANSPORT_BOTH):
+            self.udp_server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.udp_server.bind(self.address)
+            self.udp_server.setblocking(False)
+            self.selector.register(self.udp_server, selectors.EVENT_READ)
+            print(f"FreeCAD server listening on UDP port {self.address[1]}...")
+
+        self.running = True
+        try:
+            while self.running:
+                for key, events in self.selector.select(timeout=LOOP_TIMEOUT):
+                    if key.fileobj is self.server:
+                        self._accept()
+                    elif key.fileobj is self.udp_server:
+                        self._read_datagrams()
+                    else:
+                        if events & selectors.EVENT_WRITE and not self._flush(key.data):
+                            continue
+                        if events & selectors.EVENT_READ:
+                            self._read(key.data)
+                self._expire_udp_peers()
+                if self.tick_callback:
+                    self.tick_callback(time.monotonic())
+        finally:
+            self.cleanup()
+
+    def stop(self):
+        self.running = False
+
+    def cleanup(self):
+        # A multi-camera connection is listed once per camera
+        for connection in set(self.clients.values()):
+            if isinstance(connection, DatagramPeer):
+                self._forget_peer(connection)
+            else:
+                self._close(connection)
+        for sock in (self.server, self.udp_server):
+            if sock:
+                self.selector.unregister(sock)
+                sock.close()
+        self.server = self.udp_server = None
+        print("Server shutdown complete")
+
+    def _next_client_id(self):
+        """Lowest free client id, so a reconnecting camera gets its old slot back."""
+        client_id = 0
+        while client_id in self.clients:
+            client_id += 1
+        return client_id
+
+    def _accept(self):
+        try:
+            sock, address = self.server.accept()
+        except BlockingIOError:
+            return
+
+        sock.setblocking(False)
+        connection = ClientConnection(self._next_client_id(), sock, address)
+        self.clients[connection.client_id] = connection
+        self.selector.register(sock, selectors.EVENT_READ, connection)
+        print(f"Connection from {address} has been established (client {connection.client_id}).")
+
+        if self.connection_callback:
+            self.connection_callback(connection.client_id, True)
+
+    def _read(self, connection):
+        try:
+            if not connection.reader.recv_from(connection.sock):
+                print(f"Client {connection.address} disconnected.")
+                self._close(connection)
+                return
+        except BlockingIOError:
+            return
+        except (socket.error, ConnectionResetError) as e:
+            print(f"Connection error with {connection.address}: {e}")
+            self._close(connection)
+            return
+
+        for frame in connection.reader.read_frames():
+            self.frame_callback(self._source_client(connection, frame.source_id), frame)
+
+        gestures = connection.reader.gestures
+        while gestures:
+            source_id, events = gestures.popleft()
+            if self.gesture_callback:
+                self.gesture_callback(self._source_client(connection, source_id), events)
+
+        statuses = connection.reader.statuses
+        while statuses:
+            source_id, point = statuses.popleft()
+            if self.status_callback:
+                self.status_callback(self._source_client(connection, source_id), point)
+
+        requests = connection.reader.clock_requests
+        if requests:
+            while requests:
+                client_time, receive_time = requests.popleft()
+                connection.outbox += encode_clock(client_time, receive_time, time.monotonic())
+            self._flush(connection)
+
+    def _flush(self, connection):
+        """Send what the outbox holds, waiting for EVENT_WRITE for the rest. Returns False if the client was closed."""
+        try:
+            sent = connection.sock.send(connection.outbox)
+        except BlockingIOError:
+            sent = 0
+        except OSError as e:
+            print(f"Connection error with {connection.address}: {e}")
+            self._close(connection)
+            return False
+        del connection.outbox[:sent]
+
+        events = selectors.EVENT_READ | selectors.EVENT_WRITE if connection.outbox else selectors.EVENT_READ
+        if self.selector.get_key(connection.sock).events != events:
+            self.selector.modify(connection.sock, events, connection)
+        return True
+
+    def _source_client(self, connection, source_id):
+        """Client id of one camera on a connection, registering cameras the first time they send."""
+        client_id = connection.source_clients.get(source_id)
+        if client_id is None:
+            client_id = connection.source_clients[source_id] = self._next_client_id()
+            self.clients[client_id] = connection
+            print(f"Camera {source_id} of {connection.address} is client {client_id}.")
+
+            if self.connection_callback:
+                self.connection_callback(client_id, True)
+        return client_id
+
+    def _close(self, connection):
+        self.selector.unregister(connection.sock)
+        connection.sock.close()
+        for client_id in connection.source_clients.values():
+            del self.clients[client_id]
+        print(f"Connection with {connection.address} has been closed "
+              f"({connection.reader.wire_format} protocol, {connection.reader.stats()}).")
+
+        if self.connection_callback:
+            for client_id in connection.source_clients.values():
+                self.connection_callback(client_id, False)
+
+    def _read_datagrams(self):
+        """Drain the UDP socket and pass on only the newest frame of each sender."""
+        latest = {}
+        while True:
+            try:
+                count, address = self.udp_server.recvfrom_into(self._datagram)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                print(f"UDP receive error: {e}")
+                break
+
+            receive_time = time.monotonic()
+            if self._control_datagram(count, address, receive_time):
+                continue
+
+            peer = self._udp_peer(address)
+            peer.last_seen = receive_time
+            try:
+                # Stale frames are dropped before decoding, so an old keyframe never replaces a newer one
+                kind, *_, sequence, _, _ = decode_header(self._datagram_view[:count])
+                restarts = peer.tracker.restarts
+                if not peer.tracker.accept(sequence, kind == KIND_FRAME, receive_time):
+                    continue
+                if peer.tracker.restarts != restarts:
+                    print(f"UDP client {address} restarted at frame {sequence}.")
+                frame, _ = peer.decoder.decode(self._datagram_view[:count])
+            except ProtocolError:
+                peer.malformed_frames += 1
+                continue
+            if frame is None:
+                continue
+
+            if frame.flags & FLAG_ACK:
+                # The decoder keeps this keyframe now, so the client may send deltas against it
+                try:
+                    self.udp_server.sendto(encode_ack(frame.sequence, frame.source_id), address)
+                    peer.acks += 1
+                except OSError as e:
+                    print(f"UDP acknowledgement error: {e}")
+
+            frame.stamps[STAGE_RECEIVE] = receive_time
+            if address in latest:
+                peer.tracker.superseded += 1
+
+            latest[address] = (peer, frame)
+
+        for peer, frame in latest.values():
+            self.frame_callback(peer.client_id, frame)
+
+    def _control_datagram(self, count, address, receive_time):
+        """Handle a heartbeat, gesture, status or clock handshake datagram. Returns False for anything else."""
+        try:
+            kind = decode_header(self._datagram)[0] if count >= HEADER_SIZE else None
+            if kind == KIND_HEARTBEAT:
+                self._udp_peer(address).last_seen = receive_time
+                return True
+            if kind == KIND_GESTURE:
+                peer = self._udp_peer(address)
+                peer.last_seen = receive_time
+                events = decode_gestures(self._datagram_view[:count])[0]
+                if self.gesture_callback:
+                    self.gesture_callback(peer.client_id, events)
+                return True
+            if kind == KIND_STATUS:
+                peer = self._udp_peer(address)
+                peer.last_seen = receive_time
+                point = decode_status(self._datagram_view[:count])[0]
+                if self.status_callback:
+                    self.status_callback(peer.client_id, point)
+                return True
+            if kind != KIND_CLOCK:
+                return False
+            # Echo the request back with our receive and send times
+            client_time = decode_clock(self._datagram_view[:count])[0]
+            self.udp_server.sendto(encode_clock(client_time, receive_time, time.monotonic()), address)
+        except ProtocolError:
+            return False  # Counted as malformed by the peer's decoder
+        except OSError as e:
+            print(f"UDP clock reply error: {e}")
+        return True
+
+    def _udp_peer(self, address):
+        peer = self.udp_peers.get(address)
+        if peer is None:
+            peer = DatagramPeer(self._next_client_id(), address)
+            self.udp_peers[address] = peer
+            self.clients[peer.client_id] = peer
+            print(f"Receiving UDP frames from {address} (client {peer.client_id}).")
+
+            if self.connection_callback:
+                self.connection_callback(peer.client_id, True)
+        return peer
+
+    def _expire_udp_peers(self):
+        now = time.monotonic()
+        for peer in list(self.udp_peers.values()):
+            if now - peer.last_seen > self.udp_timeout:
+                print(f"UDP client {peer.address} timed out.")
+                self._forget_peer(peer)
+
+    def _forget_peer(self, peer):
+        del self.udp_peers[peer.address]
+        del self.clients[peer.client_id]
+        print(f"UDP client {peer.address} removed ({peer.stats()}).")
+
+        if self.connection_callback:
+            self.connection_callback(peer.client_id, False)